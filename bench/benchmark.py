@@ -0,0 +1,279 @@
+#!/usr/bin/env python
+#
+# benchmark the hot paths of ramu
+#
+# Copyright (C) 2010 Roger Allen (rallen@gmail.com)
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.
+#
+__doc__ = """
+benchmark.py times the hot paths of ramu and reports operations per
+second and memory for each.  Results can be saved to a JSON file and
+compared against a stored baseline:
+
+  ./benchmark.py -o results.json
+  ./benchmark.py -b baseline.json -t 0.10
+
+Comparing exits with status 1 when any benchmark is slower than the
+baseline by more than the threshold fraction.  Memory is the growth
+of the process's peak resident size while a benchmark runs, in KiB,
+along with the peak itself.  Benchmarks run in order, so a benchmark
+that needs no more memory than one before it reports 0 growth.
+"""
+import sys
+import time
+import json
+import random
+import platform
+from optparse import OptionParser
+try:
+    import resource
+except ImportError:
+    resource = None
+# uncomment to work with local directory
+sys.path.insert(0,"..")
+from ramu.music import *
+from ramu.channel import NullChannel
+from ramu.instruments.sequencer import Sequence, SequenceNote
+from ramu.instruments import guitar
+
+# ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~
+# benchmarks
+#
+# each returns (function, number of operations one call does)
+# ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~
+def bench_tone(cold=False):
+    glyphs = chromatic_glyphs
+    cache = Tone._cache
+    def run():
+        if cold:
+            cache.clear()
+        for i in xrange(MIDI_TONES):
+            Tone(i)
+        for g in glyphs:
+            Tone(g,4)
+    return (run, MIDI_TONES + len(glyphs))
+
+def bench_scale(cold=False):
+    tonics = [ Tone(i) for i in range(TONES_PER_CHROMATIC_OCTAVE) ]
+    names = sorted(scale_index_offsets.keys())
+    cache = Scale.cache
+    def run():
+        if cold:
+            cache.clear()
+        for t in tonics:
+            for n in names:
+                Scale(t,n)
+    return (run, len(tonics)*len(names))
+
+def bench_chord(cold=False):
+    scales = [ Scale(Tone(i),"major",2) for i in range(TONES_PER_CHROMATIC_OCTAVE) ]
+    names = sorted(chord_index_offsets.keys())
+    cache = Chord.cache
+    def run():
+        if cold:
+            cache.clear()
+        for s in scales:
+            for n in names:
+                Chord(s,n)
+    return (run, len(scales)*len(names))
+
+# the construction caches make repeated Tones, Scales and Chords cheap.
+# These clear them first, to time building each one.
+def bench_tone_cold():
+    return bench_tone(True)
+
+def bench_scale_cold():
+    return bench_scale(True)
+
+def bench_chord_cold():
+    return bench_chord(True)
+
+def bench_scales_with_tones():
+    rng = random.Random(1)
+    tone_sets = [ [ Tone(rng.randrange(MIDI_TONES)) for j in range(3) ]
+                  for i in range(20) ]
+    def run():
+        for tones in tone_sets:
+            get_scales_with_tones(tones,None)
+    return (run, len(tone_sets))
+
+def bench_sequence_append():
+    notes = [ Note(Tone(60 + i%12),1) for i in range(1000) ]
+    def run():
+        seq = Sequence(Rhythm(120))
+        for n in notes:
+            seq.append(n)
+    return (run, len(notes))
+
+def bench_sequence_insert():
+    rng = random.Random(1)
+    seqnotes = [ SequenceNote(rng.randrange(1000),Note(Tone(60 + i%12),1))
+                 for i in range(1000) ]
+    def run():
+        seq = Sequence(Rhythm(120))
+        for s in seqnotes:
+            seq.insert(s)
+    return (run, len(seqnotes))
+
+def bench_sequence_play():
+    seq = Sequence(Rhythm(120))
+    for i in range(1000):
+        seq.append(Note(Tone(60 + i%12),1))
+    chn = NullChannel()
+    def run():
+        seq.play(0.0,chn)
+    return (run, len(seq.seq))
+
+def bench_guitar_strum():
+    chords = [ c for c in guitar.chord_strings.keys() if c is not None ]
+    rng = random.Random(1)
+    progression = [ rng.choice(chords) for i in range(500) ]
+    chn = NullChannel()
+    g = guitar.Guitar(chn)
+    def run():
+        t = 0.0
+        for c in progression:
+            g.press_chord(t,c)
+            g.strum(t,0.01)
+            t += 0.5
+    return (run, len(progression))
+
+BENCHMARKS = [
+    ("tone",               bench_tone),
+    ("tone_cold",          bench_tone_cold),
+    ("scale",              bench_scale),
+    ("scale_cold",         bench_scale_cold),
+    ("chord",              bench_chord),
+    ("chord_cold",         bench_chord_cold),
+    ("scales_with_tones",  bench_scales_with_tones),
+    ("sequence_append",    bench_sequence_append),
+    ("sequence_insert",    bench_sequence_insert),
+    ("sequence_play",      bench_sequence_play),
+    ("guitar_strum",       bench_guitar_strum),
+    ]
+
+# ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~
+# running & comparing
+# ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~
+def peak_memory_kb():
+    """return the peak resident size of the process in KiB, or 0"""
+    if resource == None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        peak /= 1024 # bytes on OS X
+    return peak
+
+def measure(setup, min_time=0.2, repeat=3):
+    """return (ops per second, memory growth in KiB, peak memory in
+    KiB) of a benchmark.
+    The benchmark is called until min_time seconds pass, repeat times,
+    and the best run is kept."""
+    memory = peak_memory_kb()
+    (run, ops) = setup()
+    best = None
+    for r in range(repeat):
+        calls = 0
+        t0 = time.time()
+        while True:
+            run()
+            calls += 1
+            elapsed = time.time() - t0
+            if elapsed >= min_time:
+                break
+        rate = calls*ops/elapsed
+        if best == None or rate > best:
+            best = rate
+    peak = peak_memory_kb()
+    return (best, peak - memory, peak)
+
+def run_benchmarks(names=None, min_time=0.2, repeat=3, out=None):
+    """run the benchmarks and return the results dictionary.  names
+    selects benchmarks, None runs them all.  Progress goes to out."""
+    results = {}
+    for (name, setup) in BENCHMARKS:
+        if names != None and name not in names:
+            continue
+        (rate, memory, peak) = measure(setup, min_time, repeat)
+        results[name] = { "ops_per_sec"  : rate,
+                          "memory_kb"    : memory,
+                          "peak_kb"      : peak }
+        if out != None:
+            print >>out, "%-20s %14.1f ops/sec %8d KiB %8d KiB peak" % (
+                name, rate, memory, peak)
+    return { "python"   : platform.python_version(),
+             "platform" : platform.platform(),
+             "time"     : time.strftime("%Y-%m-%d %H:%M:%S"),
+             "results"  : results }
+
+def compare(results, baseline, threshold=0.10):
+    """return a list of (name, ratio) for benchmarks in both results
+    whose ops/sec fell below the baseline by more than threshold.
+    ratio is the new rate over the baseline rate."""
+    regressions = []
+    old = baseline["results"]
+    for (name, new) in sorted(results["results"].items()):
+        if name not in old:
+            continue
+        ratio = new["ops_per_sec"] / old[name]["ops_per_sec"]
+        if ratio < 1.0 - threshold:
+            regressions.append((name, ratio))
+    return regressions
+
+def load(filename):
+    f = open(filename)
+    try:
+        return json.load(f)
+    finally:
+        f.close()
+
+def save(results, filename):
+    f = open(filename, 'w')
+    try:
+        json.dump(results, f, indent=2, sort_keys=True)
+    finally:
+        f.close()
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def main(argv):
+    parser = OptionParser(usage="%prog [options] [benchmark ...]")
+    parser.add_option("-o", "--output", help="save the results to this JSON file")
+    parser.add_option("-b", "--baseline", help="compare against this results file")
+    parser.add_option("-t", "--threshold", type="float", default=0.10,
+                      help="allowed slowdown as a fraction [default %default]")
+    parser.add_option("-m", "--min-time", type="float", default=0.2,
+                      help="seconds to run each timing [default %default]")
+    parser.add_option("-l", "--list", action="store_true",
+                      help="list the benchmarks")
+    (options, args) = parser.parse_args(argv[1:])
+    if options.list:
+        for (name, setup) in BENCHMARKS:
+            print name
+        return 0
+    results = run_benchmarks(args or None, options.min_time, out=sys.stdout)
+    if options.output:
+        save(results, options.output)
+    if options.baseline:
+        regressions = compare(results, load(options.baseline), options.threshold)
+        for (name, ratio) in regressions:
+            print "REGRESSION %-20s %5.1f%% of baseline" % (name, 100.0*ratio)
+        if regressions:
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
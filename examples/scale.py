@@ -20,7 +20,6 @@
 # 02110-1301, USA.
 #
 import sys
-from copy import deepcopy
 # uncomment to work with local directory
 sys.path.insert(0,"..")
 from ramu.music import *
@@ -57,10 +56,8 @@ def main(argv):
         seq = Sequence(Rhythm(120))
         for t in the_notes:
             seq.append(t)
-        rseq = deepcopy(seq)
-        fseq = deepcopy(seq)
-        rseq.reverse()
-        fseq.flip(the_scale)
+        rseq = seq.reversed()
+        fseq = seq.flipped(the_scale)
 
         all = Sequence(Rhythm(120))
         all.append(seq)
@@ -15,4 +15,4 @@
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
 # 02110-1301, USA.
 #
-__all__ = [ "music", "channel" ]
+__all__ = [ "music", "channel", "scheduler", "monitor" ]
@@ -20,7 +20,15 @@
 __doc__ = """
 ramu.channel contains the Channel class.  This module is intended
 for diagnostic usage when a real channel is not available.
+
+LogChannel - writes note events to a file object in CSV, JSON lines
+or a binary struct layout, in batches.
+
+NullChannel - does nothing with its notes, for measuring the code
+that sends them.
 """
+import struct
+from .scheduler import monotonic
 
 class Channel:
     """Channel is a container that takes in tones and timing
@@ -28,7 +36,13 @@ class Channel:
     musical output via a MIDI channel or synthesizer.  In this case it
     is just a simple-stupid way to see notes printed to stdout.
     Normally, you would override for actual use.
+
+    Channel.realtime -- True if notes play out in wall-clock time.
+    Players like ramu.scheduler.Scheduler only wait on real-time
+    channels; others are fed as fast as possible.
     """
+    realtime = False
+
     def __init__(self):
         """Create the channel and initialize the values of
         Channel.one_second and Channel.ulp.
@@ -104,3 +118,148 @@ class Channel:
     def __exit__(self, type, value, traceback):
         self.all_notes_off()
         return False
+
+# ======================================================================
+LOG_FORMATS = [ "csv", "jsonl", "struct" ]
+
+# time, event (1 start, 0 stop), tone index, strength
+LOG_STRUCT = struct.Struct('<dBhf')
+
+class LogChannel(Channel):
+    """LogChannel writes each note event to a file object.  Events are
+    kept in a buffer and written batch_size at a time in one write().
+    Times are logged exactly as given.
+
+    The formats, one event per line or record:
+    csv    -- time,event,index,strength with event 'start' or 'stop',
+              after a header line
+    jsonl  -- {"time": t, "event": e, "index": i, "strength": s}
+    struct -- LOG_STRUCT records: little-endian double time, byte
+              event (1 start, 0 stop), short index, float strength
+    """
+    def __init__(self, file, format="csv", batch_size=4096, flush_interval=None,
+                 header=True):
+        """Create the channel.
+
+        Keyword arguments:
+        file           -- a file object to write to
+        format         -- one of LOG_FORMATS
+        batch_size     -- events to buffer before writing them
+        flush_interval -- None only writes full batches and flushes
+                          on flush() and close().  A number of
+                          seconds writes out the buffered events, full
+                          batch or not, and flushes once that long has
+                          passed since the last flush.  0 writes and
+                          flushes every event.
+        header         -- write a header line first (csv only)
+        """
+        Channel.__init__(self)
+        assert(format in LOG_FORMATS)
+        assert(batch_size >= 1)
+        self._file           = file
+        self.format          = format
+        self.batch_size      = batch_size
+        self.flush_interval  = flush_interval
+        self._events         = []
+        self._last_flush     = monotonic()
+        self._closed         = False
+        self._encode = getattr(self, '_encode_' + format)
+        if header and format == "csv":
+            file.write("time,event,index,strength\n")
+
+    def start_note(self,time,tone,strength):
+        """Log the start of a note.
+
+        Keyword arguments:
+        time     -- time to start playing in seconds.  1.0 === 1 second
+        tone     -- the tone to play
+        strength -- strength to apply to playing the note [0.0,1.0]
+        """
+        assert(0.0<=strength<=1.0)
+        events = self._events
+        events.append((time, 1, tone.index, strength))
+        self._now = time
+        if len(events) >= self.batch_size or self.flush_interval != None:
+            self._write()
+
+    def stop_note(self,time,tone,strength):
+        """Log the end of a note.
+
+        Keyword arguments:
+        time     -- time to stop playing in seconds.  1.0 === 1 second
+        tone     -- the tone to stop
+        strength -- strength to apply to stopping the note [0.0,1.0]
+        """
+        assert(0.0<=strength<=1.0)
+        events = self._events
+        events.append((time, 0, tone.index, strength))
+        self._now = time
+        if len(events) >= self.batch_size or self.flush_interval != None:
+            self._write()
+
+    def _encode_csv(self, events):
+        return "".join([ "%r,%s,%d,%r\n" % (t, e and "start" or "stop", i, s)
+                         for (t, e, i, s) in events ])
+
+    def _encode_jsonl(self, events):
+        return "".join([ '{"time": %r, "event": "%s", "index": %d, "strength": %r}\n' %
+                         (t, e and "start" or "stop", i, s)
+                         for (t, e, i, s) in events ])
+
+    def _encode_struct(self, events):
+        pack = LOG_STRUCT.pack
+        return "".join([ pack(*event) for event in events ])
+
+    def _write(self):
+        """write out a full batch, and with a flush_interval, write out
+        and flush any events once the interval has passed"""
+        interval = self.flush_interval
+        if interval != None:
+            now = monotonic()
+            if now - self._last_flush >= interval:
+                self.flush()
+                return
+        if len(self._events) >= self.batch_size:
+            self._file.write(self._encode(self._events))
+            self._events = []
+
+    def flush(self):
+        """write out the buffered events and flush the file"""
+        if self._events:
+            self._file.write(self._encode(self._events))
+            self._events = []
+        self._file.flush()
+        self._last_flush = monotonic()
+
+    def close(self):
+        """write out the buffered events and flush the file.  The file
+        is left open for the caller to close."""
+        if self._closed:
+            return
+        self._closed = True
+        self.flush()
+
+    # ======================================================================
+    # allow the with statement
+    def __exit__(self, type, value, traceback):
+        self.close()
+        return False
+
+def read_log_struct(data):
+    """return the (time, event, index, strength) records of bytes
+    written by a LogChannel in the struct format"""
+    size = LOG_STRUCT.size
+    unpack_from = LOG_STRUCT.unpack_from
+    return [ unpack_from(data, pos) for pos in xrange(0, len(data) - size + 1, size) ]
+
+# ======================================================================
+class NullChannel(Channel):
+    """NullChannel accepts notes and does nothing at all with them, not
+    even checking them, so that timing the code that sends notes
+    measures only that code."""
+    def start_note(self,time,tone,strength):
+        pass
+    def stop_note(self,time,tone,strength):
+        pass
+    def play_note(self,start,stop,tone,strength):
+        pass
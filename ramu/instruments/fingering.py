@@ -0,0 +1,280 @@
+# ramu.instruments.fingering
+#
+# Copyright (C) 2009-2010 Roger Allen (rallen@gmail.com)
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.
+#
+__doc__ = """
+ramu.instruments.fingering finds fret positions for any chord on a
+fretted instrument with any tuning.
+
+A fingering is a tuple with a fret for each string, lowest string
+first, with -1 for a string that is not played and 0 for an open
+string.  find_fingerings() searches every playable fingering that
+sounds all of a chord's pitch classes, best first.  A fingering is
+playable when:
+
+- every fret is at most max_fret
+- the fretted notes fit in a hand span of max_span frets
+- it needs at most max_fingers fingers, where the strings held at the
+  lowest fret can be barred with one finger
+- at least min_strings strings sound
+
+The perfect fifth may be left out of chords with four or more pitch
+classes.  Fingerings are ranked by fingering_cost(), which adds up
+the highest fret used, the span and the unplayed strings, with larger
+penalties for unplayed strings between played ones and for a bass
+note that is not the root.  Ties go to fewer fingers.
+
+plan_progression() picks a fingering for each chord of a progression
+to keep the hand movement between chords small.
+
+Results are kept in an LRUCache, fingering_cache.
+"""
+from .. import music
+from ..music import TONES_PER_CHROMATIC_OCTAVE, LRUCache
+
+# strings E, A, D, G, B, E
+STANDARD_TUNING = ( music.Tone('E',3),
+                    music.Tone('A',3),
+                    music.Tone('D',4),
+                    music.Tone('G',4),
+                    music.Tone('B',4),
+                    music.Tone('E',5) )
+
+MUTED = -1
+
+fingering_cache = LRUCache(1024)
+
+def _popcount(mask):
+    return bin(mask).count('1')
+
+def count_fingers(frets):
+    """return the fingers needed to hold frets, barring the lowest
+    fretted position"""
+    fretted = [ f for f in frets if f > 0 ]
+    if not fretted:
+        return 0
+    lowest = min(fretted)
+    return len([ f for f in fretted if f > lowest ]) + 1
+
+def _search(opens, pcs_mask, required, max_fret, max_span,
+            max_fingers, min_strings):
+    """return every playable fingering, unsorted"""
+    n = len(opens)
+    # the frets on each string that sound a chord tone
+    options = []
+    for o in opens:
+        opts = [ MUTED ]
+        for f in range(max_fret + 1):
+            if pcs_mask & (1 << ((o + f) % TONES_PER_CHROMATIC_OCTAVE)):
+                opts.append(f)
+        options.append(opts)
+    results = []
+    frets = [ MUTED ] * n
+    def visit(i, mask, lo, hi, sounding):
+        # prune when the strings left cannot sound the missing tones
+        # or reach min_strings
+        if n - i < _popcount(required & ~mask) or n - i + sounding < min_strings:
+            return
+        if i == n:
+            if count_fingers(frets) <= max_fingers:
+                results.append(tuple(frets))
+            return
+        for f in options[i]:
+            if f == MUTED:
+                frets[i] = f
+                visit(i + 1, mask, lo, hi, sounding)
+                continue
+            new_lo, new_hi = lo, hi
+            if f > 0:
+                new_lo = min(lo, f)
+                new_hi = max(hi, f)
+                if new_hi - new_lo + 1 > max_span:
+                    continue
+            frets[i] = f
+            pc = (opens[i] + f) % TONES_PER_CHROMATIC_OCTAVE
+            visit(i + 1, mask | (1 << pc), new_lo, new_hi, sounding + 1)
+        frets[i] = MUTED
+    visit(0, 0, max_fret + 1, 0, 0)
+    return results
+
+def fingering_cost(frets, tuning=STANDARD_TUNING, root=None):
+    """return how awkward a fingering is: the highest fret used, plus
+    the span, plus the unplayed strings, with unplayed strings between
+    played ones counting three times.  A root that is not in the bass
+    adds 10."""
+    opens = [ t.index for t in tuning ]
+    root_pc = None
+    if root is not None:
+        root_pc = root.index % TONES_PER_CHROMATIC_OCTAVE
+    return _cost(frets, opens, root_pc)
+
+def _cost(frets, opens, root):
+    sounding = [ i for i in range(len(frets)) if frets[i] != MUTED ]
+    if not sounding:
+        return 0
+    first = sounding[0]
+    last = sounding[-1]
+    # unplayed strings between played ones are hard to strum around
+    inner_muted = last - first + 1 - len(sounding)
+    outer_muted = len(frets) - (last - first + 1)
+    fretted = [ f for f in frets if f > 0 ]
+    hi = 0
+    span = 0
+    if fretted:
+        hi = max(fretted)
+        span = hi - min(fretted)
+    cost = 3*inner_muted + outer_muted + hi + span
+    if root != None:
+        bass = (opens[first] + frets[first]) % TONES_PER_CHROMATIC_OCTAVE
+        if bass != root:
+            cost += 10
+    return cost
+
+def _rank(frets, opens, root):
+    """sort key for a fingering, lower is better"""
+    return (_cost(frets, opens, root), count_fingers(frets), frets)
+
+def find_fingerings(tones, tuning=STANDARD_TUNING, root=None, max_fret=12,
+                    max_span=4, max_fingers=4, min_strings=3, omit_fifth=True):
+    """return a tuple of fingerings for a chord, best first.  The
+    tuple is empty if no fingering is playable.
+
+    Keyword arguments:
+    tones       -- a Chord or a collection of Tones
+    tuning      -- the open Tone of each string, lowest first
+    root        -- a Tone for the root, or None.  Defaults to the
+                   tonic of a Chord's scale.
+    max_fret    -- the highest fret to use
+    max_span    -- the most frets the fretted notes may cover
+    max_fingers -- the most fingers, counting a barre as one
+    min_strings -- the fewest strings that must sound
+    omit_fifth  -- allow leaving out the perfect fifth of chords with
+                   four or more pitch classes
+    """
+    if isinstance(tones, music.Chord):
+        if root is None:
+            root = tones.scale.tonic
+        tones = tones.tones
+    pcs_mask = music.pitch_class_mask(tones)
+    root_pc = None
+    if root is not None:
+        root_pc = root.index % TONES_PER_CHROMATIC_OCTAVE
+    opens = tuple([ t.index for t in tuning ])
+    key = (pcs_mask, root_pc, opens, max_fret, max_span, max_fingers,
+           min_strings, omit_fifth)
+    found = fingering_cache.get(key)
+    if found is not None:
+        return found
+    required = pcs_mask
+    if omit_fifth and root_pc != None and _popcount(pcs_mask) >= 4:
+        fifth = 1 << ((root_pc + 7) % TONES_PER_CHROMATIC_OCTAVE)
+        required &= ~fifth
+    # the root in the bass is preferred by the ranking, not the search
+    results = _search(opens, pcs_mask, required, max_fret,
+                      max_span, max_fingers, min(min_strings, len(opens)))
+    results.sort(key=lambda frets: _rank(frets, opens, root_pc))
+    return fingering_cache.put(key, tuple(results))
+
+def find_fingering(tones, tuning=STANDARD_TUNING, root=None, **kwargs):
+    """return the best fingering for a chord, or None.  Takes the
+    keyword arguments of find_fingerings."""
+    found = find_fingerings(tones, tuning, root, **kwargs)
+    if not found:
+        return None
+    return found[0]
+
+# ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~
+# Progressions
+# ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~
+def hand_position(frets):
+    """return the lowest fretted position, 0 if nothing is fretted"""
+    fretted = [ f for f in frets if f > 0 ]
+    if not fretted:
+        return 0
+    return min(fretted)
+
+def movement(a, b):
+    """return the hand movement from fingering a to fingering b: twice
+    the shift in hand position plus one for each string that changes.
+    Moving to or from a fingering with no strings played is free."""
+    if max(a) == MUTED or max(b) == MUTED:
+        return 0
+    changed = len([ i for i in range(len(a)) if a[i] != b[i] ])
+    return 2*abs(hand_position(a) - hand_position(b)) + changed
+
+def plan_progression(chords, tuning=STANDARD_TUNING, candidates=8,
+                     movement_weight=1.0, **kwargs):
+    """return a list with a fingering for each chord that minimizes the
+    sum of each fingering's fingering_cost() and movement_weight times
+    the movement between neighbors.  Each chord picks from its best
+    candidates fingerings, and dynamic programming makes the work grow
+    linearly with the number of chords.  Raises KeyError for a chord
+    with no playable fingering.
+
+    Keyword arguments:
+    chords          -- a list of Chords, collections of Tones, or None
+                       for a rest with no strings played
+    tuning          -- the open Tone of each string, lowest first
+    candidates      -- fingerings to consider for each chord
+    movement_weight -- how much movement counts against awkwardness
+    Other keyword arguments are passed to find_fingerings.
+    """
+    assert(candidates >= 1)
+    opens = [ t.index for t in tuning ]
+    steps = []  # [ (fingering, cost), ... ] for each chord
+    for chord in chords:
+        if chord is None:
+            steps.append([ (tuple([ MUTED ] * len(tuning)), 0) ])
+            continue
+        root = None
+        if isinstance(chord, music.Chord):
+            root = chord.scale.tonic.index % TONES_PER_CHROMATIC_OCTAVE
+        found = find_fingerings(chord, tuning, **kwargs)[:candidates]
+        if not found:
+            raise KeyError(chord)
+        steps.append([ (frets, _cost(frets, opens, root)) for frets in found ])
+    if not steps:
+        return []
+    # totals[k] is the least cost of a path ending on candidate k and
+    # back[i][k] is the candidate before it
+    totals = [ cost for (frets, cost) in steps[0] ]
+    back = [ None ]
+    for i in range(1, len(steps)):
+        prev = steps[i-1]
+        new_totals = []
+        pointers = []
+        for (frets, cost) in steps[i]:
+            best = None
+            best_j = 0
+            for j in range(len(prev)):
+                t = totals[j] + movement_weight*movement(prev[j][0], frets)
+                if best == None or t < best:
+                    best = t
+                    best_j = j
+            new_totals.append(best + cost)
+            pointers.append(best_j)
+        totals = new_totals
+        back.append(pointers)
+    k = totals.index(min(totals))
+    path = []
+    for i in range(len(steps) - 1, -1, -1):
+        path.append(steps[i][k][0])
+        if back[i] != None:
+            k = back[i][k]
+    path.reverse()
+    return path
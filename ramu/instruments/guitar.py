@@ -19,6 +19,7 @@
 #
 import sys
 from .. import music
+from . import fingering
 
 def MkChord(t,s,c):
     oct = 1
@@ -30,73 +31,187 @@ def MkChord(t,s,c):
 STRUM_UP   = 0
 STRUM_DOWN = 1
 
+# ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ 
+class LazyTable(object):
+    """A dictionary that is built by calling builder() the first time
+    it is used, so that importing a module does not pay for tables it
+    may never need."""
+    def __init__(self, builder):
+        self._builder = builder
+        self._table = None
+    def get_table(self):
+        """return the table, building it if needed"""
+        if self._table == None:
+            self._table = self._builder()
+        return self._table
+    table = property(get_table)
+    def get_built(self):
+        """return True if the table has been built"""
+        return self._table != None
+    built = property(get_built)
+    def __getitem__(self, key):
+        return self.get_table()[key]
+    def __setitem__(self, key, value):
+        self.get_table()[key] = value
+    def __delitem__(self, key):
+        del self.get_table()[key]
+    def __contains__(self, key):
+        return key in self.get_table()
+    def __iter__(self):
+        return iter(self.get_table())
+    def __len__(self):
+        return len(self.get_table())
+    def __repr__(self):
+        return repr(self.get_table())
+    def __getattr__(self, name):
+        # keys(), items(), get() and the rest of the dict methods
+        if name in ('_builder', '_table'):
+            raise AttributeError(name)
+        return getattr(self.get_table(), name)
+
 # A dictionary of chords & string+fret positions
 # -1 = don't play, 0 = open
 # chord : [ string0, string1, ... string5 ]
-chord_strings = {
-    None  : [ -1, -1, -1, -1, -1, -1 ],
-    MkChord("C","major","5th") : [ -1,  3,  2,  0,  1,  0 ],
-    MkChord("F","major","5th")   : [ -1, -1,  3,  2,  1,  1 ],
-    MkChord("G","major","5th")   : [  3,  2,  0,  0,  0,  3 ],
-    #MkChord("G'","major","5th")  : [  3,  5,  5,  4,  3,  3 ],
-    MkChord("D","major","5th")   : [ -1, -1,  0,  2,  3,  2 ],
-    MkChord("A","major","5th")   : [  0,  0,  2,  2,  2,  0 ],
-    #MkChord("A''","major","5th") : [  5,  7,  7,  6,  5,  5 ],
-    MkChord("E","major","5th")   : [  0,  2,  2,  1,  0,  0 ],
-    MkChord("Bb","major","5th")  : [ -1, -1,  3,  3,  3,  1 ],
-    MkChord("Eb","major","5th")  : [ -1, -1,  5,  3,  4,  3 ],
-    MkChord("Ab","major","5th")  : [ -1, -1,  6,  5,  4,  4 ],
-    MkChord("Db","major","5th")  : [ -1, -1,  3,  1,  2,  1 ],
-    MkChord("Gb","major","5th")  : [ -1, -1,  4,  2,  1,  1 ],
-    MkChord("B","major","5th")   : [ -1, -1,  4,  4,  4,  2 ],
-
-    MkChord("C","minor","5th")  : [ -1, -1,  5,  5,  4,  3 ],
-    MkChord("F","minor","5th")  : [ -1, -1,  3,  1,  1,  1 ],
-    MkChord("G","minor","5th")  : [ -1, -1,  5,  3,  3,  3 ],
-    MkChord("D","minor","5th")  : [ -1,  0,  0,  2,  3,  1 ],
-    MkChord("A","minor","5th")  : [  0,  0,  2,  2,  1,  0 ],
-    MkChord("E","minor","5th")  : [  0,  2,  2,  0,  0,  0 ],
-    MkChord("Bb","minor","5th") : [ -1, -1,  3,  3,  2,  1 ],
-    MkChord("Eb","minor","5th") : [ -1, -1,  4,  3,  4,  2 ],
-    MkChord("Ab","minor","5th") : [ -1, -1,  6,  4,  4,  4 ],
-    MkChord("Db","minor","5th") : [ -1, -1,  2,  1,  2,  0 ],
-    MkChord("Gb","minor","5th") : [ -1, -1,  4,  2,  2,  2 ],
-    MkChord("B","minor","5th")  : [ -1, -1,  4,  4,  3,  2 ],
-
-    MkChord("C","major","7th")  : [ -1,  3,  2,  3,  1, -1 ],
-    MkChord("F","major","7th")  : [ -1, -1,  1,  2,  1,  1 ],
-    MkChord("G","major","7th")  : [  3,  2,  0,  0,  0,  1 ],
-    MkChord("D","major","7th")  : [ -1, -1,  0,  2,  1,  2 ],
-    MkChord("A","major","7th")  : [ -1, -1,  2,  2,  2,  3 ],
-    MkChord("E","major","7th")  : [  0,  2,  0,  1,  0,  0 ],
-    MkChord("Bb","major","7th") : [ -1, -1,  3,  3,  3,  4 ],
-    MkChord("Eb","major","7th") : [ -1, -1,  1,  3,  2,  3 ],
-    MkChord("Ab","major","7th") : [ -1, -1,  1,  1,  1,  2 ],
-    MkChord("Db","major","7th") : [ -1, -1,  3,  4,  2,  4 ],
-    MkChord("Gb","major","7th") : [ -1, -1,  4,  3,  2,  0 ],
-    MkChord("B","major","7th")  : [ -1,  2,  1,  2,  0,  2 ],
-
-    MkChord("D","major","dim")  : [ -1, -1,  0,  1,  0,  1 ], # Ab-, B-, F-
-    MkChord("Eb","major","dim") : [ -1, -1,  1,  2,  1,  2 ], # A-, C-, Gb-
-    MkChord("E","major","dim")  : [ -1, -1,  2,  3,  2,  3 ], # Bb-, Db-, G-
-    MkChord("E","major","aug")  : [ -1, -1,  2,  1,  1,  0 ], # Ab+, C+
-    MkChord("F","major","aug")  : [ -1, -1,  3,  2,  2,  1 ], # A+, Db+
-    MkChord("G","major","aug")  : [ -1, -1,  5,  4,  4,  3 ], # G+, B+, Eb+
-
-    MkChord("C","major","9th")  : [  3, -1,  2,  3,  3,  3 ],
-    MkChord("F","major","9th")  : [ -1,  3, -1,  2,  4,  3 ],
-    MkChord("G","major","9th")  : [ -1, -1,  0,  2,  0,  1 ],
-    MkChord("D","major","9th")  : [ -1, -1,  4,  2,  1,  0 ],
-    MkChord("A","major","9th")  : [  0,  0,  2,  4,  2,  3 ],
-    MkChord("E","major","9th")  : [  0,  2,  0,  1,  3,  2 ],
-    MkChord("Bb","major","9th") : [ -1, -1,  0,  1,  1,  1 ],
-    MkChord("Eb","major","9th") : [ -1, -1,  1,  0,  2,  1 ],
-    MkChord("Ab","major","9th") : [ -1, -1,  1,  3,  1,  2 ],
-    MkChord("Db","major","9th") : [  4, -1,  3,  4,  4,  4 ],
-    MkChord("Gb","major","9th") : [ -1,  4, -1,  3,  5,  4 ],
-    MkChord("B","major","9th")  : [  2, -1,  1,  2,  2,  2 ],
-
-    }
+# The table is built on first use.
+def _build_chord_strings():
+    """return the chord_strings dictionary"""
+    return {
+        None  : [ -1, -1, -1, -1, -1, -1 ],
+        MkChord("C","major","5th") : [ -1,  3,  2,  0,  1,  0 ],
+        MkChord("F","major","5th")   : [ -1, -1,  3,  2,  1,  1 ],
+        MkChord("G","major","5th")   : [  3,  2,  0,  0,  0,  3 ],
+        #MkChord("G'","major","5th")  : [  3,  5,  5,  4,  3,  3 ],
+        MkChord("D","major","5th")   : [ -1, -1,  0,  2,  3,  2 ],
+        MkChord("A","major","5th")   : [  0,  0,  2,  2,  2,  0 ],
+        #MkChord("A''","major","5th") : [  5,  7,  7,  6,  5,  5 ],
+        MkChord("E","major","5th")   : [  0,  2,  2,  1,  0,  0 ],
+        MkChord("Bb","major","5th")  : [ -1, -1,  3,  3,  3,  1 ],
+        MkChord("Eb","major","5th")  : [ -1, -1,  5,  3,  4,  3 ],
+        MkChord("Ab","major","5th")  : [ -1, -1,  6,  5,  4,  4 ],
+        MkChord("Db","major","5th")  : [ -1, -1,  3,  1,  2,  1 ],
+        MkChord("Gb","major","5th")  : [ -1, -1,  4,  2,  1,  1 ],
+        MkChord("B","major","5th")   : [ -1, -1,  4,  4,  4,  2 ],
+
+        MkChord("C","minor","5th")  : [ -1, -1,  5,  5,  4,  3 ],
+        MkChord("F","minor","5th")  : [ -1, -1,  3,  1,  1,  1 ],
+        MkChord("G","minor","5th")  : [ -1, -1,  5,  3,  3,  3 ],
+        MkChord("D","minor","5th")  : [ -1,  0,  0,  2,  3,  1 ],
+        MkChord("A","minor","5th")  : [  0,  0,  2,  2,  1,  0 ],
+        MkChord("E","minor","5th")  : [  0,  2,  2,  0,  0,  0 ],
+        MkChord("Bb","minor","5th") : [ -1, -1,  3,  3,  2,  1 ],
+        MkChord("Eb","minor","5th") : [ -1, -1,  4,  3,  4,  2 ],
+        MkChord("Ab","minor","5th") : [ -1, -1,  6,  4,  4,  4 ],
+        MkChord("Db","minor","5th") : [ -1, -1,  2,  1,  2,  0 ],
+        MkChord("Gb","minor","5th") : [ -1, -1,  4,  2,  2,  2 ],
+        MkChord("B","minor","5th")  : [ -1, -1,  4,  4,  3,  2 ],
+
+        MkChord("C","major","7th")  : [ -1,  3,  2,  3,  1, -1 ],
+        MkChord("F","major","7th")  : [ -1, -1,  1,  2,  1,  1 ],
+        MkChord("G","major","7th")  : [  3,  2,  0,  0,  0,  1 ],
+        MkChord("D","major","7th")  : [ -1, -1,  0,  2,  1,  2 ],
+        MkChord("A","major","7th")  : [ -1, -1,  2,  2,  2,  3 ],
+        MkChord("E","major","7th")  : [  0,  2,  0,  1,  0,  0 ],
+        MkChord("Bb","major","7th") : [ -1, -1,  3,  3,  3,  4 ],
+        MkChord("Eb","major","7th") : [ -1, -1,  1,  3,  2,  3 ],
+        MkChord("Ab","major","7th") : [ -1, -1,  1,  1,  1,  2 ],
+        MkChord("Db","major","7th") : [ -1, -1,  3,  4,  2,  4 ],
+        MkChord("Gb","major","7th") : [ -1, -1,  4,  3,  2,  0 ],
+        MkChord("B","major","7th")  : [ -1,  2,  1,  2,  0,  2 ],
+
+        MkChord("D","major","dim")  : [ -1, -1,  0,  1,  0,  1 ], # Ab-, B-, F-
+        MkChord("Eb","major","dim") : [ -1, -1,  1,  2,  1,  2 ], # A-, C-, Gb-
+        MkChord("E","major","dim")  : [ -1, -1,  2,  3,  2,  3 ], # Bb-, Db-, G-
+        MkChord("E","major","aug")  : [ -1, -1,  2,  1,  1,  0 ], # Ab+, C+
+        MkChord("F","major","aug")  : [ -1, -1,  3,  2,  2,  1 ], # A+, Db+
+        MkChord("G","major","aug")  : [ -1, -1,  5,  4,  4,  3 ], # G+, B+, Eb+
+
+        MkChord("C","major","9th")  : [  3, -1,  2,  3,  3,  3 ],
+        MkChord("F","major","9th")  : [ -1,  3, -1,  2,  4,  3 ],
+        MkChord("G","major","9th")  : [ -1, -1,  0,  2,  0,  1 ],
+        MkChord("D","major","9th")  : [ -1, -1,  4,  2,  1,  0 ],
+        MkChord("A","major","9th")  : [  0,  0,  2,  4,  2,  3 ],
+        MkChord("E","major","9th")  : [  0,  2,  0,  1,  3,  2 ],
+        MkChord("Bb","major","9th") : [ -1, -1,  0,  1,  1,  1 ],
+        MkChord("Eb","major","9th") : [ -1, -1,  1,  0,  2,  1 ],
+        MkChord("Ab","major","9th") : [ -1, -1,  1,  3,  1,  2 ],
+        MkChord("Db","major","9th") : [  4, -1,  3,  4,  4,  4 ],
+        MkChord("Gb","major","9th") : [ -1,  4, -1,  3,  5,  4 ],
+        MkChord("B","major","9th")  : [  2, -1,  1,  2,  2,  2 ],
+
+        }
+
+chord_strings = LazyTable(_build_chord_strings)
+
+# ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ 
+# Pitch-set index of chord_strings
+#
+# Chords in chord_strings can also be found from any collection of
+# tones by their pitch-class mask (see ramu.music.pitch_class_mask),
+# optionally with the pitch class of the root.  Octaves and the name
+# of the scale a chord was built from do not matter.
+# ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ 
+def _chord_order(chord):
+    return (chord.scale.tonic.index % music.TONES_PER_CHROMATIC_OCTAVE,
+            chord.scale.name, chord.name)
+
+def _build_chord_pitch_index():
+    """return { mask : chord } and { (mask, root pitch class) : chord }
+    for the chords in chord_strings.  When chords share a key, the one
+    with the lowest root pitch class, then scale and chord name, wins."""
+    by_mask = {}
+    by_root = {}
+    chords = [ c for c in chord_strings.keys() if c is not None ]
+    for chord in sorted(chords, key=_chord_order):
+        mask = music.pitch_class_mask(chord.tones)
+        root = chord.scale.tonic.index % music.TONES_PER_CHROMATIC_OCTAVE
+        by_mask.setdefault(mask, chord)
+        by_root.setdefault((mask, root), chord)
+    return { 'mask' : by_mask, 'root' : by_root }
+
+chord_pitch_index = LazyTable(_build_chord_pitch_index)
+
+def find_chord(tones, root=None):
+    """return the Chord in chord_strings with the same pitch classes as
+    tones, or None.
+
+    Keyword arguments:
+    tones -- a Chord or any collection of Tones
+    root  -- a Tone whose pitch class must be the chord's root, or
+             None to match any root
+    """
+    if isinstance(tones, music.Chord):
+        tones = tones.tones
+    mask = music.pitch_class_mask(tones)
+    if root is None:
+        return chord_pitch_index['mask'].get(mask)
+    root = root.index % music.TONES_PER_CHROMATIC_OCTAVE
+    return chord_pitch_index['root'].get((mask, root))
+
+def get_chord_frets(chord, root=None, tuning=fingering.STANDARD_TUNING):
+    """return the frets for a chord.  In standard tuning the chord is
+    looked up as-is in chord_strings and then by its pitch classes with
+    find_chord().  Chords that are not in the table, and every chord in
+    other tunings, are fingered by ramu.instruments.fingering.  chord
+    may be a Chord, None for no strings, or a collection of Tones.
+    Raises KeyError if there is no playable fingering."""
+    if chord is None:
+        return [ fingering.MUTED ] * len(tuning)
+    standard = tuple(tuning) == fingering.STANDARD_TUNING
+    if isinstance(chord, music.Chord):
+        if standard:
+            frets = chord_strings.get(chord)
+            if frets is not None:
+                return frets
+        if root is None:
+            root = chord.scale.tonic
+    if standard:
+        found = find_chord(chord, root)
+        if found is not None:
+            return chord_strings[found]
+    frets = fingering.find_fingering(chord, tuning, root)
+    if frets is None:
+        raise KeyError(chord)
+    return list(frets)
 
 # ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ 
 class FrettedString:
@@ -153,8 +268,14 @@ class Guitar(object):
         for i in range(len(self.strings)):
             self.press_fret(time, i, frets[i])
     def press_chord(self, time, chord):
-        """press the frets for a chord"""
-        self.press_frets(time, chord_strings[chord])
+        """press the frets for a chord.  chord may be a Chord or any
+        collection of Tones; see get_chord_frets()."""
+        self.press_frets(time, get_chord_frets(chord, tuning=self.string_notes))
+    def plan_progression(self, chords, **kwargs):
+        """return a fingering for each chord that keeps the hand
+        movement small; press them with press_frets().  See
+        ramu.instruments.fingering.plan_progression."""
+        return fingering.plan_progression(chords, self.string_notes, **kwargs)
     def silence(self, time):
         """silence all strings by muting all frets"""
         self.press_frets(time,[-1,-1,-1,-1,-1,-1])
@@ -206,6 +327,8 @@ class TwelveStringGuitar(object):
     def press_chord(self, time, chord):
         for g in self.guitars:
             g.press_chord(time, chord)
+    def plan_progression(self, chords, **kwargs):
+        return self.guitars[0].plan_progression(chords, **kwargs)
     def silence(self, time):
         for g in self.guitars:
             g.silence(time)
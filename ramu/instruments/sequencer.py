@@ -22,10 +22,18 @@ ramu.instruments.sequencer contains the code to play SequenceNotes and Sequences
 
 SequenceNotes - a Note with a starting time.
 
+SequenceColumns - columnar storage for the notes of a Sequence.
+
 Sequence - a series of notes that can be played and manipulated.
+
+SequenceView - a Sequence transformed lazily, without copying notes.
+
+SequenceRope - Sequences joined end to end, without copying notes.
 """
 from ..music import *
-from time import sleep
+from array import array
+from bisect import bisect_left, bisect_right
+from ..scheduler import Scheduler
 
 # ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~
 # SequenceNote class
@@ -42,83 +50,560 @@ class SequenceNote(object):
 def cmp_by_beat(a,b):
         return cmp(a.beat,b.beat)
 
+def index_to_tone(index,canonical=False):
+    """return the Tone for a chromatic tone index.  canonical only
+    matters for the first octave, where Tone(index) is canonical."""
+    if 0 <= index < TONES_PER_CHROMATIC_OCTAVE and not canonical:
+        return Tone(chromatic_glyphs[index],0)
+    return Tone(index)
+
+# ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~
+# SequenceColumns - columnar note storage
+# ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~
+class SequenceColumns(object):
+    """SequenceColumns holds the notes of a Sequence in parallel typed
+    arrays rather than as SequenceNote objects:
+
+    beats     -- start of each note in beats
+    durations -- duration of each note in beats
+    indices   -- chromatic tone index of each note
+    strengths -- strength of each note [0.0,1.0]
+    canonical -- 1 if the note's tone has no octave
+
+    Indexing or iterating returns SequenceNote views built from the
+    columns.  These are copies; assign a SequenceNote back to an index
+    to change a note.
+    """
+    def __init__(self):
+        self.beats     = array('d')
+        self.durations = array('d')
+        self.indices   = array('l')
+        self.strengths = array('d')
+        self.canonical = array('b')
+    def __len__(self):
+        return len(self.beats)
+    def __getitem__(self,i):
+        if isinstance(i,slice):
+            return [ self[j] for j in range(*i.indices(len(self))) ]
+        return SequenceNote(self.beats[i],
+                            Note(self.tone(i),self.durations[i],self.strengths[i]))
+    def __setitem__(self,i,seqnote):
+        tone = seqnote.note.tone
+        self.beats[i]     = seqnote.beat
+        self.durations[i] = seqnote.note.duration
+        self.indices[i]   = tone.index
+        self.strengths[i] = seqnote.note.strength
+        self.canonical[i] = tone.canonical
+    def __iter__(self):
+        for i in xrange(len(self)):
+            yield self[i]
+    def tone(self,i):
+        """return the Tone of note i"""
+        return index_to_tone(self.indices[i],self.canonical[i])
+    def append_values(self,beat,duration,index,strength,canonical=False):
+        """append a note given as plain values"""
+        assert(0.0 <= strength <= 1.0)
+        self.beats.append(beat)
+        self.durations.append(duration)
+        self.indices.append(index)
+        self.strengths.append(strength)
+        self.canonical.append(canonical)
+    def append(self,seqnote):
+        """append a SequenceNote"""
+        tone = seqnote.note.tone
+        self.append_values(seqnote.beat, seqnote.note.duration,
+                           tone.index, seqnote.note.strength, tone.canonical)
+    def insert(self,i,seqnote):
+        """insert a SequenceNote before index i"""
+        tone = seqnote.note.tone
+        assert(0.0 <= seqnote.note.strength <= 1.0)
+        self.beats.insert(i,seqnote.beat)
+        self.durations.insert(i,seqnote.note.duration)
+        self.indices.insert(i,tone.index)
+        self.strengths.insert(i,seqnote.note.strength)
+        self.canonical.insert(i,tone.canonical)
+    def extend(self,other):
+        """append all the notes of another SequenceColumns"""
+        for name in ('beats','durations','indices','strengths','canonical'):
+            getattr(self,name).extend(getattr(other,name))
+    def merge(self,seqnotes):
+        """merge SequenceNotes into these beat-ordered notes in a
+        single pass.  Notes on the same beat keep their order, with
+        the notes already here first."""
+        new = SequenceColumns()
+        for seqnote in seqnotes:
+            new.append(seqnote)
+        new.sort()
+        n = len(self)
+        m = len(new)
+        a = self.beats
+        b = new.beats
+        order = []
+        i = j = 0
+        while i < n and j < m:
+            if b[j] < a[i]:
+                order.append(n + j)
+                j += 1
+            else:
+                order.append(i)
+                i += 1
+        order.extend(xrange(i,n))
+        order.extend(xrange(n + j,n + m))
+        self.extend(new)
+        self.permute(order)
+    def permute(self,order):
+        """rearrange the notes so that note i becomes old note order[i]"""
+        for name in ('beats','durations','indices','strengths','canonical'):
+            column = getattr(self,name)
+            setattr(self,name,array(column.typecode,[column[j] for j in order]))
+    def sort(self):
+        """stable sort of the notes by beat"""
+        beats = self.beats
+        self.permute(sorted(xrange(len(beats)),key=beats.__getitem__))
+    def copy(self):
+        """return a copy of these notes"""
+        new = SequenceColumns()
+        for name in ('beats','durations','indices','strengths','canonical'):
+            setattr(new,name,getattr(self,name)[:])
+        return new
+    def slice(self,i,j):
+        """return a copy of notes i up to j"""
+        new = SequenceColumns()
+        for name in ('beats','durations','indices','strengths','canonical'):
+            setattr(new,name,getattr(self,name)[i:j])
+        return new
+
+# ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~
+# transforms of SequenceColumns.  Each returns new columns and leaves
+# its input alone.
+# ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~
+def transpose_columns(cols,steps):
+    """move every tone up by steps semitones.  Tones without an octave
+    stay without one."""
+    new = cols.copy()
+    indices = new.indices
+    canonical = new.canonical
+    for i in xrange(len(indices)):
+        if canonical[i]:
+            indices[i] = (indices[i] + steps) % TONES_PER_CHROMATIC_OCTAVE
+        else:
+            indices[i] += steps
+    return new
+
+def reverse_columns(cols):
+    """play the notes backwards: each beat becomes the last beat minus
+    the beat"""
+    new = cols.copy()
+    beats = new.beats
+    if len(beats) == 0:
+        return new
+    tmax = beats[-1]
+    for i in xrange(len(beats)):
+        beats[i] = tmax - beats[i]
+    new.sort()
+    return new
+
+def flip_columns(cols,scale):
+    """flip the notes upside down within the scale"""
+    new = cols.copy()
+    if len(new) == 0:
+        return new
+    tones = scale.tones
+    degrees = scale.degrees
+    indices = new.indices
+    canonical = new.canonical
+    top = scale.degree(Tone(max(indices))) + scale.degree(Tone(min(indices)))
+    for i in xrange(len(indices)):
+        try:
+            new_tone = tones[top - degrees[indices[i]]]
+        except KeyError:
+            scale.degree(new.tone(i)) # raises ValueError
+        indices[i] = new_tone.index
+        canonical[i] = new_tone.canonical
+    return new
+
+def _scale_pattern(scale):
+    """return (tonic pitch class, offsets, positions) for a scale
+    repeating every octave: offsets of its degrees above the tonic and,
+    for each semitone above the tonic, the degree there or None"""
+    tonic = scale.tonic.index % TONES_PER_CHROMATIC_OCTAVE
+    offsets = sorted(set([ i % TONES_PER_CHROMATIC_OCTAVE
+                           for i in scale_index_offsets[scale.name] ]))
+    positions = [ None ] * TONES_PER_CHROMATIC_OCTAVE
+    for d in range(len(offsets)):
+        positions[offsets[d]] = d
+    return (tonic, offsets, positions)
+
+def _map_degrees(cols,from_scale,to_scale,steps):
+    # move each note steps degrees within from_scale, and out to the
+    # same degree of to_scale.  Each note is two table lookups.
+    (tonic, offsets, positions) = _scale_pattern(from_scale)
+    (to_tonic, to_offsets, to_positions) = _scale_pattern(to_scale)
+    n = len(offsets)
+    assert(len(to_offsets) == n)
+    new = cols.copy()
+    indices = new.indices
+    canonical = new.canonical
+    for i in xrange(len(indices)):
+        (octave, offset) = divmod(indices[i] - tonic, TONES_PER_CHROMATIC_OCTAVE)
+        d = positions[offset]
+        if d == None:
+            raise ValueError("%s is not in %s" % (new.tone(i), from_scale))
+        (octave, d) = divmod(octave*n + d + steps, n)
+        index = to_tonic + octave*TONES_PER_CHROMATIC_OCTAVE + to_offsets[d]
+        if canonical[i]:
+            index %= TONES_PER_CHROMATIC_OCTAVE
+        indices[i] = index
+    return new
+
+def diatonic_transpose_columns(cols,steps,scale):
+    """move every note up by steps degrees of the scale, into other
+    octaves as needed.  Raises ValueError for a note not in the
+    scale."""
+    return _map_degrees(cols,scale,scale,steps)
+
+def mode_map_columns(cols,from_scale,to_scale):
+    """move every note from its degree of from_scale to the same degree
+    of to_scale, such as from c major to c minor.  The scales need the
+    same number of degrees.  Raises ValueError for a note not in
+    from_scale."""
+    return _map_degrees(cols,from_scale,to_scale,0)
+
+def stretch_columns(cols,factor):
+    """multiply every beat and duration by factor"""
+    assert(factor > 0.0)
+    new = cols.copy()
+    for column in (new.beats, new.durations):
+        for i in xrange(len(column)):
+            column[i] *= factor
+    return new
+
+def slice_columns(cols,start_beat,stop_beat=None):
+    """return the notes that start in [start_beat,stop_beat), moved so
+    that start_beat is beat 0.  None for stop_beat goes to the end."""
+    i = bisect_left(cols.beats,start_beat)
+    if stop_beat == None:
+        j = len(cols)
+    else:
+        j = bisect_left(cols.beats,stop_beat)
+    new = cols.slice(i,max(i,j))
+    beats = new.beats
+    for k in xrange(len(beats)):
+        beats[k] -= start_beat
+    return new
+
 # ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~
 # Sequence - a sequence of notes
 # ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~
 class Sequence(object):
     """A Sequence is a container for ordered notes with an associated
-    description of the tempo and time signature
+    description of the tempo and time signature.  The notes are kept
+    in Sequence.seq, a SequenceColumns.
+
+    Views share the columns copy-on-write: while a view holds them,
+    the first use of Sequence.seq copies them, so changes made through
+    it never reach the view.
     """
     def __init__(self,rhythm=None):
-        self.seq = []
+        self._seq = SequenceColumns()
+        self._shared = False
         self.rhythm = rhythm
+    def get_seq(self):
+        if self._shared:
+            self._seq = self._seq.copy()
+            self._shared = False
+        return self._seq
+    def set_seq(self,cols):
+        self._seq = cols
+        self._shared = False
+    seq = property(get_seq,set_seq)
+    def _columns(self):
+        # the columns, for reading only
+        return self._seq
+    def _share(self):
+        # hand the columns to a view, which must not change them
+        self._shared = True
+        return self._seq
+    def next_beat(self,rhythm_ratio=1.0):
+        """return the beat just after the last note"""
+        seq = self._seq
+        if len(seq) == 0:
+            return 0
+        return seq.beats[-1] + seq.durations[-1]*rhythm_ratio
     def append(self,note_or_seq):
         """Append a Note to the end of the current sequence"""
         if(type(note_or_seq) == type(Note(Tone(0)))):
-            try:
-                next_beat = self.seq[-1].beat + self.seq[-1].note.duration
-            except IndexError:
-                next_beat = 0
-            seq_note = SequenceNote(next_beat,note_or_seq)
-            self.seq.append(seq_note)
+            note = note_or_seq
+            self.seq.append_values(self.next_beat(), note.duration,
+                                   note.tone.index, note.strength,
+                                   note.tone.canonical)
         else:
-            assert(type(note_or_seq) == type(Sequence()))
-            other = note_or_seq
-            rhythm_ratio = self.rhythm.beats_per_second / other.rhythm.beats_per_second
-            try:
-                next_beat = self.seq[-1].beat + self.seq[-1].note.duration*rhythm_ratio
-            except IndexError:
-                next_beat = 0
-            for seqnote in note_or_seq.seq:
-                new_note = SequenceNote(next_beat,Note(seqnote.note.tone,seqnote.note.duration*rhythm_ratio))
-                self.seq.append(new_note)
-                next_beat += new_note.note.duration
+            assert(isinstance(note_or_seq,(Sequence,SequenceView)))
+            other = note_or_seq._columns()
+            rhythm_ratio = self.rhythm.beats_per_second / note_or_seq.rhythm.beats_per_second
+            next_beat = self.next_beat(rhythm_ratio)
+            for i in xrange(len(other)):
+                duration = other.durations[i]*rhythm_ratio
+                self.seq.append_values(next_beat, duration, other.indices[i],
+                                       other.strengths[i], other.canonical[i])
+                next_beat += duration
     def insert(self,seqnote):
-        """Insert a SequenceNote to the proper point"""
+        """Insert a SequenceNote to the proper point, after any notes
+        on the same beat"""
         assert(type(seqnote) == type(SequenceNote(0.,Note(Tone(0)))))
-        self.seq.append(seqnote)
-        self.seq.sort(cmp_by_beat)
+        i = bisect_right(self.seq.beats,seqnote.beat)
+        self.seq.insert(i,seqnote)
+    def insert_many(self,seqnotes):
+        """Insert many SequenceNotes, in any order, in one merge pass.
+        Notes on the same beat keep the order they were given in."""
+        seqnotes = list(seqnotes)
+        for seqnote in seqnotes:
+            assert(type(seqnote) == type(SequenceNote(0.,Note(Tone(0)))))
+        self.seq.merge(seqnotes)
+    def note_times(self,start_time):
+        """yield (start, end, tone, strength) for each note in order,
+        with times in seconds from start_time"""
+        seq = self._seq
+        beats_per_second = self.rhythm.beats_per_second
+        for i in xrange(len(seq)):
+            beat = seq.beats[i]
+            start = start_time + beat/beats_per_second
+            end   = start_time + (beat + seq.durations[i])/beats_per_second
+            yield (start, end, seq.tone(i), seq.strengths[i])
     def play(self,start_time,channel):
         # XXX can this be a variant of play_and_wait?
         """play this sequence through the channel asynchronously.  Send
         the notes and return."""
-        for seq_note in self.seq:
-            start = start_time + seq_note.beat/self.rhythm.beats_per_second
-            end   = start_time + (seq_note.beat + seq_note.note.duration)/self.rhythm.beats_per_second
-            channel.play_note(start, end,
-                              seq_note.note.tone, seq_note.note.strength)
-    def play_and_wait(self,start_time,channel):
-        """play this sequence through the channel, return when it finishes."""
-        dt = 1 # pass as parameter?
-        processing_time = 0.1
-        t1 = channel.now + dt - processing_time
-        for seq_note in self.seq:
-            start = start_time + seq_note.beat/self.rhythm.beats_per_second
-            end   = start_time + (seq_note.beat + seq_note.note.duration)/self.rhythm.beats_per_second
-            channel.play_note(start, end,
-                              seq_note.note.tone, seq_note.note.strength)
-            if end > t1:
-                delta = float(t1 - channel.now)
-                if delta > 0:
-                    sleep(delta)
-                t1 = channel.now + dt - processing_time
-        # remember to not return until that final note has finished
-        delta = float(end - channel.now)
-        if delta > 0:
-            sleep(delta)
+        for (start, end, tone, strength) in self.note_times(start_time):
+            channel.play_note(start, end, tone, strength)
+    def play_async(self,start_time,scheduler):
+        """queue this sequence on a ramu.scheduler.Scheduler and return
+        its Playback right away.  Wait for or cancel the Playback to
+        control the sequence; many sequences can share one scheduler.
+        A scheduler that is already running sends the notes of a
+        channel that is not real-time as soon as they are queued, so
+        parts only merge in time order if they are all queued before
+        the scheduler starts."""
+        playback = scheduler.playback()
+        self.play(start_time,playback)
+        return playback
+    def play_and_wait(self,start_time,channel,lookahead=1.0):
+        """play this sequence through the channel, return when it
+        finishes.  Notes are fed to the channel lookahead seconds
+        ahead of time by a ramu.scheduler.Scheduler, and its late-note
+        and jitter statistics are returned."""
+        scheduler = Scheduler(channel,lookahead)
+        self.play(start_time,scheduler)
+        scheduler.start()
+        try:
+            scheduler.wait()
+        finally:
+            scheduler.stop()
+        return scheduler.stats
     def reverse(self):
-        tmax = self.seq[-1].beat
-        for n in self.seq:
-            n.beat = tmax - n.beat
-        self.seq.sort(cmp_by_beat)
-    def flip(self,scale=Scale(Tone('c',0),"chromatic",12)):
-        highest_tone = reduce(max,[x.note.tone for x in self.seq])
-        lowest_tone = reduce(min,[x.note.tone for x in self.seq])
-        max_index = scale.tones.index(highest_tone)
-        min_index = scale.tones.index(lowest_tone)
-        #print "highest",highest_tone,max_index
-        for i,sn in enumerate(self.seq):
-            new_index = max_index - scale.tones.index(sn.note.tone) + min_index
-            new_tone = scale.tones[new_index]
-            self.seq[i].note.tone = new_tone
-            
+        self.seq = reverse_columns(self._seq)
+    def flip(self,scale=None):
+        """flip the notes upside down within the scale, which defaults
+        to the chromatic scale over the MIDI range"""
+        if scale is None:
+            scale = Scale(Tone('c',0),"chromatic",12)
+        self.seq = flip_columns(self._seq,scale)
+    def diatonic_transpose(self,steps,scale):
+        """move every note up by steps degrees of the scale"""
+        self.seq = diatonic_transpose_columns(self._seq,steps,scale)
+    def mode_map(self,from_scale,to_scale):
+        """move every note to the same degree of another scale"""
+        self.seq = mode_map_columns(self._seq,from_scale,to_scale)
+    # ======================================================================
+    # views
+    def view(self):
+        """return a SequenceView of the notes as they are now"""
+        return SequenceView(self)
+    def transposed(self,steps):
+        return self.view().transposed(steps)
+    def reversed(self):
+        return self.view().reversed()
+    def flipped(self,scale=None):
+        return self.view().flipped(scale)
+    def stretched(self,factor):
+        return self.view().stretched(factor)
+    def diatonic_transposed(self,steps,scale):
+        return self.view().diatonic_transposed(steps,scale)
+    def mode_mapped(self,from_scale,to_scale):
+        return self.view().mode_mapped(from_scale,to_scale)
+    def sliced(self,start_beat,stop_beat=None):
+        return self.view().sliced(start_beat,stop_beat)
+    def concatenated(self,other):
+        """return a SequenceRope of this followed by other, as append
+        would make without copying any notes"""
+        return SequenceRope(self,other)
+
+# ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~
+# SequenceView - a lazily transformed Sequence
+# ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~
+class SequenceView(object):
+    """A SequenceView is an immutable Sequence described as a chain of
+    transforms of another Sequence.  Making a view copies no notes;
+    the transforms are applied when the view is played, appended to a
+    Sequence or turned into one with to_sequence().  A view holds the
+    notes its Sequence had when the view was made.  The Sequence copies
+    its notes before it next changes them, so later changes to the
+    Sequence do not show through.
+
+    Each transform returns a new view, so one theme can have any
+    number of variants:
+
+      seq.reversed().transposed(7)
+      seq.flipped(scale).stretched(2.0).sliced(0,8)
+    """
+    def __init__(self,source,transform=None,args=()):
+        """source is a Sequence or SequenceView.  transform is one of
+        the column transforms, called as transform(columns,*args).  A
+        view with no transform holds the notes of its source as they
+        are now."""
+        self.rhythm = source.rhythm
+        self.transform = transform
+        self.args = args
+        self._snapshot = None
+        if transform == None:
+            if isinstance(source,Sequence):
+                self._snapshot = source._share()
+            else:
+                self._snapshot = source._columns()
+        elif isinstance(source,Sequence):
+            source = SequenceView(source)
+        self.source = source
+    def __len__(self):
+        return len(self._columns())
+    def _columns(self):
+        # the transformed notes, for reading only
+        if self.transform == None:
+            return self._snapshot
+        return self.transform(self.source._columns(),*self.args)
+    def get_seq(self):
+        """return new SequenceColumns of the transformed notes"""
+        cols = self._columns()
+        if cols is self._snapshot:
+            cols = cols.copy()
+        return cols
+    seq = property(get_seq)
+    def to_sequence(self):
+        """return a new Sequence of the transformed notes"""
+        s = Sequence(self.rhythm)
+        s.seq = self.seq
+        return s
+    def transposed(self,steps):
+        """return a view with every tone moved up by steps semitones"""
+        if self.transform == transpose_columns:
+            return SequenceView(self.source,transpose_columns,(self.args[0] + steps,))
+        return SequenceView(self,transpose_columns,(steps,))
+    def reversed(self):
+        """return a view with the notes backwards, as Sequence.reverse"""
+        return SequenceView(self,reverse_columns)
+    def flipped(self,scale=None):
+        """return a view flipped upside down, as Sequence.flip"""
+        if scale is None:
+            scale = Scale(Tone('c',0),"chromatic",12)
+        return SequenceView(self,flip_columns,(scale,))
+    def stretched(self,factor):
+        """return a view with beats and durations times factor"""
+        if self.transform == stretch_columns:
+            return SequenceView(self.source,stretch_columns,(self.args[0]*factor,))
+        return SequenceView(self,stretch_columns,(factor,))
+    def diatonic_transposed(self,steps,scale):
+        """return a view moved up by steps degrees of the scale"""
+        return SequenceView(self,diatonic_transpose_columns,(steps,scale))
+    def mode_mapped(self,from_scale,to_scale):
+        """return a view with each note moved from its degree of
+        from_scale to the same degree of to_scale"""
+        return SequenceView(self,mode_map_columns,(from_scale,to_scale))
+    def sliced(self,start_beat,stop_beat=None):
+        """return a view of the notes starting in [start_beat,stop_beat),
+        moved to start at beat 0"""
+        return SequenceView(self,slice_columns,(start_beat,stop_beat))
+    def concatenated(self,other):
+        """return a SequenceRope of this followed by other"""
+        return SequenceRope(self,other)
+    def note_times(self,start_time):
+        return self.to_sequence().note_times(start_time)
+    def play(self,start_time,channel):
+        self.to_sequence().play(start_time,channel)
+    def play_async(self,start_time,scheduler):
+        return self.to_sequence().play_async(start_time,scheduler)
+    def play_and_wait(self,start_time,channel,lookahead=1.0):
+        return self.to_sequence().play_and_wait(start_time,channel,lookahead)
+
+# ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~
+# SequenceRope - sequences joined end to end
+# ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~
+class SequenceRope(SequenceView):
+    """A SequenceRope is a SequenceView of two sequences, views or
+    ropes, left then right.  Joining is O(1): the notes of each part
+    are placed and their tempo scaled only when the rope is played or
+    turned into a Sequence, so a song can be built from thousands of
+    repeated bars.  The rope has the rhythm of its first part, and its
+    notes are the same as appending each part in order to a copy of
+    the first part with Sequence.append.
+    """
+    def __init__(self,left,right):
+        assert(left.rhythm != None and right.rhythm != None)
+        if isinstance(left,Sequence):
+            left = SequenceView(left)
+        if isinstance(right,Sequence):
+            right = SequenceView(right)
+        self.left = left
+        self.right = right
+        self.source = None
+        self.transform = None
+        self.args = ()
+        self._snapshot = None
+        self.rhythm = left.rhythm
+    def get_segments(self):
+        """return the views joined, in order"""
+        segments = []
+        stack = [ self ]
+        # no recursion, so long chains of ropes are fine
+        while stack:
+            node = stack.pop()
+            if isinstance(node,SequenceRope):
+                stack.append(node.right)
+                stack.append(node.left)
+            else:
+                segments.append(node)
+        return segments
+    segments = property(get_segments)
+    def __len__(self):
+        return sum([ len(s) for s in self.segments ])
+    def _columns(self):
+        segments = self.segments
+        new = segments[0]._columns().copy()
+        beats_per_second = self.rhythm.beats_per_second
+        for segment in segments[1:]:
+            other = segment._columns()
+            ratio = beats_per_second / segment.rhythm.beats_per_second
+            if len(new) == 0:
+                next_beat = 0
+            else:
+                next_beat = new.beats[-1] + new.durations[-1]*ratio
+            if ratio == 1.0:
+                durations = other.durations
+            else:
+                durations = array('d',[ d*ratio for d in other.durations ])
+            beats = new.beats
+            for d in durations:
+                beats.append(next_beat)
+                next_beat += d
+            new.durations.extend(durations)
+            new.indices.extend(other.indices)
+            new.strengths.extend(other.strengths)
+            new.canonical.extend(other.canonical)
+        return new
+
+def concatenate(sequences):
+    """return a SequenceRope joining a list of sequences, views or
+    ropes in order, or the one item of a list of one"""
+    assert(len(sequences) > 0)
+    rope = sequences[0]
+    for s in sequences[1:]:
+        rope = SequenceRope(rope,s)
+    return rope
@@ -0,0 +1,231 @@
+# ramu.midifile.channel - write notes to a Standard MIDI File
+#
+# Copyright (C) 2009-2010 Roger Allen (rallen@gmail.com)
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.
+#
+__doc__ = """
+ramu.midifile.channel contains a Channel class that writes the notes
+it is given to a Standard MIDI File instead of playing them.
+
+Events are buffered in memory and sorted and encoded when the channel
+is closed, so notes may be sent in any order.  Nothing waits on the
+wall clock; the channel is not real-time.
+"""
+from .. import channel
+from .smf import *
+
+# ======================================================================
+class TrackChannel(object):
+    """TrackChannel is a channel-like view of one track of a midifile
+    Channel.  Use Channel.track() to get one."""
+    def __init__(self, parent, track):
+        self.parent = parent
+        self.track  = track
+    def start_note(self, time, tone, strength):
+        self.parent._note(self.track, time, MIDI_NOTE_ON, tone, strength)
+    def stop_note(self, time, tone, strength):
+        self.parent._note(self.track, time, MIDI_NOTE_OFF, tone, strength)
+    def play_note(self, start, stop, tone, strength):
+        self.start_note(start, tone, strength)
+        self.stop_note(stop, tone, strength)
+    def get_now(self):
+        return self.parent.now
+    now = property(get_now)
+
+# ======================================================================
+class Channel(channel.Channel):
+    """Channel is a container that takes in tones and timing
+    information and writes them to a Standard MIDI File when closed.
+    """
+    realtime = False
+
+    def __init__(self, file, format=0, beats_per_minute=120,
+                 ticks_per_beat=480, midi_channel_id=0,
+                 zero_velocity_off=True):
+        """Create the channel.
+
+        Keyword arguments:
+        file              -- a filename or a file object opened for
+                             binary writing
+        format            -- 0 for a single track, 1 for a tempo track
+                             followed by note tracks (see track())
+        beats_per_minute  -- tempo written to the file
+        ticks_per_beat    -- time resolution of the file
+        midi_channel_id   -- midi channel 0-15 the notes are sent on
+        zero_velocity_off -- write note offs as velocity 0 note ons so
+                             that running status covers them too
+        """
+        channel.Channel.__init__(self)
+        assert(format in (0,1))
+        assert(0 <= midi_channel_id < 16)
+        self._file              = file
+        self._format            = format
+        self._beats_per_minute  = beats_per_minute
+        self._ticks_per_beat    = ticks_per_beat
+        self._one_second        = ticks_per_beat * beats_per_minute / 60.0
+        self._midi_channel_id   = midi_channel_id
+        self._zero_velocity_off = zero_velocity_off
+        self._tracks            = [ [] ] # per track: (tick, order, count, status, data1, data2)
+        self._count             = 0      # keeps events on a tick in order
+        self._closed            = False
+        self._default_track     = 0
+        if format == 1:
+            self._tracks.append([])
+            self._default_track = 1
+
+    def track(self, index):
+        """return a channel-like TrackChannel that sends notes to the
+        given note track, counting from 0.  Only for format 1 files,
+        where note track i is written after the tempo track."""
+        assert(self._format == 1 and index >= 0)
+        while len(self._tracks) < index + 2:
+            self._tracks.append([])
+        return TrackChannel(self, index + 1)
+
+    def _note(self, track, time, status, tone, strength):
+        assert(not self._closed)
+        assert(0.0<=strength<=1.0)
+        assert(0 <= tone.index < 128)
+        velocity = int(127*strength)
+        tick = int(round(time*self._one_second))
+        assert(tick >= 0)
+        if status == MIDI_NOTE_OFF:
+            order = 0 # note offs go before note ons on the same tick,
+                      # but see _order_events
+            if self._zero_velocity_off:
+                status = MIDI_NOTE_ON
+                velocity = 0
+        else:
+            order = 1
+            # a velocity 0 note on is a note off
+            velocity = max(1, velocity)
+        self._tracks[track].append((tick, order, self._count,
+                                    status | self._midi_channel_id,
+                                    tone.index, velocity))
+        self._count += 1
+        if time > self._now:
+            self._now = time
+
+    def start_note(self,time,tone,strength):
+        """Start playing a note.
+
+        Keyword arguments:
+        time     -- time to start playing in seconds.  1.0 === 1 second
+        tone     -- the tone to play
+        strength -- strength to apply to playing the note [0.0,1.0]
+        """
+        self._note(self._default_track, time, MIDI_NOTE_ON, tone, strength)
+
+    def stop_note(self,time,tone,strength):
+        """Stop playing a note.
+
+        Keyword arguments:
+        time     -- time to stop playing in seconds.  1.0 === 1 second
+        tone     -- the tone to play
+        strength -- strength to apply to stopping the note [0.0,1.0]
+        """
+        self._note(self._default_track, time, MIDI_NOTE_OFF, tone, strength)
+
+    def _order_events(self, events):
+        """sort events by tick.  On each tick, note offs for notes that
+        were already sounding come first, then note ons, then the note
+        offs of notes that started on that tick, so a note too short
+        for a tick still ends after it starts."""
+        events.sort()
+        sounding = {} # (midi channel, key) : notes on
+        ordered = []
+        i = 0
+        n = len(events)
+        while i < n:
+            tick = events[i][0]
+            j = i
+            while j < n and events[j][0] == tick:
+                j += 1
+            ons = []
+            late_offs = []
+            for event in events[i:j]:
+                key = (event[3] & 0x0f, event[4])
+                if event[1] == 1:
+                    ons.append(event)
+                elif sounding.get(key, 0) > 0:
+                    sounding[key] -= 1
+                    ordered.append(event)
+                else:
+                    late_offs.append(event)
+            for event in ons:
+                key = (event[3] & 0x0f, event[4])
+                sounding[key] = sounding.get(key, 0) + 1
+            ordered.extend(ons)
+            for event in late_offs:
+                key = (event[3] & 0x0f, event[4])
+                if sounding.get(key, 0) > 0:
+                    sounding[key] -= 1
+            ordered.extend(late_offs)
+            i = j
+        return ordered
+
+    def _encode_track(self, events, meta=False):
+        """return the bytes of one track's events, with delta times and
+        running status.  meta adds the tempo and time signature."""
+        buf = bytearray()
+        if meta:
+            tempo = bpm_to_tempo(self._beats_per_minute)
+            buf.extend([0, MIDI_META, META_TEMPO, 3,
+                        (tempo >> 16) & 0xff, (tempo >> 8) & 0xff, tempo & 0xff])
+            # 4/4, 24 clocks per click, 8 32nds per quarter
+            buf.extend([0, MIDI_META, META_TIME_SIGNATURE, 4, 4, 2, 24, 8])
+        events = self._order_events(events)
+        last_tick = 0
+        running = None
+        for (tick, order, count, status, data1, data2) in events:
+            write_varlen(buf, tick - last_tick)
+            last_tick = tick
+            if status != running:
+                buf.append(status)
+                running = status
+            buf.append(data1)
+            buf.append(data2)
+        buf.extend([0, MIDI_META, META_END_OF_TRACK, 0])
+        return buf
+
+    def get_data(self):
+        """return the bytes of the Standard MIDI File"""
+        chunks = [ header_chunk(self._format, len(self._tracks), self._ticks_per_beat) ]
+        for (i, events) in enumerate(self._tracks):
+            chunks.append(track_chunk(self._encode_track(events, i == 0)))
+        return ''.join(chunks)
+
+    def close(self):
+        """sort and encode all the events and write the file"""
+        if self._closed:
+            return
+        data = self.get_data()
+        self._closed = True
+        if hasattr(self._file, 'write'):
+            self._file.write(data)
+        else:
+            f = open(self._file, 'wb')
+            try:
+                f.write(data)
+            finally:
+                f.close()
+
+    # ======================================================================
+    # allow the with statement
+    def __exit__(self, type, value, traceback):
+        self.close()
+        return False
@@ -0,0 +1,318 @@
+# ramu.midifile.reader - read notes from a Standard MIDI File
+#
+# Copyright (C) 2009-2010 Roger Allen (rallen@gmail.com)
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.
+#
+__doc__ = """
+ramu.midifile.reader contains the Reader class, which reads the notes
+of a Standard MIDI File into Sequences.
+
+The file is memory-mapped and its events are parsed straight from the
+map, so nothing larger than one event is copied.  Notes can be read
+lazily with Reader.iter_notes() or Reader.iter_note_values(), or all
+at once with read_sequence().
+
+Note-ons are paired with their note-offs (or velocity 0 note-ons)
+first in, first out.  Times are converted through the file's tempo map,
+so a note's beat is in the beats of the Sequence's Rhythm even when
+the file changes tempo.
+"""
+import os
+import mmap
+import struct
+from bisect import bisect_right
+from ..music import Rhythm, Note
+from ..instruments.sequencer import Sequence, SequenceNote, index_to_tone
+from .smf import *
+
+# ======================================================================
+class TempoMap(object):
+    """TempoMap converts ticks to seconds for a list of tempo changes,
+    which must be added in tick order."""
+    def __init__(self, ticks_per_beat, tempo=500000):
+        self.ticks_per_beat = ticks_per_beat
+        self.ticks   = [ 0 ]
+        self.tempos  = [ tempo ]  # microseconds per beat
+        self.seconds = [ 0.0 ]    # seconds at each tempo change
+    def add(self, tick, tempo):
+        """add a tempo change at tick"""
+        assert(tick >= self.ticks[-1])
+        if tick == self.ticks[-1]:
+            self.tempos[-1] = tempo
+            return
+        self.seconds.append(self.to_seconds(tick))
+        self.ticks.append(tick)
+        self.tempos.append(tempo)
+    def to_seconds(self, tick):
+        """return the time in seconds of tick"""
+        i = bisect_right(self.ticks, tick) - 1
+        return (self.seconds[i] +
+                (tick - self.ticks[i]) * self.tempos[i] / (1e6 * self.ticks_per_beat))
+
+# ======================================================================
+class Reader(object):
+    """Reader reads a Standard MIDI File.
+
+    Reader.format         -- 0, 1 or 2
+    Reader.num_tracks     -- the number of tracks
+    Reader.ticks_per_beat -- the time resolution
+    """
+    def __init__(self, file):
+        """open a Standard MIDI File given a filename or a file object
+        opened for binary reading.  A file object without a file
+        descriptor, like a StringIO, is read into memory from its
+        current position.  Raises ValueError if it is not a Standard
+        MIDI File."""
+        self._file = None
+        self._map = None
+        if isinstance(file, basestring):
+            file = self._file = open(file, 'rb')
+        try:
+            self._map = self._open_map(file)
+            self._read_header()
+        except:
+            # a file opened here is closed; one passed in is left open
+            self.close()
+            raise
+        self._tempo_map = None
+
+    def _open_map(self, file):
+        """return the bytes of file, memory-mapped if it has a file
+        descriptor"""
+        try:
+            fileno = file.fileno()
+        except (AttributeError, IOError, ValueError):
+            # io.UnsupportedOperation is both an IOError and a ValueError
+            fileno = None
+        if fileno == None:
+            data = file.read()
+            size = len(data)
+        else:
+            size = os.fstat(fileno).st_size
+        if size < 14:
+            raise ValueError("not a Standard MIDI File: %d bytes is too "
+                             "short for the header" % size)
+        if fileno == None:
+            return data
+        return mmap.mmap(fileno, 0, access=mmap.ACCESS_READ)
+
+    def _read_header(self):
+        """read the header chunk and find the tracks"""
+        (cid, length, self.format, num_tracks, division) = \
+            struct.unpack('>4sLHHH', self._map[:14])
+        if cid != HEADER_CHUNK:
+            raise ValueError("not a Standard MIDI File: starts with %r, "
+                             "not %r" % (cid, HEADER_CHUNK))
+        if length < 6:
+            raise ValueError("bad Standard MIDI File header length %d" % length)
+        if division & 0x8000:
+            raise ValueError("SMPTE time division is not supported")
+        self.ticks_per_beat = division
+        # find the tracks without reading them
+        self._tracks = []
+        pos = 8 + length
+        size = len(self._map)
+        while pos + 8 <= size and len(self._tracks) < num_tracks:
+            (cid, length) = struct.unpack('>4sL', self._map[pos:pos+8])
+            if cid == TRACK_CHUNK:
+                self._tracks.append((pos + 8, min(pos + 8 + length, size)))
+            pos += 8 + length
+        self.num_tracks = len(self._tracks)
+
+    def close(self):
+        """release the memory map and the file"""
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._map = None
+        if self._file != None:
+            self._file.close()
+            self._file = None
+
+    # ======================================================================
+    # allow the with statement
+    def __enter__(self):
+        return self
+    def __exit__(self, type, value, traceback):
+        self.close()
+        return False
+
+    # ======================================================================
+    # track parsing.  Positions are byte offsets into the file.
+    def _byte(self, track, pos, end):
+        """return the byte at pos, which must be before end"""
+        if pos >= end:
+            raise ValueError("track %d is cut short at byte %d" % (track, pos))
+        return ord(self._map[pos])
+
+    def _varlen(self, track, pos, end):
+        """read a variable-length quantity at pos.  Returns (value,
+        position after the value)."""
+        value = 0
+        while True:
+            b = self._byte(track, pos, end)
+            pos += 1
+            value = (value << 7) | (b & 0x7f)
+            if not b & 0x80:
+                return value, pos
+
+    def _data(self, track, pos, length, end):
+        """return length bytes at pos as a bytearray"""
+        if pos + length > end:
+            raise ValueError("track %d is cut short at byte %d: %d bytes "
+                             "of event data are missing" %
+                             (track, end, pos + length - end))
+        return bytearray(self._map[pos:pos+length])
+
+    def iter_events(self, track):
+        """yield the events of a track as (tick, status, data1, data2).
+        Meta events are (tick, MIDI_META, type, data) and system
+        exclusive events are (tick, status, None, data).  Raises
+        ValueError when the track is cut short or corrupt."""
+        (pos, end) = self._tracks[track]
+        tick = 0
+        running = None
+        while pos < end:
+            (delta, pos) = self._varlen(track, pos, end)
+            tick += delta
+            status = self._byte(track, pos, end)
+            if status & 0x80:
+                pos += 1
+            elif running == None:
+                raise ValueError("track %d has a data byte with no status "
+                                 "before it at byte %d" % (track, pos))
+            else:
+                status = running
+            if status == MIDI_META:
+                kind = self._byte(track, pos, end)
+                (length, pos) = self._varlen(track, pos + 1, end)
+                yield (tick, status, kind, self._data(track, pos, length, end))
+                pos += length
+                if kind == META_END_OF_TRACK:
+                    return
+            elif status == MIDI_SYSTEM_EXCLUSIVE or status == MIDI_SYSTEM_EXCLUSIVE_ESCAPE:
+                (length, pos) = self._varlen(track, pos, end)
+                yield (tick, status, None, self._data(track, pos, length, end))
+                pos += length
+            else:
+                running = status
+                kind = status & 0xf0
+                if kind == MIDI_PROGRAM or kind == MIDI_CHANNEL_AFTERTOUCH:
+                    yield (tick, status, self._byte(track, pos, end), None)
+                    pos += 1
+                else:
+                    yield (tick, status, self._byte(track, pos, end),
+                           self._byte(track, pos + 1, end))
+                    pos += 2
+
+    def _initial_tempo(self, track=0):
+        """return the tempo at tick 0 of a track"""
+        tempo = 500000
+        for (tick, status, kind, data) in self.iter_events(track):
+            if tick > 0:
+                break
+            if status == MIDI_META and kind == META_TEMPO:
+                tempo = (data[0] << 16) | (data[1] << 8) | data[2]
+        return tempo
+
+    def get_tempo_map(self):
+        """return the TempoMap of the first track.  This is the tempo
+        map of the whole file for format 1 files."""
+        if self._tempo_map == None:
+            tempo_map = TempoMap(self.ticks_per_beat)
+            if self.num_tracks:
+                for (tick, status, kind, data) in self.iter_events(0):
+                    if status == MIDI_META and kind == META_TEMPO:
+                        tempo_map.add(tick, (data[0] << 16) | (data[1] << 8) | data[2])
+            self._tempo_map = tempo_map
+        return self._tempo_map
+    tempo_map = property(get_tempo_map)
+
+    def get_rhythm(self):
+        """return a Rhythm with the file's starting tempo"""
+        if not self.num_tracks:
+            return Rhythm(120)
+        return Rhythm(tempo_to_bpm(self._initial_tempo()))
+    rhythm = property(get_rhythm)
+
+    def iter_note_values(self, rhythm=None, tracks=None):
+        """yield each note as a (beat, duration, tone index, strength)
+        tuple, one track at a time.  Within a track, notes come out in
+        the order they end.
+
+        Keyword arguments:
+        rhythm -- beats are counted in this Rhythm.  Defaults to the
+                  file's starting tempo.
+        tracks -- list of track numbers to read, None reads them all
+        """
+        if rhythm == None:
+            rhythm = self.rhythm
+        if tracks == None:
+            tracks = range(self.num_tracks)
+        beats_per_second = rhythm.beats_per_second
+        # format 1 files keep all tempo changes in the first track.
+        # Other formats carry them in the track, so they are read as
+        # the track is parsed.
+        inline_tempo = self.format != 1
+        for track in tracks:
+            if inline_tempo:
+                tempo_map = TempoMap(self.ticks_per_beat)
+            else:
+                tempo_map = self.tempo_map
+            to_seconds = tempo_map.to_seconds
+            sounding = {} # (channel,key) : [ (start tick, velocity), ... ]
+            tick = 0
+            for (tick, status, data1, data2) in self.iter_events(track):
+                kind = status & 0xf0
+                if kind == MIDI_NOTE_ON and data2:
+                    sounding.setdefault((status & 0x0f, data1), []).append((tick, data2))
+                elif kind == MIDI_NOTE_ON or kind == MIDI_NOTE_OFF:
+                    starts = sounding.get((status & 0x0f, data1))
+                    if not starts:
+                        continue
+                    (start, velocity) = starts.pop(0)
+                    beat = to_seconds(start) * beats_per_second
+                    yield (beat, to_seconds(tick) * beats_per_second - beat,
+                           data1, velocity / 127.0)
+                elif inline_tempo and status == MIDI_META and data1 == META_TEMPO:
+                    tempo_map.add(tick, (data2[0] << 16) | (data2[1] << 8) | data2[2])
+            # end any notes that were never stopped at the end of the track
+            for ((channel, key), starts) in sounding.items():
+                for (start, velocity) in starts:
+                    beat = to_seconds(start) * beats_per_second
+                    yield (beat, to_seconds(tick) * beats_per_second - beat,
+                           key, velocity / 127.0)
+
+    def iter_notes(self, rhythm=None, tracks=None):
+        """yield each note as a SequenceNote.  See iter_note_values."""
+        for (beat, duration, index, strength) in self.iter_note_values(rhythm, tracks):
+            yield SequenceNote(beat, Note(index_to_tone(index), duration, strength))
+
+    def read_sequence(self, rhythm=None, tracks=None):
+        """return a Sequence of the notes, in beat order"""
+        if rhythm == None:
+            rhythm = self.rhythm
+        seq = Sequence(rhythm)
+        append_values = seq.seq.append_values
+        for (beat, duration, index, strength) in self.iter_note_values(rhythm, tracks):
+            append_values(beat, duration, index, strength)
+        seq.seq.sort()
+        return seq
+
+def read_sequence(file, rhythm=None, tracks=None):
+    """return a Sequence of the notes in a Standard MIDI File"""
+    with Reader(file) as reader:
+        return reader.read_sequence(rhythm, tracks)
@@ -0,0 +1,92 @@
+# ramu.midifile.smf
+#
+# Copyright (C) 2009-2010 Roger Allen (rallen@gmail.com)
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.
+#
+__doc__ = """
+ramu.midifile.smf contains constants and encoding helpers for
+Standard MIDI Files.
+
+http://www.sonicspot.com/guide/midifiles.html
+"""
+import struct
+
+# ======================================================================
+# constants of interest
+# http://www.onicos.com/staff/iz/formats/midi-event.html
+MIDI_NOTE_OFF = 0x80
+MIDI_NOTE_ON = 0x90
+MIDI_POLY_AFTERTOUCH = 0xa0
+MIDI_CONTROL_MODE = 0xb0
+MIDI_PROGRAM = 0xc0
+MIDI_CHANNEL_AFTERTOUCH = 0xd0
+MIDI_PITCH_WHEEL = 0xe0
+MIDI_SYSTEM_EXCLUSIVE = 0xf0
+MIDI_SYSTEM_EXCLUSIVE_ESCAPE = 0xf7
+MIDI_META = 0xff
+# meta event types
+META_END_OF_TRACK = 0x2f
+META_TEMPO = 0x51
+META_TIME_SIGNATURE = 0x58
+
+# chunk ids
+HEADER_CHUNK = 'MThd'
+TRACK_CHUNK = 'MTrk'
+
+# microseconds in a minute, for tempo conversion
+US_PER_MINUTE = 60000000
+
+def bpm_to_tempo(beats_per_minute):
+    """convert beats per minute to a tempo in microseconds per beat"""
+    return int(round(US_PER_MINUTE / float(beats_per_minute)))
+
+def tempo_to_bpm(tempo):
+    """convert a tempo in microseconds per beat to beats per minute"""
+    return US_PER_MINUTE / float(tempo)
+
+def write_varlen(buf, value):
+    """append value to the bytearray buf as a variable-length quantity"""
+    assert(0 <= value < 0x10000000)
+    if value < 0x80:
+        buf.append(value)
+        return
+    tmp = [ value & 0x7f ]
+    value >>= 7
+    while value:
+        tmp.append(0x80 | (value & 0x7f))
+        value >>= 7
+    tmp.reverse()
+    buf.extend(tmp)
+
+def read_varlen(data, pos):
+    """read a variable-length quantity from data, a bytearray, at pos.
+    Returns (value, position after the value)."""
+    value = 0
+    while True:
+        b = data[pos]
+        pos += 1
+        value = (value << 7) | (b & 0x7f)
+        if not b & 0x80:
+            return value, pos
+
+def header_chunk(format, num_tracks, ticks_per_beat):
+    """return the bytes of an MThd chunk"""
+    return struct.pack('>4sLHHH', HEADER_CHUNK, 6, format, num_tracks, ticks_per_beat)
+
+def track_chunk(data):
+    """return the bytes of an MTrk chunk holding data"""
+    return struct.pack('>4sL', TRACK_CHUNK, len(data)) + bytes(data)
@@ -0,0 +1,244 @@
+# ramu.monitor
+#
+# Copyright (C) 2009-2010 Roger Allen (rallen@gmail.com)
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.
+#
+__doc__ = """
+ramu.monitor contains the MonitoredChannel class, which wraps any
+channel and counts what passes through it:
+
+- note events, and events per second of wall-clock time
+- note-on and note-off counts for each tone index
+- voices currently sounding, and the most at once.  Notes sent with
+  play_note() sound until their stop time, measured against the times
+  of later events.
+- with a clock, a histogram of how late (or early) each event arrived
+  compared to its time
+
+MonitoredChannel.snapshot() returns all of this as a dictionary, and
+is safe to call from another thread while notes are being sent.
+"""
+import heapq
+import threading
+from bisect import bisect_right
+from .scheduler import monotonic
+
+# lateness histogram bin edges in seconds.  Negative is early.
+LATENESS_EDGES = [ -1.0, -0.1, -0.01, -0.001, 0.0, 0.001, 0.01, 0.1, 1.0 ]
+
+# ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~
+# MonitoredChannel class
+# ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~
+class MonitoredChannel(object):
+    """MonitoredChannel passes notes on to another channel and keeps
+    counts of them.  It can be used anywhere its channel can; other
+    attributes are looked up on the wrapped channel.
+    """
+    def __init__(self, channel, clock=None, edges=LATENESS_EDGES, wall_clock=monotonic):
+        """Wrap a channel.
+
+        Keyword arguments:
+        channel    -- the channel to pass notes on to
+        clock      -- a function returning the current time in the
+                      channel's timeline, used to measure lateness.
+                      None uses channel.now for a real-time channel
+                      and measures nothing otherwise.
+        edges      -- sorted lateness histogram bin edges in seconds
+        wall_clock -- a function returning seconds, for events/second
+        """
+        assert(list(edges) == sorted(edges))
+        self.channel = channel
+        if clock == None and getattr(channel, 'realtime', False):
+            clock = lambda: channel.now
+        self._clock      = clock
+        self._wall_clock = wall_clock
+        self.edges       = list(edges)
+        self._lock       = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """zero all the counts"""
+        with self._lock:
+            self._events      = 0
+            self._start       = self._wall_clock()
+            self._note_ons    = {}  # tone index : count
+            self._note_offs   = {}  # tone index : count
+            self._sounding    = {}  # tone index : voices
+            self._pending     = []  # heap of (stop time, tone index) from play_note
+            self._voices      = 0
+            self._max_voices  = 0
+            self._histogram   = [ 0 ] * (len(self.edges) + 1)
+            self._late_events = 0
+            self._lateness_n  = 0
+            self._lateness_total = 0.0
+            self._min_lateness = None
+            self._max_lateness = None
+
+    def get_realtime(self):
+        return getattr(self.channel, 'realtime', False)
+    realtime = property(get_realtime)
+
+    def get_now(self):
+        """return the wrapped channel's current time"""
+        return self.channel.now
+    now = property(get_now)
+
+    def _lateness(self, time):
+        # called with self._lock held
+        late = self._clock() - time
+        self._histogram[bisect_right(self.edges, late)] += 1
+        if late > 0.0:
+            self._late_events += 1
+        self._lateness_n += 1
+        self._lateness_total += late
+        if self._min_lateness == None or late < self._min_lateness:
+            self._min_lateness = late
+        if self._max_lateness == None or late > self._max_lateness:
+            self._max_lateness = late
+
+    def _on(self, index):
+        # called with self._lock held
+        self._events += 1
+        self._note_ons[index] = self._note_ons.get(index, 0) + 1
+        self._sounding[index] = self._sounding.get(index, 0) + 1
+        self._voices += 1
+        if self._voices > self._max_voices:
+            self._max_voices = self._voices
+
+    def _off(self, index):
+        # called with self._lock held
+        self._events += 1
+        self._note_offs[index] = self._note_offs.get(index, 0) + 1
+        self._release(index)
+
+    def _retire(self, time):
+        # called with self._lock held.  Release the play_note voices
+        # that stopped by time.
+        pending = self._pending
+        while pending and pending[0][0] <= time:
+            (stop, index) = heapq.heappop(pending)
+            self._release(index)
+
+    def _release(self, index):
+        # called with self._lock held
+        count = self._sounding.get(index, 0)
+        if count > 0:
+            self._voices -= 1
+            if count > 1:
+                self._sounding[index] = count - 1
+            else:
+                del self._sounding[index]
+
+    def start_note(self, time, tone, strength):
+        """count the note-on and pass it on"""
+        with self._lock:
+            if self._clock != None:
+                self._lateness(time)
+            self._retire(time)
+            self._on(tone.index)
+        self.channel.start_note(time, tone, strength)
+
+    def stop_note(self, time, tone, strength):
+        """count the note-off and pass it on"""
+        with self._lock:
+            if self._clock != None:
+                self._lateness(time)
+            self._retire(time)
+            self._off(tone.index)
+        self.channel.stop_note(time, tone, strength)
+
+    def play_note(self, start, stop, tone, strength):
+        """count the note-on and note-off and pass the note on.
+        Lateness is measured for the start.  The note's voice is active
+        until an event at or after stop."""
+        with self._lock:
+            if self._clock != None:
+                self._lateness(start)
+            self._retire(start)
+            self._on(tone.index)
+            self._events += 1
+            self._note_offs[tone.index] = self._note_offs.get(tone.index, 0) + 1
+            heapq.heappush(self._pending, (stop, tone.index))
+        self.channel.play_note(start, stop, tone, strength)
+
+    def all_notes_off(self):
+        """forget the sounding voices and pass it on"""
+        with self._lock:
+            self._sounding = {}
+            self._pending = []
+            self._voices = 0
+        self.channel.all_notes_off()
+
+    def snapshot(self):
+        """return a dictionary of the counts so far.
+
+        events            -- note-on and note-off events
+        events_per_second -- events over the wall-clock time since
+                             the channel was wrapped or reset
+        note_ons          -- { tone index : note-ons }
+        note_offs         -- { tone index : note-offs }
+        active_voices     -- notes started and not yet stopped.
+                             With a clock, play_note voices whose stop
+                             time has passed are released first.
+        max_active_voices -- the most active voices at once
+        lateness          -- None without a clock, else a dictionary:
+            edges         -- the histogram bin edges in seconds
+            counts        -- events in each bin.  counts[0] is before
+                             edges[0] and counts[i] is in
+                             [edges[i-1],edges[i])
+            late_events   -- events sent after their time
+            mean, min, max -- lateness in seconds, None if no events
+        """
+        with self._lock:
+            if self._clock != None:
+                self._retire(self._clock())
+            elapsed = self._wall_clock() - self._start
+            rate = 0.0
+            if elapsed > 0.0:
+                rate = self._events / elapsed
+            lateness = None
+            if self._clock != None:
+                mean = None
+                if self._lateness_n:
+                    mean = self._lateness_total / self._lateness_n
+                lateness = { 'edges'       : list(self.edges),
+                             'counts'      : list(self._histogram),
+                             'late_events' : self._late_events,
+                             'mean'        : mean,
+                             'min'         : self._min_lateness,
+                             'max'         : self._max_lateness }
+            return { 'events'            : self._events,
+                     'events_per_second' : rate,
+                     'note_ons'          : dict(self._note_ons),
+                     'note_offs'         : dict(self._note_offs),
+                     'active_voices'     : self._voices,
+                     'max_active_voices' : self._max_voices,
+                     'lateness'          : lateness }
+
+    def __getattr__(self, name):
+        # only called for attributes not found here, such as close()
+        if name == 'channel':
+            raise AttributeError(name)
+        return getattr(self.channel, name)
+
+    # ======================================================================
+    # allow the with statement
+    def __enter__(self):
+        self.channel.__enter__()
+        return self
+    def __exit__(self, type, value, traceback):
+        return self.channel.__exit__(type, value, traceback)
@@ -45,7 +45,10 @@ with a certain strength or loudness.
 Rhythm - a class containing beats per second, etc.
 
 """
+import threading
 from math import floor
+from array import array
+from collections import OrderedDict
 
 # ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~
 # glypho = glyphs + octaves
@@ -72,14 +75,100 @@ def chromatic_tone_to_frequency(index):
     """convert chromatic tone index to frequency"""
     return ( 440.0 * 2.0**( (index - 69) / float(TONES_PER_CHROMATIC_OCTAVE)))
 
+# the full MIDI range of tone indices has precomputed frequencies
+MIDI_TONES = 128
+chromatic_frequencies = [ chromatic_tone_to_frequency(i) for i in range(MIDI_TONES) ]
+
+# glyph to pitch class (0-11) dictionary.  Upper & capitalized
+# spellings are included so the common cases skip lower()
+chromatic_glyph_pitch_classes = {}
+for _i,_g in enumerate(chromatic_glyphs):
+    for _s in (_g, _g.upper(), _g.capitalize()):
+        chromatic_glyph_pitch_classes[_s] = _i % TONES_PER_CHROMATIC_OCTAVE
+del _i,_g,_s
+
+def glyph_to_pitch_class(glyph):
+    """convert a glyph like 'c#' or 'Bb' to its pitch class 0-11"""
+    try:
+        return chromatic_glyph_pitch_classes[glyph]
+    except KeyError:
+        pass
+    assert(glyph.lower() in chromatic_glyph_pitch_classes)
+    return chromatic_glyph_pitch_classes[glyph.lower()]
+
 def glypho_to_chromatic_tone_index(glyph,octave):
-    assert(glyph.lower() in chromatic_glyphs)
-    v = chromatic_glyphs.index( glyph.lower() ) % TONES_PER_CHROMATIC_OCTAVE
+    v = glyph_to_pitch_class(glyph)
     o = octave
     if octave == None:
         o = 0
     return TONES_PER_CHROMATIC_OCTAVE * o + v
 
+def glyphos_to_chromatic_tone_indices(glyphos):
+    """convert many glyph+octave names to an array of tone indices in
+    one pass.  A name without an octave becomes its canonical index.
+
+    Keyword arguments:
+    glyphos -- a whitespace separated string like "c4 f#5 bb3" or an
+               iterable of names like ['c4','f#5','bb3']
+    """
+    if isinstance(glyphos, basestring):
+        glyphos = glyphos.split()
+    pitch_classes = chromatic_glyph_pitch_classes
+    indices = array('l')
+    append = indices.append
+    for glypho in glyphos:
+        glyph = glypho.rstrip('0123456789')
+        try:
+            v = pitch_classes[glyph]
+        except KeyError:
+            v = glyph_to_pitch_class(glyph)
+        octave = glypho[len(glyph):]
+        if octave:
+            v += TONES_PER_CHROMATIC_OCTAVE * int(octave)
+        append(v)
+    return indices
+
+# ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~
+# Vectorized conversions.  These take and return numpy arrays, which
+# are only imported when one of these functions is called.
+# ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~
+def chromatic_tone_indices_to_frequencies(indices):
+    """convert an array of chromatic tone indices to frequencies in Hz"""
+    import numpy
+    indices = numpy.asarray(indices, dtype=numpy.float64)
+    return 440.0 * numpy.exp2((indices - 69) / float(TONES_PER_CHROMATIC_OCTAVE))
+
+# the index frequencies_to_chromatic_tone_indices gives a frequency
+# with no pitch
+UNPITCHED_INDEX = -1
+
+def frequencies_to_chromatic_tone_indices(frequencies):
+    """convert an array of frequencies in Hz to the nearest chromatic
+    tone indices.  Returns a tuple of (indices, cents) where cents is
+    the deviation of each frequency from its tone, in [-50,50].
+    Frequencies that are zero, negative, infinite or NaN, such as the
+    unvoiced frames of a pitch tracker, get the index UNPITCHED_INDEX
+    and NaN cents.
+    """
+    import numpy
+    frequencies = numpy.asarray(frequencies, dtype=numpy.float64)
+    with numpy.errstate(all='ignore'):
+        pitched = numpy.isfinite(frequencies) & (frequencies > 0.0)
+        exact = 69 + TONES_PER_CHROMATIC_OCTAVE * numpy.log2(
+            numpy.where(pitched, frequencies, 440.0) / 440.0)
+    nearest = numpy.rint(exact)
+    cents = numpy.where(pitched, 100.0 * (exact - nearest), numpy.nan)
+    indices = numpy.where(pitched, nearest, UNPITCHED_INDEX).astype(numpy.int64)
+    return indices, cents
+
+def chromatic_tone_indices_to_pitch_classes(indices):
+    """split an array of chromatic tone indices into a tuple of
+    (pitch classes, octaves)"""
+    import numpy
+    indices = numpy.asarray(indices, dtype=numpy.int64)
+    octaves, pitch_classes = numpy.divmod(indices, TONES_PER_CHROMATIC_OCTAVE)
+    return pitch_classes, octaves
+
 # ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~
 # Tone
 # ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~
@@ -93,18 +182,36 @@ class Tone(object):
     If the note is initialized only by a glyph, the Tone is 'canonical'
     or without an octave.  This allows for abstract calculations of
     theory, rather than a Tone that can be played.
+
+    Tones are immutable flyweights.  Tone(index) and Tone(glyph,octave)
+    return a shared instance for each (index,canonical) pair, so
+    constructing the same Tone again is just a dictionary lookup.
     """
-    def __init__( self, index_or_glyph, octave=None ):
+    __slots__ = ( '_index', '_canonical', '_frequency' )
+    _cache = {}
+    def __new__( cls, index_or_glyph, octave=None ):
         """basic way to initialize a class is via an index"""
         if type(index_or_glyph) == type(0):
             assert(octave == None)
             index = index_or_glyph
-            self.canonical = (index < TONES_PER_CHROMATIC_OCTAVE)
+            canonical = (index < TONES_PER_CHROMATIC_OCTAVE)
         else:
             index = glypho_to_chromatic_tone_index(index_or_glyph,octave)
-            self.canonical = (octave == None)
-        self.frequency = chromatic_tone_to_frequency(index)
-        self._index = index
+            canonical = (octave == None)
+        key = (cls, index, canonical)
+        try:
+            return cls._cache[key]
+        except KeyError:
+            pass
+        self = object.__new__(cls)
+        object.__setattr__(self, '_index', index)
+        object.__setattr__(self, '_canonical', canonical)
+        if 0 <= index < MIDI_TONES:
+            frequency = chromatic_frequencies[index]
+        else:
+            frequency = chromatic_tone_to_frequency(index)
+        object.__setattr__(self, '_frequency', frequency)
+        return cls._cache.setdefault(key, self)
     @classmethod
     def fromGlypho(cls, glyph, octave=None ):
         """initializes a ChromaticTone from a glyph-octave pair"""
@@ -113,19 +220,41 @@ class Tone(object):
     def get_index(self):
         return self._index
     index = property(get_index)
+    def get_canonical(self):
+        """return True if this tone has no octave"""
+        return self._canonical
+    canonical = property(get_canonical)
+    def get_frequency(self):
+        """return the frequency of this tone in Hz"""
+        return self._frequency
+    frequency = property(get_frequency)
     def get_glyph( self ):
         """return the glyph (no octave) of index"""
         return chromatic_glyphs[ self._index % TONES_PER_CHROMATIC_OCTAVE ]
     glyph = property(get_glyph)
     def get_octave( self ):
         """return the octave of index"""
-        if self.canonical:
+        if self._canonical:
             return None
         return int( self.index / TONES_PER_CHROMATIC_OCTAVE )
     octave = property(get_octave)
+    def __setattr__( self, name, value ):
+        raise AttributeError("Tone is immutable")
+    def __delattr__( self, name ):
+        raise AttributeError("Tone is immutable")
+    def __copy__( self ):
+        return self
+    def __deepcopy__( self, memo ):
+        return self
+    def __reduce__( self ):
+        if self._canonical:
+            # Tone(index) keeps indices outside 0-11, which the glyph
+            # would fold into the first octave
+            return (self.__class__, (self._index,))
+        return (self.__class__, (self.glyph, self.octave))
     def __str__( self ):
         """return glyph + octave as string"""
-        if self.canonical:
+        if self._canonical:
             octave_str = ""
         else:
             octave_str = str(self.octave)
@@ -133,7 +262,7 @@ class Tone(object):
     def __repr__( self ):
         return str(self)
     def __hash__(self):
-        return hash(self.index)
+        return hash(self._index)
     def __cmp__(self,other):
         return cmp(self.index,other.index)
     def __add__(self, other):
@@ -141,11 +270,19 @@ class Tone(object):
             offset = other.index
         elif type(other) == type(0):
             offset = other
-        new_index = self.index + offset
-        if self.canonical:
+        new_index = self._index + offset
+        if self._canonical:
             new_index %= TONES_PER_CHROMATIC_OCTAVE
             return Tone(chromatic_glyphs[new_index])
         return Tone(new_index)
+
+# fill the flyweight cache with the MIDI range and the canonical pitch classes
+for _i in range(MIDI_TONES):
+    Tone(_i)
+for _i in range(TONES_PER_CHROMATIC_OCTAVE):
+    Tone(chromatic_glyphs[_i])
+    Tone(chromatic_glyphs[_i],0)
+del _i
     
 # ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~
 # Note data
@@ -457,29 +594,118 @@ scale_index_offsets = {
 
     }
 
+# ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~
+# LRUCache class
+# ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~
+class LRUCache(object):
+    """A dictionary holding at most maxsize items that drops the least
+    recently used item to make room.  It counts hits and misses."""
+    def __init__(self, maxsize):
+        assert(maxsize > 0)
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    def get(self, key):
+        """return the item for key, or None"""
+        with self._lock:
+            try:
+                value = self._items.pop(key)
+            except KeyError:
+                self.misses += 1
+                return None
+            self._items[key] = value
+            self.hits += 1
+            return value
+    def put(self, key, value):
+        """add an item and return the cached item for key, which is
+        the older one if another thread added it first"""
+        with self._lock:
+            value = self._items.setdefault(key, value)
+            if len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+            return value
+    def clear(self):
+        """drop every item and zero the counts"""
+        with self._lock:
+            self._items.clear()
+            self.hits = 0
+            self.misses = 0
+    def __len__(self):
+        return len(self._items)
+    def get_stats(self):
+        """return a dictionary of hits, misses, size and maxsize"""
+        with self._lock:
+            return { 'hits'    : self.hits,
+                     'misses'  : self.misses,
+                     'size'    : len(self._items),
+                     'maxsize' : self.maxsize }
+    stats = property(get_stats)
+
 # ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~
 # Scale class
 # ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~
 class Scale(object):
-    """Scales are made up of tones"""
-    def __init__(self, tonic, name="major", octaves=1):
-        assert(type(tonic) == type(Tone(0)))
-        self.tonic = tonic
-        assert(name in scale_index_offsets.keys())
-        self.name  = name
-        self.tones = []
-        self.octaves = octaves
+    """Scales are made up of tones.
+
+    Scales are immutable and Scale.tones is a tuple.  Constructed
+    Scales are kept in Scale.cache, an LRUCache keyed by tonic, name
+    and octaves, so asking for the same Scale again returns the same
+    instance.  Scale.cache.stats has the hit and miss counts.
+
+    Scale.degrees maps a tone index to its position in Scale.tones, so
+    degree() does not search the tones.
+    """
+    __slots__ = ( 'tonic', 'name', 'octaves', 'tones', 'degrees' )
+    cache = LRUCache(4096)
+    def __new__(cls, tonic, name="major", octaves=1):
+        assert(type(tonic) == Tone)
+        key = (cls, tonic._index, tonic._canonical, name, octaves)
+        self = cls.cache.get(key)
+        if self is not None:
+            return self
+        assert(name in scale_index_offsets)
+        self = object.__new__(cls)
+        tones = []
         for j in range(octaves):
-            for i in scale_index_offsets[self.name]:
-                self.tones.append(self.tonic + j*TONES_PER_CHROMATIC_OCTAVE + i)
+            for i in scale_index_offsets[name]:
+                tones.append(tonic + j*TONES_PER_CHROMATIC_OCTAVE + i)
+        object.__setattr__(self, 'tonic', tonic)
+        object.__setattr__(self, 'name', name)
+        object.__setattr__(self, 'octaves', octaves)
+        object.__setattr__(self, 'tones', tuple(tones))
+        degrees = {}
+        for i in range(len(tones)):
+            # the first, as tones.index() would find
+            degrees.setdefault(tones[i].index, i)
+        object.__setattr__(self, 'degrees', degrees)
+        return cls.cache.put(key, self)
     def get_glyphs(self):
         return [x.glyph for x in self.tones]
     glyphs = property(get_glyphs)
+    def degree(self,tone):
+        """return the position of tone in Scale.tones, like
+        tones.index(tone).  Raises ValueError if it is not there."""
+        try:
+            return self.degrees[tone.index]
+        except KeyError:
+            raise ValueError("%s is not in %s" % (tone, self))
     def intersect(self,other):
         """return the number of notes that are the same in both scales"""
         set0 = set(self.tones)
         set1 = set(other.tones)
         return sorted([x for x in set0.intersection(set1)])
+    def __setattr__(self, name, value):
+        raise AttributeError("Scale is immutable")
+    def __delattr__(self, name):
+        raise AttributeError("Scale is immutable")
+    def __copy__(self):
+        return self
+    def __deepcopy__(self, memo):
+        return self
+    def __reduce__(self):
+        return (self.__class__, (self.tonic, self.name, self.octaves))
     def __str__(self):
         s = str(self.tonic) + "_" + self.name
         if self.octaves > 1:
@@ -504,28 +730,334 @@ class Scale(object):
         return NotImplemented
 
 # ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~
+# Pitch-class masks
+#
+# A pitch-class mask is a 12-bit integer with bit n set when pitch
+# class n (c=0, c#=1, ...) is present.  Octaves are ignored.
+# ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~
+PITCH_CLASS_MASK_ALL = (1 << TONES_PER_CHROMATIC_OCTAVE) - 1
+
+def pitch_class_mask(tones):
+    """return the pitch-class mask of a collection of tones"""
+    mask = 0
+    for t in tones:
+        mask |= 1 << (t.index % TONES_PER_CHROMATIC_OCTAVE)
+    return mask
+
+def rotate_pitch_class_mask(mask, steps):
+    """transpose a pitch-class mask up by steps semitones"""
+    steps %= TONES_PER_CHROMATIC_OCTAVE
+    mask = (mask << steps) | (mask >> (TONES_PER_CHROMATIC_OCTAVE - steps))
+    return mask & PITCH_CLASS_MASK_ALL
+
+# scale name : [ mask with tonic c, mask with tonic c#, ... ]
+# filled in on demand by get_scale_pitch_class_masks
+_scale_pitch_class_masks = {}
+
+def get_scale_pitch_class_masks(name):
+    """return a list of the 12 pitch-class masks for the named scale,
+    indexed by the pitch class of the tonic."""
+    try:
+        return _scale_pitch_class_masks[name]
+    except KeyError:
+        pass
+    assert(name in scale_index_offsets)
+    base = 0
+    for i in scale_index_offsets[name]:
+        base |= 1 << (i % TONES_PER_CHROMATIC_OCTAVE)
+    masks = [ rotate_pitch_class_mask(base, i)
+              for i in range(TONES_PER_CHROMATIC_OCTAVE) ]
+    _scale_pitch_class_masks[name] = masks
+    return masks
+
+# ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~
+# Scale registry
+#
+# Many names in scale_index_offsets are aliases for the same set of
+# pitch classes, like "major", "ionian" and "bilaval theta".  The
+# registry keeps each distinct set once, keyed by its pitch-class mask
+# with tonic c, so searches only test each set once.  It is built on
+# first use and rebuilt after register_scale or unregister_scale,
+# which also drops the tables cached in it.
+# ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~
+_scale_registry = None
+_scale_registry_lock = threading.Lock()
+
+def _canonical_order(name):
+    # the shortest name of a set is its canonical name
+    return (len(name), name)
+
+def _get_scale_registry():
+    """return the registry dictionary:
+    'mask'  -- { scale name : pitch-class mask with tonic c }
+    'names' -- { pitch-class mask : [ scale names, canonical first ] }
+    'tables' -- cache for _get_unique_scale_masks
+    """
+    global _scale_registry
+    registry = _scale_registry
+    if registry is not None:
+        return registry
+    with _scale_registry_lock:
+        if _scale_registry is None:
+            name_mask = {}
+            mask_names = {}
+            for n in scale_index_offsets:
+                mask = get_scale_pitch_class_masks(n)[0]
+                name_mask[n] = mask
+                mask_names.setdefault(mask, []).append(n)
+            for names in mask_names.values():
+                names.sort(key=_canonical_order)
+            _scale_registry = { 'mask'   : name_mask,
+                                'names'  : mask_names,
+                                'tables' : {} }
+        return _scale_registry
+
+def get_scale_mask(name):
+    """return the pitch-class mask of the named scale with tonic c"""
+    return _get_scale_registry()['mask'][name]
+
+def get_scale_aliases(name):
+    """return the names of every scale with the same pitch classes as
+    the named scale, canonical name first.  The list includes name."""
+    registry = _get_scale_registry()
+    return list(registry['names'][registry['mask'][name]])
+
+def get_canonical_scale_name(name):
+    """return the canonical name of the named scale's pitch classes"""
+    registry = _get_scale_registry()
+    return registry['names'][registry['mask'][name]][0]
+
+def get_unique_scale_names(scale_names=None):
+    """return the canonical names of the distinct pitch-class sets
+    among scale_names, sorted.  None uses all of scale_index_offsets."""
+    registry = _get_scale_registry()
+    if scale_names == None:
+        masks = registry['names'].keys()
+    else:
+        masks = set([ registry['mask'][n] for n in scale_names ])
+    return sorted([ registry['names'][m][0] for m in masks ])
+
+def get_scale_modes(name):
+    """return a list of (degree, semitones, scale name) for the modes
+    of the named scale: the scale started on each of its degrees.
+    semitones is the degree's offset above the tonic and scale name is
+    the canonical name of the mode's pitch classes, or None if no
+    registered scale has them."""
+    registry = _get_scale_registry()
+    mask = registry['mask'][name]
+    names = registry['names']
+    modes = []
+    degree = 0
+    for i in range(TONES_PER_CHROMATIC_OCTAVE):
+        if not mask & (1 << i):
+            continue
+        mode = rotate_pitch_class_mask(mask, -i)
+        mode_names = names.get(mode)
+        if mode_names == None:
+            modes.append((degree, i, None))
+        else:
+            modes.append((degree, i, mode_names[0]))
+        degree += 1
+    return modes
+
+def get_scale_keys_for_mask(mask):
+    """return a list of (tonic pitch class, scale name) for every
+    registered scale whose pitch classes are exactly those in mask,
+    using canonical names.  A set with several modes gives a key for
+    each mode."""
+    names = _get_scale_registry()['names']
+    keys = []
+    for i in range(TONES_PER_CHROMATIC_OCTAVE):
+        if not mask & (1 << i):
+            continue
+        mode_names = names.get(rotate_pitch_class_mask(mask, -i))
+        if mode_names != None:
+            keys.append((i, mode_names[0]))
+    return keys
+
+def register_scale(name, offsets):
+    """add a scale to scale_index_offsets at runtime, or replace one.
+
+    Keyword arguments:
+    name    -- the scale name
+    offsets -- chromatic index offsets from the tonic, starting at 0
+    """
+    global _scale_registry
+    offsets = list(offsets)
+    assert(len(offsets) > 0 and offsets[0] == 0)
+    replacing = name in scale_index_offsets
+    with _scale_registry_lock:
+        scale_index_offsets[name] = offsets
+        _scale_pitch_class_masks.pop(name, None)
+        _scale_registry = None
+    if replacing:
+        # Scales and Chords made from the old offsets are stale
+        Scale.cache.clear()
+        Chord.cache.clear()
+
+def unregister_scale(name):
+    """remove a scale from scale_index_offsets"""
+    global _scale_registry
+    with _scale_registry_lock:
+        del scale_index_offsets[name]
+        _scale_pitch_class_masks.pop(name, None)
+        _scale_registry = None
+    Scale.cache.clear()
+    Chord.cache.clear()
+
+def get_scale_keys_with_mask(mask,scale_names=None):
+    """return a list of (tonic pitch class, scale name) pairs for all
+    scales that contain every pitch class in mask.  No Scales are
+    constructed.
+
+    Keyword arguments:
+    mask        -- pitch-class mask to look for
+    scale_names -- list of scale names to search, None searches all
+                   names in scale_index_offsets.
+    """
+    if scale_names == None:
+        scale_names = sorted(scale_index_offsets.keys())
+    name_mask = _get_scale_registry()['mask']
+    # aliases share a pitch-class set, so each set is only tested once
+    tonics = {}  # mask with tonic c : matching tonic pitch classes
+    keys = []
+    for n in scale_names:
+        base = name_mask[n]
+        found = tonics.get(base)
+        if found == None:
+            masks = get_scale_pitch_class_masks(n)
+            found = [ i for i in range(TONES_PER_CHROMATIC_OCTAVE)
+                      if masks[i] & mask == mask ]
+            tonics[base] = found
+        keys.extend([ (i,n) for i in found ])
+    return keys
+
 def get_scales_with_tones(tones,scale_names=['major','minor']):
     """return a list of all scales that contain the given tones.  Note
-    that we compare via glyphs rather than tones in order to avoid
-    comparing the octaves.
+    that we compare via pitch classes rather than tones in order to
+    avoid comparing the octaves.
     
     Keyword arguments:
     tones       -- list of tones to consider
     scale_names -- only look within the scale_names type of scales.
+                   None searches all names in scale_index_offsets.
     """
     assert(type(tones)==type(list()))
-    assert(type(scale_names)==type(list()))
-    scales = []
-    toneset = set(tones)
-    for n in scale_names:
-        assert(n in scale_index_offsets.keys())
-        for i in range(TONES_PER_CHROMATIC_OCTAVE):
-            scale = Scale(Tone(i),n)
-            scaleset = set(scale.tones)
-            if toneset.intersection(scaleset) == toneset:
-               scales.append(scale)
-    return scales
-        
+    assert(scale_names == None or type(scale_names)==type(list()))
+    mask = pitch_class_mask(tones)
+    return [ Scale(Tone(i),n)
+             for (i,n) in get_scale_keys_with_mask(mask,scale_names) ]
+
+# ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~
+# Scale similarity.  Scales are compared by the number of pitch
+# classes they share, counted from their pitch-class masks with numpy,
+# which is only imported when one of these functions is called.
+# ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~
+_popcount_table = None
+
+def _get_popcount_table():
+    """return a numpy array of the popcount of every pitch-class mask"""
+    global _popcount_table
+    if _popcount_table is None:
+        import numpy
+        table = numpy.zeros(PITCH_CLASS_MASK_ALL + 1, dtype=numpy.uint8)
+        for i in range(1, len(table)):
+            table[i] = table[i >> 1] + (i & 1)
+        _popcount_table = table
+    return _popcount_table
+
+def get_scale_keys(scale_names=None):
+    """return a list of (tonic pitch class, scale name) for every
+    tonic of each scale name, in name order then tonic order.  None
+    uses all names in scale_index_offsets."""
+    if scale_names == None:
+        scale_names = sorted(scale_index_offsets.keys())
+    return [ (i,n) for n in scale_names for i in range(TONES_PER_CHROMATIC_OCTAVE) ]
+
+def get_scale_masks(scale_names=None):
+    """return (keys, masks) where keys is get_scale_keys(scale_names)
+    and masks is a numpy array of their pitch-class masks"""
+    import numpy
+    keys = get_scale_keys(scale_names)
+    masks = numpy.array([ get_scale_pitch_class_masks(n)[i] for (i,n) in keys ],
+                        dtype=numpy.uint16)
+    return keys, masks
+
+def _similarities(a, b, jaccard):
+    # shared pitch classes of every pair of masks in a and b
+    table = _get_popcount_table()
+    shared = table[a & b]
+    if not jaccard:
+        return shared
+    union = table[a | b]
+    return shared / union.astype('float64')
+
+def get_scale_similarity_matrix(scale_names=None, jaccard=True):
+    """return (keys, matrix) where keys is get_scale_keys(scale_names)
+    and matrix[i,j] is the number of pitch classes scales keys[i] and
+    keys[j] share over the number of pitch classes in either scale, in
+    [0.0,1.0].  With jaccard=False, it is just the number shared."""
+    keys, masks = get_scale_masks(scale_names)
+    return keys, _similarities(masks[:,None], masks[None,:], jaccard)
+
+def _get_unique_scale_masks(scale_names=None):
+    """return (keys, masks) like get_scale_masks, but with one key for
+    each distinct pitch-class mask, named by its canonical name.  Each
+    mask keeps the key whose canonical name is shortest, then the first
+    in get_scale_keys order.  The table is cached in the registry."""
+    import numpy
+    registry = _get_scale_registry()
+    if scale_names == None:
+        table_key = None
+    else:
+        table_key = tuple(scale_names)
+    table = registry['tables'].get(table_key)
+    if table is not None:
+        return table
+    name_mask = registry['mask']
+    mask_names = registry['names']
+    keys, masks = get_scale_masks(scale_names)
+    best = {}  # mask : ((name order, position), key)
+    for j in range(len(keys)):
+        m = int(masks[j])
+        name = mask_names[name_mask[keys[j][1]]][0]
+        order = (_canonical_order(name), j)
+        if m not in best or order < best[m][0]:
+            best[m] = (order, (keys[j][0], name))
+    chosen = sorted([ (order[1], key) for (order, key) in best.values() ])
+    table = ([ key for (j, key) in chosen ],
+             numpy.array([ masks[j] for (j, key) in chosen ], dtype=numpy.uint16))
+    return registry['tables'].setdefault(table_key, table)
+
+def get_nearest_scales(scale, k=5, scale_names=None, jaccard=True):
+    """return the k scales most similar to scale as a list of
+    (similarity, tonic pitch class, scale name), most similar first.
+
+    Each distinct set of pitch classes is listed once, under its
+    shortest canonical name, so aliases and the modes of one scale do
+    not crowd the list.  Scales with exactly the pitch classes of
+    scale, such as the scale itself, are left out.  Ties keep the
+    order of get_scale_keys.
+
+    Keyword arguments:
+    scale       -- a Scale, or a pitch-class mask
+    k           -- how many scales to return
+    scale_names -- names to search, None searches all names in
+                   scale_index_offsets
+    jaccard     -- as for get_scale_similarity_matrix.  The default
+                   keeps big scales like chromatic from winning.
+    """
+    import numpy
+    if isinstance(scale, Scale):
+        mask = pitch_class_mask(scale.tones)
+    else:
+        mask = scale
+    keys, masks = _get_unique_scale_masks(scale_names)
+    sims = _similarities(masks, mask, jaccard)
+    order = numpy.argsort(-sims.astype('float64'), kind='mergesort')
+    order = order[masks[order] != mask][:k]
+    return [ (sims[j].item(),) + keys[j] for j in order ]
+
 # ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ 
 # Chord data
 # ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ 
@@ -547,20 +1079,44 @@ chord_index_offsets = {
 # Chord class
 # ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~
 class Chord(object):
-    def __init__( self, chord_scale, name="5th", octaves=1 ):
-        assert(type(chord_scale) == type(Scale(Tone.fromGlypho('c'))))
-        self.scale  = chord_scale
-        assert(name in chord_index_offsets.keys())
-        self.name   = name
-        self.tones = []
+    """A Chord is a subset of the tones of a Scale, picked out by the
+    Chord name.
+
+    Chords are immutable and Chord.tones is a tuple.  Like Scales,
+    they are kept in an LRUCache, Chord.cache.
+    """
+    __slots__ = ( 'scale', 'name', 'octaves', 'tones' )
+    cache = LRUCache(4096)
+    def __new__( cls, chord_scale, name="5th", octaves=1 ):
+        assert(type(chord_scale) == Scale)
+        tonic = chord_scale.tonic
+        key = (cls, tonic._index, tonic._canonical, chord_scale.name,
+               chord_scale.octaves, name, octaves)
+        self = cls.cache.get(key)
+        if self is not None:
+            return self
+        assert(name in chord_index_offsets)
+        self = object.__new__(cls)
+        tones = []
         for j in range(octaves):
-            tones_per_octave = len(self.scale.tones)
-            #print chord_index_offsets
-            #print self.scale.tones
-            for i in chord_index_offsets[self.name]:
-                #print i
-                ii = self.scale.tones[i].index + j*TONES_PER_CHROMATIC_OCTAVE
-                self.tones.append(Tone(ii))
+            for i in chord_index_offsets[name]:
+                ii = chord_scale.tones[i].index + j*TONES_PER_CHROMATIC_OCTAVE
+                tones.append(Tone(ii))
+        object.__setattr__(self, 'scale', chord_scale)
+        object.__setattr__(self, 'name', name)
+        object.__setattr__(self, 'octaves', octaves)
+        object.__setattr__(self, 'tones', tuple(tones))
+        return cls.cache.put(key, self)
+    def __setattr__(self, name, value):
+        raise AttributeError("Chord is immutable")
+    def __delattr__(self, name):
+        raise AttributeError("Chord is immutable")
+    def __copy__(self):
+        return self
+    def __deepcopy__(self, memo):
+        return self
+    def __reduce__(self):
+        return (self.__class__, (self.scale, self.name, self.octaves))
     def __hash__(self):
         return hash(hash(self.scale) + hash(self.name))
     def __eq__(self, other):
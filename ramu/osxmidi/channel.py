@@ -32,6 +32,9 @@ ramu.osxmidi.send_midi_event() -- sends a midi event onto the virtual channel.
   event1     -- byte additional midi event info
   event2     -- byte additional midi event info
 
+libosxmidi.dylib is loaded on the first call to one of these, so
+importing this module does not touch the native library.
+
 """
 import os
 import math
@@ -39,21 +42,44 @@ from ctypes import *
 from .. import channel
 
 # ======================================================================
-# hook up our library.  it's sitting right next to this file
-pth = os.path.dirname(__file__)
-lm = cdll.LoadLibrary(pth+'/libosxmidi.dylib')
-# experimented with the setup.py way of doing things & this failed.
-#lm = cdll.LoadLibrary(pth+'/libosxmidi.so')
-# create our prototypes
-#   now()
-lm.now.restype = c_ulonglong
-now = lm.now
-#   send_midi_event()
-prototype = CFUNCTYPE(c_void_p,c_ulonglong,c_ubyte,c_ubyte,c_ubyte,c_ubyte)
-paramflags = (1,"time",0), (1,"note",0), (1,"channel",0), (1,"data0",0), (1,"data1",0)
-send_midi_event = prototype(("send_midi_event",lm),paramflags)
-#   shutdown_midi()
-shutdown_midi = lm.shutdown_midi
+# hook up our library.  it's sitting right next to this file.  It is
+# loaded the first time it is used rather than on import.
+_library = None
+
+class _Library(object):
+    """the loaded libosxmidi.dylib and its function prototypes"""
+    def __init__(self):
+        pth = os.path.dirname(__file__)
+        lm = cdll.LoadLibrary(pth+'/libosxmidi.dylib')
+        # experimented with the setup.py way of doing things & this failed.
+        #lm = cdll.LoadLibrary(pth+'/libosxmidi.so')
+        # create our prototypes
+        #   now()
+        lm.now.restype = c_ulonglong
+        self.now = lm.now
+        #   send_midi_event()
+        prototype = CFUNCTYPE(c_void_p,c_ulonglong,c_ubyte,c_ubyte,c_ubyte,c_ubyte)
+        paramflags = (1,"time",0), (1,"note",0), (1,"channel",0), (1,"data0",0), (1,"data1",0)
+        self.send_midi_event = prototype(("send_midi_event",lm),paramflags)
+        #   shutdown_midi()
+        self.shutdown_midi = lm.shutdown_midi
+        self.lm = lm
+
+def get_library():
+    """return the library, loading it if this is the first use"""
+    global _library
+    if _library == None:
+        _library = _Library()
+    return _library
+
+def now():
+    return get_library().now()
+
+def send_midi_event(time,note,channel,data0,data1):
+    return get_library().send_midi_event(time,note,channel,data0,data1)
+
+def shutdown_midi():
+    return get_library().shutdown_midi()
 
 # ======================================================================
 # constants of interest
@@ -75,6 +101,8 @@ class Channel(channel.Channel):
     """Channel is a container that takes in tones and timing
     information and produces output on a Mac OS X virtual midi interface.
     """
+    realtime = True
+
     def __init__(self,midi_channel_id=0):
         """Initialize the Channel by sending an innocuous event.
         """
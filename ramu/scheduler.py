@@ -0,0 +1,435 @@
+# ramu.scheduler
+#
+# Copyright (C) 2009-2010 Roger Allen (rallen@gmail.com)
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.
+#
+__doc__ = """
+ramu.scheduler contains the Scheduler class, which feeds timed notes
+to a Channel from a background thread.
+
+Notes are handed to the channel a 'lookahead' window before they are
+due, so a real-time channel has them queued before they play.  Time is
+kept with a monotonic clock that is pinned to channel.now when the
+scheduler starts.  Channels that are not real-time (see
+Channel.realtime) are fed as fast as possible.  Once the scheduler is
+running, an offline channel is sent each event as soon as it is
+queued, so parts queued while it runs are interleaved in the order
+they were queued, not by time.  Queue every part before start() to
+have them merged in time order.
+
+Many parts can share one Scheduler, and so one thread.  Each part
+plays into its own Playback handle from Scheduler.playback().  A
+Playback can be used anywhere a channel is expected.  Playbacks can be
+waited for or cancelled one at a time or together with wait_all() and
+cancel_all().
+"""
+import sys
+import heapq
+import threading
+import time
+import ctypes
+import ctypes.util
+
+# ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~
+# monotonic clock.  time.monotonic does not exist before python 3.3,
+# so ask the C library.  time.time is only a last resort, since a
+# clock step would throw off every deadline.  The clock is looked up
+# on first use, so importing this module stays cheap.
+# ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~
+# clock ids differ between systems, so clock_gettime is only used
+# where the id is known.
+CLOCK_MONOTONIC = 1 # from linux <time.h>
+
+class _timespec(ctypes.Structure):
+    _fields_ = [ ('tv_sec',  ctypes.c_long),
+                 ('tv_nsec', ctypes.c_long) ]
+
+class _mach_timebase_info(ctypes.Structure):
+    _fields_ = [ ('numer', ctypes.c_uint32),
+                 ('denom', ctypes.c_uint32) ]
+
+def _posix_monotonic():
+    """return clock_gettime(CLOCK_MONOTONIC) as a function, or None"""
+    for name in ('rt', 'c'):
+        path = ctypes.util.find_library(name)
+        if path == None:
+            continue
+        try:
+            lib = ctypes.CDLL(path, use_errno=True)
+            clock_gettime = lib.clock_gettime
+        except (OSError, AttributeError):
+            continue
+        clock_gettime.argtypes = [ ctypes.c_int, ctypes.POINTER(_timespec) ]
+        clock_gettime.restype = ctypes.c_int
+        ts = _timespec()
+        if clock_gettime(CLOCK_MONOTONIC, ctypes.byref(ts)) != 0:
+            continue
+        def clock():
+            t = _timespec()
+            if clock_gettime(CLOCK_MONOTONIC, ctypes.byref(t)) != 0:
+                errno = ctypes.get_errno()
+                raise OSError(errno, "clock_gettime failed")
+            return t.tv_sec + t.tv_nsec * 1e-9
+        return clock
+    return None
+
+def _mach_monotonic():
+    """return mach_absolute_time in seconds as a function, or None"""
+    try:
+        lib = ctypes.CDLL('/usr/lib/libSystem.dylib')
+        mach_absolute_time = lib.mach_absolute_time
+    except (OSError, AttributeError):
+        return None
+    mach_absolute_time.restype = ctypes.c_uint64
+    info = _mach_timebase_info()
+    lib.mach_timebase_info(ctypes.byref(info))
+    scale = 1e-9 * info.numer / info.denom
+    def clock():
+        return mach_absolute_time() * scale
+    return clock
+
+def _find_monotonic():
+    clock = getattr(time, 'monotonic', None)
+    if clock == None and sys.platform == 'darwin':
+        clock = _mach_monotonic()
+    if clock == None and sys.platform.startswith('linux'):
+        clock = _posix_monotonic()
+    if clock == None:
+        clock = time.time
+    return clock
+
+_monotonic = None
+
+def monotonic():
+    """return the time in seconds from a monotonic clock"""
+    global _monotonic
+    if _monotonic == None:
+        _monotonic = _find_monotonic()
+    return _monotonic()
+
+# ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~
+# Scheduler class
+# ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~
+class Scheduler(object):
+    """Scheduler sends notes to a channel from a background thread,
+    lookahead seconds before they are due.  It keeps statistics on
+    notes that were sent late and on how far its wakeups drift from
+    the times it planned.
+    """
+    def __init__(self, channel, lookahead=1.0, interval=0.1, clock=monotonic):
+        """Create a scheduler.  Call start() to begin sending notes.
+
+        Keyword arguments:
+        channel   -- the channel to play through
+        lookahead -- how far ahead of time to send notes, in seconds
+        interval  -- the longest the thread sleeps between checks
+        clock     -- a monotonic clock function returning seconds
+        """
+        assert(lookahead >= 0.0 and interval > 0.0)
+        self.channel   = channel
+        self.lookahead = lookahead
+        self.interval  = interval
+        self.realtime  = getattr(channel, 'realtime', False)
+        self._clock    = clock
+        self._events   = []     # heap of (time, count, playback, send, args, end)
+        self._count    = 0      # keeps events with equal times in order
+        self._last_stop = None  # when the last queued event ends
+        self._sent_stop = None  # when the last sent event ends
+        self._cond     = threading.Condition()
+        self._thread   = None
+        self._running  = False
+        self._notified = False
+        self._channel_start = None  # channel.now at start()
+        self._clock_start   = None  # clock() at start()
+        self.reset_stats()
+
+    def reset_stats(self):
+        """zero the late-note and jitter statistics"""
+        self._notes        = 0
+        self._late_notes   = 0
+        self._max_late     = 0.0
+        self._wakeups      = 0
+        self._total_jitter = 0.0
+        self._max_jitter   = 0.0
+
+    def get_now(self):
+        """return the current time in the channel's timeline.  Until
+        start() pins the clock to it, this is channel.now."""
+        if self._clock_start == None:
+            return self.channel.now
+        return self._channel_start + (self._clock() - self._clock_start)
+    now = property(get_now)
+
+    def get_stats(self):
+        """return a dictionary snapshot of the statistics.
+
+        notes       -- note events sent to the channel
+        late_notes  -- note events sent after their time
+        max_late    -- the latest a note was sent, in seconds
+        wakeups     -- timed wakeups of the scheduler thread
+        mean_jitter -- mean wakeup error, in seconds
+        max_jitter  -- largest wakeup error, in seconds
+        pending     -- notes not yet sent
+        """
+        with self._cond:
+            mean_jitter = 0.0
+            if self._wakeups:
+                mean_jitter = self._total_jitter / self._wakeups
+            return { 'notes'       : self._notes,
+                     'late_notes'  : self._late_notes,
+                     'max_late'    : self._max_late,
+                     'wakeups'     : self._wakeups,
+                     'mean_jitter' : mean_jitter,
+                     'max_jitter'  : self._max_jitter,
+                     'pending'     : len(self._events) }
+    stats = property(get_stats)
+
+    def play_note(self, start, stop, tone, strength):
+        """queue a note to be sent to the channel.  Same arguments as
+        Channel.play_note."""
+        self._queue(start, None, self.channel.play_note,
+                    (start, stop, tone, strength), stop)
+
+    def playback(self):
+        """return a new Playback, a channel-like handle whose notes are
+        sent by this scheduler."""
+        return Playback(self)
+
+    def _queue(self, when, playback, send, args, end):
+        """queue send(*args) to be called at time when.  The event is
+        done playing at end."""
+        with self._cond:
+            heapq.heappush(self._events, (when, self._count, playback, send, args, end))
+            self._count += 1
+            if self._last_stop == None or end > self._last_stop:
+                self._last_stop = end
+            if playback != None:
+                playback._queued(end)
+            self._notified = True
+            self._cond.notify_all()
+
+    def start(self):
+        """start the background thread"""
+        with self._cond:
+            assert(not self._running)
+            self._channel_start = self.channel.now
+            self._clock_start   = self._clock()
+            self._running = True
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """stop the background thread.  Unsent notes stay queued."""
+        with self._cond:
+            self._running = False
+            self._notified = True
+            self._cond.notify_all()
+        if self._thread != None:
+            self._thread.join()
+            self._thread = None
+
+    def wait(self):
+        """return when every queued note has been sent and, for a
+        real-time channel, the last note has finished."""
+        with self._cond:
+            while self._events and self._running:
+                self._cond.wait(self.interval)
+            last_stop = self._last_stop
+        if self.realtime and last_stop != None:
+            delta = last_stop - self.now
+            if delta > 0:
+                time.sleep(delta)
+
+    def _send_due(self):
+        """send the events that are inside the lookahead window.  Called
+        with self._cond held."""
+        if self.realtime:
+            horizon = self.now + self.lookahead
+        events = self._events
+        while events and (not self.realtime or events[0][0] <= horizon):
+            (when, count, playback, send, args, end) = heapq.heappop(events)
+            if playback != None:
+                if playback.cancelled:
+                    continue
+                playback._sent(send, args)
+            if self.realtime:
+                late = self.now - when
+                if late > 0:
+                    self._late_notes += 1
+                    self._max_late = max(self._max_late, late)
+            send(*args)
+            self._notes += 1
+            if self._sent_stop == None or end > self._sent_stop:
+                self._sent_stop = end
+
+    def _run(self):
+        with self._cond:
+            while self._running:
+                self._send_due()
+                self._cond.notify_all() # wake up anyone in wait()
+                if self._events and self.realtime:
+                    wake = self._events[0][0] - self.lookahead
+                    wake = min(wake, self.now + self.interval)
+                else:
+                    wake = None
+                self._notified = False
+                if wake == None:
+                    self._cond.wait(self.interval)
+                    continue
+                timeout = wake - self.now
+                if timeout > 0:
+                    self._cond.wait(timeout)
+                if not self._notified:
+                    jitter = abs(self.now - wake)
+                    self._wakeups += 1
+                    self._total_jitter += jitter
+                    self._max_jitter = max(self._max_jitter, jitter)
+
+# ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~
+# Playback class
+# ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~ ~
+class Playback(object):
+    """Playback is a handle on one part playing through a Scheduler.
+    It has the start_note, stop_note, play_note and now of a channel,
+    so a Sequence or an instrument can play into it.  Its notes are
+    queued on the scheduler rather than sent right away.
+    """
+    def __init__(self, scheduler):
+        self.scheduler  = scheduler
+        self.cancelled  = False
+        self._pending   = 0         # events queued, not yet sent
+        self._last_stop = None      # when the last queued event ends
+        self._sounding  = {}        # tone : count of unstopped start_notes
+
+    def get_now(self):
+        """return the scheduler's current time"""
+        return self.scheduler.now
+    now = property(get_now)
+
+    def start_note(self, time, tone, strength):
+        """queue Channel.start_note"""
+        sch = self.scheduler
+        sch._queue(time, self, sch.channel.start_note, (time, tone, strength), time)
+
+    def stop_note(self, time, tone, strength):
+        """queue Channel.stop_note"""
+        sch = self.scheduler
+        sch._queue(time, self, sch.channel.stop_note, (time, tone, strength), time)
+
+    def play_note(self, start, stop, tone, strength):
+        """queue Channel.play_note"""
+        sch = self.scheduler
+        sch._queue(start, self, sch.channel.play_note, (start, stop, tone, strength), stop)
+
+    def _queued(self, end):
+        # called by the scheduler with its lock held
+        self._pending += 1
+        if self._last_stop == None or end > self._last_stop:
+            self._last_stop = end
+
+    def _sent(self, send, args):
+        # called by the scheduler with its lock held
+        self._pending -= 1
+        channel = self.scheduler.channel
+        if send == channel.start_note:
+            tone = args[1]
+            self._sounding[tone] = self._sounding.get(tone, 0) + 1
+        elif send == channel.stop_note:
+            tone = args[1]
+            count = self._sounding.get(tone, 0) - 1
+            if count > 0:
+                self._sounding[tone] = count
+            else:
+                self._sounding.pop(tone, None)
+
+    def cancel(self):
+        """drop the notes that have not been sent and stop any notes
+        this playback started but has not stopped."""
+        sch = self.scheduler
+        with sch._cond:
+            if self.cancelled:
+                return
+            self.cancelled = True
+            self._pending = 0
+            sch._events = [ e for e in sch._events if e[2] is not self ]
+            heapq.heapify(sch._events)
+            ends = [ e[5] for e in sch._events ]
+            if sch._sent_stop != None:
+                ends.append(sch._sent_stop)
+            sch._last_stop = None
+            if ends:
+                sch._last_stop = max(ends)
+            now = sch.now
+            for (tone, count) in self._sounding.items():
+                for i in range(count):
+                    sch.channel.stop_note(now, tone, 0.0)
+            self._sounding = {}
+            sch._cond.notify_all()
+
+    def done(self):
+        """return True when this playback is cancelled or every note
+        has been sent and, on a real-time channel, finished."""
+        sch = self.scheduler
+        with sch._cond:
+            if self.cancelled:
+                return True
+            if self._pending:
+                return False
+            return (not sch.realtime or self._last_stop == None or
+                    self._last_stop <= sch.now)
+
+    def wait(self, timeout=None):
+        """wait until done() or until timeout seconds pass.  Returns
+        done()."""
+        sch = self.scheduler
+        deadline = None
+        if timeout != None:
+            deadline = sch._clock() + timeout
+        with sch._cond:
+            while self._pending and not self.cancelled:
+                delay = sch.interval
+                if deadline != None:
+                    delay = min(delay, deadline - sch._clock())
+                    if delay <= 0:
+                        return False
+                sch._cond.wait(delay)
+            last_stop = self._last_stop
+        if sch.realtime and not self.cancelled and last_stop != None:
+            delay = last_stop - sch.now
+            if deadline != None:
+                delay = min(delay, deadline - sch._clock())
+            if delay > 0:
+                time.sleep(delay)
+        return self.done()
+
+def wait_all(playbacks, timeout=None):
+    """wait for all of the playbacks.  Returns True if all are done."""
+    deadline = None
+    if timeout != None:
+        deadline = monotonic() + timeout
+    for p in playbacks:
+        remaining = None
+        if deadline != None:
+            remaining = max(0.0, deadline - monotonic())
+        p.wait(remaining)
+    return all([p.done() for p in playbacks])
+
+def cancel_all(playbacks):
+    """cancel all of the playbacks"""
+    for p in playbacks:
+        p.cancel()
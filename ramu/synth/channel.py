@@ -0,0 +1,157 @@
+# ramu.synth.channel - render notes to audio
+#
+# Copyright (C) 2009-2010 Roger Allen (rallen@gmail.com)
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.
+#
+__doc__ = """
+ramu.synth.channel contains a Channel class that renders the notes it
+is given to audio with a simple oscillator & envelope synthesizer.  It
+needs numpy.
+
+Notes are collected as they are sent and rendered when asked for, as
+fast as the CPU allows.  The result is mono and can be had as an array
+of samples, blocks of samples, WAV file bytes, or written to a WAV file
+on close.  WAV files are written a block at a time.
+"""
+import numpy
+from StringIO import StringIO
+from .. import channel
+from .dsp import *
+from . import stream
+
+# ======================================================================
+class Channel(channel.Channel):
+    """Channel is a container that takes in tones and timing
+    information and renders them to audio samples.
+    """
+    realtime = False
+
+    def __init__(self, file=None, sample_rate=44100, waveform="sine",
+                 envelope=None, gain=0.25):
+        """Create the channel.
+
+        Keyword arguments:
+        file        -- a filename or file object to write a WAV file to
+                       on close, or None
+        sample_rate -- samples per second
+        waveform    -- one of ramu.synth.dsp.WAVEFORMS
+        envelope    -- a ramu.synth.dsp.Envelope, None for the default
+        gain        -- scale applied to every note, to leave headroom
+                       for notes that overlap
+        """
+        channel.Channel.__init__(self)
+        assert(waveform in WAVEFORMS)
+        if envelope == None:
+            envelope = Envelope()
+        self._file        = file
+        self.sample_rate  = sample_rate
+        self.waveform     = waveform
+        self.envelope     = envelope
+        self.gain         = gain
+        self.notes        = []  # (start, stop, frequency, strength)
+        self._sounding    = {}  # tone index : [ (start, tone, strength), ... ]
+        self._closed      = False
+
+    def start_note(self,time,tone,strength):
+        """Start playing a note.
+
+        Keyword arguments:
+        time     -- time to start playing in seconds.  1.0 === 1 second
+        tone     -- the tone to play
+        strength -- strength to apply to playing the note [0.0,1.0]
+        """
+        assert(0.0<=strength<=1.0)
+        self._sounding.setdefault(tone.index, []).append((time, tone, strength))
+        if time > self._now:
+            self._now = time
+
+    def stop_note(self,time,tone,strength):
+        """Stop playing a note.  Notes of the same tone are stopped
+        in the order they were started.
+
+        Keyword arguments:
+        time     -- time to stop playing in seconds.  1.0 === 1 second
+        tone     -- the tone to stop
+        strength -- ignored
+        """
+        starts = self._sounding.get(tone.index)
+        if starts:
+            (start, started_tone, started_strength) = starts.pop(0)
+            self.notes.append((start, time, started_tone.frequency, started_strength))
+        if time > self._now:
+            self._now = time
+
+    def all_notes_off(self):
+        """stop all sounding notes now"""
+        for starts in self._sounding.values():
+            for (start, tone, strength) in starts:
+                self.notes.append((start, self._now, tone.frequency, strength))
+        self._sounding = {}
+
+    def render(self):
+        """return all the finished notes mixed into one array"""
+        sample_rate = self.sample_rate
+        length = 0
+        for (start, stop, frequency, strength) in self.notes:
+            end = (int(round(start * sample_rate)) +
+                   self.envelope.num_samples(max(0.0, stop - start), sample_rate))
+            length = max(length, end)
+        out = numpy.zeros(length)
+        for (start, stop, frequency, strength) in self.notes:
+            first = int(round(start * sample_rate))
+            samples = render_note(frequency, max(0.0, stop - start),
+                                  self.gain * strength, sample_rate,
+                                  self.waveform, self.envelope)
+            if first < 0:
+                # the part before time 0 is cut, as in render_blocks
+                samples = samples[-first:]
+                first = 0
+            out[first:first + len(samples)] += samples
+        return out
+
+    def render_blocks(self, block_size=4096):
+        """yield the finished notes mixed into arrays of block_size
+        samples, holding only the notes sounding in each block"""
+        return stream.render_blocks(sorted(self.notes), self.sample_rate,
+                                    block_size, self.waveform,
+                                    self.envelope, self.gain)
+
+    def write_wav(self, file):
+        """write the rendered notes as a 16-bit mono WAV file to a
+        filename or file object, a block at a time"""
+        stream.write_wav(self.render_blocks(), file, self.sample_rate)
+
+    def get_wav_data(self):
+        """return the bytes of a WAV file of the rendered notes"""
+        f = StringIO()
+        self.write_wav(f)
+        return f.getvalue()
+
+    def close(self):
+        """stop any sounding notes and write the WAV file, if any"""
+        if self._closed:
+            return
+        self.all_notes_off()
+        self._closed = True
+        if self._file != None:
+            self.write_wav(self._file)
+
+    # ======================================================================
+    # allow the with statement
+    def __exit__(self, type, value, traceback):
+        self.close()
+        return False
@@ -0,0 +1,96 @@
+# ramu.synth.dsp
+#
+# Copyright (C) 2009-2010 Roger Allen (rallen@gmail.com)
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.
+#
+__doc__ = """
+ramu.synth.dsp contains numpy oscillators and envelopes.  Each
+function produces a whole note's worth of samples in a few array
+operations rather than one sample at a time.
+
+Samples are floating point in [-1.0,1.0].
+"""
+import numpy
+
+WAVEFORMS = [ "sine", "square", "saw", "triangle" ]
+
+def oscillator(waveform, frequency, num_samples, sample_rate, start=0):
+    """return num_samples of a waveform at frequency Hz, beginning at
+    sample number start."""
+    assert(waveform in WAVEFORMS)
+    t = numpy.arange(start, start + num_samples, dtype=numpy.float64)
+    phase = t * (float(frequency) / sample_rate)
+    if waveform == "sine":
+        return numpy.sin(2.0 * numpy.pi * phase)
+    phase -= numpy.floor(phase)
+    if waveform == "square":
+        return numpy.where(phase < 0.5, 1.0, -1.0)
+    if waveform == "saw":
+        return 2.0 * phase - 1.0
+    return 1.0 - 4.0 * numpy.abs(phase - 0.5) # triangle
+
+class Envelope(object):
+    """An ADSR envelope.  attack, decay and release are in seconds and
+    sustain is a level [0.0,1.0]."""
+    def __init__(self, attack=0.01, decay=0.1, sustain=0.7, release=0.1):
+        assert(attack >= 0.0 and decay >= 0.0 and release >= 0.0)
+        assert(0.0 <= sustain <= 1.0)
+        self.attack  = attack
+        self.decay   = decay
+        self.sustain = sustain
+        self.release = release
+    def level(self, time):
+        """return the level at time seconds into a note that is held"""
+        return numpy.interp(time,
+                            [0.0, self.attack, self.attack + self.decay],
+                            [0.0, 1.0, self.sustain])
+    def samples(self, duration, sample_rate, start=0, num_samples=None):
+        """return the envelope of a note held for duration seconds,
+        including its release, as an array.  start and num_samples
+        select part of it; by default the whole envelope is returned."""
+        if num_samples == None:
+            num_samples = self.num_samples(duration, sample_rate) - start
+        t = numpy.arange(start, start + num_samples, dtype=numpy.float64) / sample_rate
+        # attack, decay and sustain while the note is held, then a
+        # straight release from wherever the note got to
+        if self.release > 0.0:
+            released = self.level(duration) * (1.0 - (t - duration) / self.release)
+            released = numpy.clip(released, 0.0, 1.0)
+        else:
+            released = 0.0
+        return numpy.where(t < duration, self.level(t), released)
+    def num_samples(self, duration, sample_rate):
+        """return the length in samples of a note held for duration
+        seconds, including its release"""
+        # the small offset keeps float error from adding a sample
+        return int(numpy.ceil((duration + self.release) * sample_rate - 1e-6))
+
+def render_note(frequency, duration, strength, sample_rate,
+                waveform="sine", envelope=None, start=0, num_samples=None):
+    """return the samples of one note, including its release.  start
+    and num_samples select part of the note, in samples from its start."""
+    if envelope == None:
+        envelope = Envelope()
+    if num_samples == None:
+        num_samples = envelope.num_samples(duration, sample_rate) - start
+    env = envelope.samples(duration, sample_rate, start, num_samples)
+    return strength * env * oscillator(waveform, frequency, num_samples, sample_rate, start)
+
+def to_pcm16(samples):
+    """convert float samples to little-endian 16-bit PCM bytes"""
+    pcm = numpy.clip(samples, -1.0, 1.0) * 32767.0
+    return pcm.astype('<i2').tostring()
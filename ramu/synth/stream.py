@@ -0,0 +1,127 @@
+# ramu.synth.stream - render notes to audio a block at a time
+#
+# Copyright (C) 2009-2010 Roger Allen (rallen@gmail.com)
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.
+#
+__doc__ = """
+ramu.synth.stream renders notes to audio one fixed-size block at a
+time, so memory use depends on how many notes sound at once rather
+than on the length of the piece.  It needs numpy.
+
+render_blocks() takes notes in start order from any iterable and only
+pulls them in as the render reaches them.  render_sequence_blocks()
+does this for a Sequence.  write_pcm() and write_wav() write the
+blocks out as they are made.
+"""
+import wave
+import numpy
+from .dsp import *
+
+def render_blocks(notes, sample_rate=44100, block_size=4096, waveform="sine",
+                  envelope=None, gain=0.25):
+    """yield arrays of block_size samples of the mixed notes.  The last
+    block is cut short at the end of the last note.
+
+    Keyword arguments:
+    notes       -- iterable of (start, stop, frequency, strength) in
+                   order of start, times in seconds
+    sample_rate -- samples per second
+    block_size  -- samples per block
+    waveform    -- one of ramu.synth.dsp.WAVEFORMS
+    envelope    -- a ramu.synth.dsp.Envelope, None for the default
+    gain        -- scale applied to every note
+    """
+    assert(block_size > 0)
+    if envelope == None:
+        envelope = Envelope()
+    notes = iter(notes)
+    upcoming = None  # the next note not yet sounding
+    active = []      # (first sample, length, duration, frequency, strength)
+    end = 0          # the sample after the last one any note makes
+    block_start = 0
+    while True:
+        block_end = block_start + block_size
+        # pull in the notes that begin in this block
+        while True:
+            if upcoming == None:
+                try:
+                    (start, stop, frequency, strength) = notes.next()
+                except StopIteration:
+                    break
+                duration = max(0.0, stop - start)
+                first = int(round(start * sample_rate))
+                length = envelope.num_samples(duration, sample_rate)
+                upcoming = (first, length, duration, frequency, strength)
+            if upcoming[0] >= block_end:
+                break
+            if upcoming[1] > 0:
+                active.append(upcoming)
+                end = max(end, upcoming[0] + upcoming[1])
+            upcoming = None
+        if upcoming == None:
+            # no notes left to start, so stop at the end of the last one
+            if block_start >= end:
+                return
+            block = numpy.zeros(min(block_size, end - block_start))
+        else:
+            block = numpy.zeros(block_size)
+        still_active = []
+        for note in active:
+            (first, length, duration, frequency, strength) = note
+            lo = max(first, block_start)
+            hi = min(first + length, block_start + len(block))
+            if hi > lo:
+                block[lo - block_start:hi - block_start] += render_note(
+                    frequency, duration, gain * strength, sample_rate,
+                    waveform, envelope, lo - first, hi - lo)
+            if first + length > block_end:
+                still_active.append(note)
+        active = still_active
+        yield block
+        block_start = block_end
+
+def render_sequence_blocks(sequence, start_time=0.0, **kwargs):
+    """yield blocks of samples for a Sequence.  Takes the keyword
+    arguments of render_blocks."""
+    notes = ((start, stop, tone.frequency, strength)
+             for (start, stop, tone, strength) in sequence.note_times(start_time))
+    return render_blocks(notes, **kwargs)
+
+def write_pcm(blocks, file):
+    """write blocks as raw 16-bit little-endian mono PCM to a file
+    object, such as a pipe.  Returns the number of samples written."""
+    count = 0
+    for block in blocks:
+        file.write(to_pcm16(block))
+        count += len(block)
+    return count
+
+def write_wav(blocks, file, sample_rate=44100):
+    """write blocks to a 16-bit mono WAV file given a filename or a
+    seekable file object.  Returns the number of samples written."""
+    w = wave.open(file, 'wb')
+    count = 0
+    try:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(sample_rate)
+        for block in blocks:
+            w.writeframes(to_pcm16(block))
+            count += len(block)
+    finally:
+        w.close()
+    return count
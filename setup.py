@@ -25,6 +25,8 @@ setup(name='ramu',
       platforms=['MacOS X', 'POSIX'],
       packages=['ramu',
                 'ramu.instruments',
+                'ramu.midifile',
+                'ramu.synth',
                 'ramu.osxmidi'],
       package_data={ 'ramu.osxmidi': ['libosxmidi.dylib']},
 # I want a dylib & this makes a .so
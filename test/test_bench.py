@@ -0,0 +1,35 @@
+#!/usr/bin/env python
+import sys
+import unittest
+sys.path.insert(0,"../bench")
+sys.path.insert(0,"..")
+import benchmark
+
+# ======================================================================
+class TestBenchmark(unittest.TestCase):
+    def testRun(self):
+        results = benchmark.run_benchmarks(["tone","guitar_strum"],min_time=0.01,repeat=1)
+        self.assertEqual(sorted(results["results"].keys()),["guitar_strum","tone"])
+        for r in results["results"].values():
+            self.failUnless(r["ops_per_sec"] > 0)
+            self.failUnless(r["memory_kb"] >= 0)
+
+    def testAll(self):
+        # every benchmark runs
+        for (name, setup) in benchmark.BENCHMARKS:
+            (run, ops) = setup()
+            run()
+            self.failUnless(ops > 0)
+
+    def testCompare(self):
+        base = { "results" : { "a" : { "ops_per_sec" : 100.0 },
+                               "b" : { "ops_per_sec" : 100.0 },
+                               "c" : { "ops_per_sec" : 100.0 } } }
+        new  = { "results" : { "a" : { "ops_per_sec" : 95.0 },
+                               "b" : { "ops_per_sec" : 80.0 },
+                               "d" : { "ops_per_sec" : 1.0 } } }
+        self.assertEqual(benchmark.compare(new,base,0.10),[("b",0.8)])
+        self.assertEqual(benchmark.compare(new,base,0.25),[])
+
+if __name__ == "__main__":
+    unittest.main()
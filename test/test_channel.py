@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+import sys
+import unittest
+import json
+import time
+from StringIO import StringIO
+sys.path.insert(0,"..")
+from ramu.music import *
+from ramu.channel import LogChannel, NullChannel, LOG_STRUCT, read_log_struct
+from ramu.instruments.sequencer import Sequence
+
+class CountingFile(StringIO):
+    """counts write and flush calls"""
+    def __init__(self):
+        StringIO.__init__(self)
+        self.writes = 0
+        self.flushes = 0
+    def write(self,s):
+        self.writes += 1
+        StringIO.write(self,s)
+    def flush(self):
+        self.flushes += 1
+
+def mk_sequence(n):
+    seq = Sequence(Rhythm(120))
+    for i in range(n):
+        seq.append(Note(Tone(60+i),1,0.5))
+    return seq
+
+# ======================================================================
+class TestLogChannel(unittest.TestCase):
+    def testCsv(self):
+        f = StringIO()
+        with LogChannel(f) as chn:
+            mk_sequence(2).play(0.0,chn)
+        self.assertEqual(f.getvalue(),
+                         "time,event,index,strength\n"
+                         "0.0,start,60,0.5\n0.5,stop,60,0.5\n"
+                         "0.5,start,61,0.5\n1.0,stop,61,0.5\n")
+        self.assertEqual(chn.now,1.0)
+
+    def testJsonLines(self):
+        f = StringIO()
+        with LogChannel(f,"jsonl") as chn:
+            mk_sequence(2).play(0.0,chn)
+        lines = [ json.loads(l) for l in f.getvalue().splitlines() ]
+        self.assertEqual(len(lines),4)
+        self.assertEqual(lines[1],{"time":0.5,"event":"stop","index":60,"strength":0.5})
+
+    def testStruct(self):
+        f = StringIO()
+        with LogChannel(f,"struct") as chn:
+            mk_sequence(3).play(0.0,chn)
+        data = f.getvalue()
+        self.assertEqual(len(data),6*LOG_STRUCT.size)
+        records = read_log_struct(data)
+        self.assertEqual(records[0],(0.0,1,60,0.5))
+        self.assertEqual(records[5],(1.5,0,62,0.5))
+
+    def testBatches(self):
+        f = CountingFile()
+        chn = LogChannel(f,batch_size=10,header=False)
+        mk_sequence(12).play(0.0,chn)
+        self.assertEqual(f.writes,2)
+        self.assertEqual(f.flushes,0)
+        chn.close()
+        self.assertEqual(f.writes,3)
+        self.assertEqual(f.flushes,1)
+        self.assertEqual(len(f.getvalue().splitlines()),24)
+        chn.close()
+        self.assertEqual(f.flushes,1)
+
+    def testFlushPolicy(self):
+        f = CountingFile()
+        chn = LogChannel(f,batch_size=10,flush_interval=0,header=False)
+        mk_sequence(12).play(0.0,chn)
+        # every event is written and flushed
+        self.assertEqual(f.flushes,24)
+        self.assertEqual(len(f.getvalue().splitlines()),24)
+        f = CountingFile()
+        chn = LogChannel(f,batch_size=10,flush_interval=3600,header=False)
+        mk_sequence(12).play(0.0,chn)
+        self.assertEqual(f.flushes,0)
+        self.assertEqual(f.writes,2)
+
+    def testFlushInterval(self):
+        # a sparse stream is written once the interval passes, long
+        # before a batch fills
+        f = CountingFile()
+        chn = LogChannel(f,batch_size=4096,flush_interval=0.05)
+        mk_sequence(1).play(0.0,chn)
+        self.assertEqual(f.getvalue(),"time,event,index,strength\n")
+        time.sleep(0.1)
+        mk_sequence(1).play(1.0,chn)
+        self.assertEqual(len(f.getvalue().splitlines()),4)
+        self.assertEqual(f.flushes,1)
+        chn.close()
+
+# ======================================================================
+class TestNullChannel(unittest.TestCase):
+    def testNull(self):
+        chn = NullChannel()
+        mk_sequence(10).play(0.0,chn)
+        stats = mk_sequence(10).play_and_wait(0.0,chn)
+        self.assertEqual(stats['notes'],10)
+        self.assertEqual(chn.now,0.0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+import sys
+import unittest
+import itertools
+sys.path.insert(0,"..")
+from ramu.music import *
+from ramu.channel import NullChannel
+from ramu.instruments import guitar
+from ramu.instruments import fingering
+
+class FretChannel(NullChannel):
+    """records the tones started"""
+    def __init__(self):
+        NullChannel.__init__(self)
+        self.tones = []
+    def start_note(self,time,tone,strength):
+        self.tones.append(tone)
+
+# ======================================================================
+class TestChordIndex(unittest.TestCase):
+    def testFindChord(self):
+        c_major = guitar.MkChord("C","major","5th")
+        # any octave, order or spelling of the tones
+        self.failUnless(guitar.find_chord([Tone('g',3),Tone('c',4),Tone('e',5)]) is c_major)
+        self.failUnless(guitar.find_chord(set([Tone('C'),Tone('E'),Tone('G')])) is c_major)
+        self.failUnless(guitar.find_chord(c_major.tones,Tone('c',2)) is c_major)
+        # the same chord built from another scale name
+        self.failUnless(guitar.find_chord(Chord(Scale(Tone('c'),'ionian'))) is c_major)
+        self.assertEqual(guitar.find_chord([Tone('c'),Tone('c#'),Tone('d')]),None)
+        self.assertEqual(guitar.find_chord(c_major.tones,Tone('d')),None)
+
+    def testRoot(self):
+        # augmented triads share pitch classes; the root picks one
+        e_aug = guitar.MkChord("E","major","aug")
+        tones = e_aug.tones
+        self.failUnless(guitar.find_chord(tones,Tone('e')) is e_aug)
+        found = guitar.find_chord(tones)
+        self.assertEqual(pitch_class_mask(found.tones),pitch_class_mask(tones))
+
+    def testFrets(self):
+        a_minor = guitar.MkChord("A","minor","5th")
+        frets = [ 0, 0, 2, 2, 1, 0 ]
+        self.assertEqual(guitar.get_chord_frets(a_minor),frets)
+        self.assertEqual(guitar.get_chord_frets(Chord(Scale(Tone('a'),'aeolian'))),frets)
+        self.assertEqual(guitar.get_chord_frets([Tone('a',3),Tone('c',4),Tone('e',4)]),frets)
+        self.assertEqual(guitar.get_chord_frets(None),[-1]*6)
+        # more pitch classes than strings
+        self.assertRaises(KeyError,guitar.get_chord_frets,[Tone(i) for i in range(7)])
+
+    def testPressTones(self):
+        chn = FretChannel()
+        g = guitar.Guitar(chn)
+        g.press_chord(0.0,[Tone('e'),Tone('g#'),Tone('b')])
+        g.strum(0.0,0.01)
+        self.assertEqual(pitch_class_mask(chn.tones),
+                         pitch_class_mask(guitar.MkChord("E","major","5th").tones))
+        self.assertEqual(len(chn.tones),6)
+
+# ======================================================================
+def sounded(frets,tuning=fingering.STANDARD_TUNING):
+    return [ Tone(tuning[i].index + frets[i])
+             for i in range(len(frets)) if frets[i] >= 0 ]
+
+class TestFingering(unittest.TestCase):
+    def testTriad(self):
+        frets = fingering.find_fingering(guitar.MkChord("C","major","5th"))
+        self.assertEqual(pitch_class_mask(sounded(frets)),
+                         pitch_class_mask([Tone('c'),Tone('e'),Tone('g')]))
+        # root in the bass
+        self.assertEqual(sounded(frets)[0].glyph,'c')
+
+    def testConstraints(self):
+        for name in [ "7th", "9th", "11th", "dim7th", "aug7th" ]:
+            chord = Chord(Scale(Tone('g'),'major',2),name)
+            found = fingering.find_fingerings(chord)
+            self.failUnless(found,name)
+            pcs = pitch_class_mask(chord.tones)
+            fifth = 1 << ((Tone('g').index + 7) % 12)
+            for frets in found:
+                self.assertEqual(len(frets),6)
+                fretted = [ f for f in frets if f > 0 ]
+                if fretted:
+                    self.failUnless(max(fretted) - min(fretted) < 4)
+                self.failUnless(fingering.count_fingers(frets) <= 4)
+                mask = pitch_class_mask(sounded(frets))
+                self.assertEqual(mask & ~pcs,0)
+                self.assertEqual(mask | fifth,pcs | fifth)
+
+    def testCountFingers(self):
+        self.assertEqual(fingering.count_fingers((0,0,0,0,0,0)),0)
+        self.assertEqual(fingering.count_fingers((-1,3,2,0,1,0)),3)
+        self.assertEqual(fingering.count_fingers((1,3,3,2,1,1)),4) # barre
+        self.assertEqual(fingering.count_fingers((-1,-1,5,5,5,5)),1)
+
+    def testTuning(self):
+        drop_d = (Tone('D',3),) + fingering.STANDARD_TUNING[1:]
+        frets = fingering.find_fingering([Tone('d'),Tone('f#'),Tone('a')],drop_d,Tone('d'))
+        self.assertEqual(sounded(frets,drop_d)[0].glyph,'d')
+        self.assertEqual(fingering.find_fingering([Tone('c'),Tone('c#'),Tone('d'),Tone('d#')],
+                                                  max_span=1,max_fingers=1),None)
+
+    def testCache(self):
+        chord = Chord(Scale(Tone('e'),'minor',2),'9th')
+        found = fingering.find_fingerings(chord)
+        hits = fingering.fingering_cache.hits
+        self.failUnless(fingering.find_fingerings(chord) is found)
+        self.assertEqual(fingering.fingering_cache.hits,hits + 1)
+
+    def testPressAnyChord(self):
+        chn = FretChannel()
+        g = guitar.Guitar(chn)
+        chord = Chord(Scale(Tone('d'),'dorian',2),'11th')
+        g.press_chord(0.0,chord)
+        g.strum(0.0,0.01)
+        self.assertEqual(pitch_class_mask(chn.tones) & ~pitch_class_mask(chord.tones),0)
+        self.failUnless(len(chn.tones) >= 3)
+
+# ======================================================================
+class TestProgression(unittest.TestCase):
+    def progression(self,n):
+        names = [ ("C","major","5th"), ("A","minor","5th"),
+                  ("F","major","7th"), ("G","major","9th") ]
+        return [ Chord(Scale(Tone(t),s,2),c) for (t,s,c) in names ] * (n/4)
+
+    def total(self,chords,path):
+        opens = [ t.index for t in fingering.STANDARD_TUNING ]
+        cost = 0
+        for i in range(len(path)):
+            cost += fingering.fingering_cost(path[i],root=chords[i].scale.tonic)
+            if i > 0:
+                cost += fingering.movement(path[i-1],path[i])
+        return cost
+
+    def testMovement(self):
+        self.assertEqual(fingering.movement((0,2,2,1,0,0),(0,2,2,1,0,0)),0)
+        self.assertEqual(fingering.movement((-1,3,2,0,1,0),(-1,0,2,2,1,0)),2)
+        self.assertEqual(fingering.movement((0,2,2,1,0,0),(-1,-1,5,5,5,5)),2*4+6)
+        self.assertEqual(fingering.movement((-1,)*6,(3,5,5,4,3,3)),0)
+
+    def testBruteForce(self):
+        chords = self.progression(4)
+        path = fingering.plan_progression(chords,candidates=4)
+        self.assertEqual(len(path),4)
+        options = [ fingering.find_fingerings(c)[:4] for c in chords ]
+        best = min([ self.total(chords,p) for p in itertools.product(*options) ])
+        self.assertEqual(self.total(chords,path),best)
+        # never worse than the best fingering of each chord alone
+        alone = [ o[0] for o in options ]
+        self.failUnless(self.total(chords,path) <= self.total(chords,alone))
+
+    def testLong(self):
+        chords = self.progression(400)
+        guitar_ = guitar.Guitar(NullChannel())
+        path = guitar_.plan_progression(chords + [None])
+        self.assertEqual(len(path),401)
+        self.assertEqual(path[-1],(-1,)*6)
+        for (c,frets) in zip(chords,path):
+            self.assertEqual(pitch_class_mask(sounded(frets)) & ~pitch_class_mask(c.tones),0)
+        self.assertEqual(fingering.plan_progression([]),[])
+        self.assertRaises(KeyError,fingering.plan_progression,[[Tone(i) for i in range(7)]])
+
+if __name__ == "__main__":
+    unittest.main()
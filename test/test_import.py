@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+import sys
+import unittest
+import subprocess
+sys.path.insert(0,"..")
+
+# seconds a fresh interpreter may spend importing the modules below
+IMPORT_BUDGET = 0.25
+
+def run_fresh(code):
+    """run code in a new interpreter and return what it prints"""
+    p = subprocess.Popen([sys.executable, "-c", "import sys\nsys.path.insert(0,'..')\n" + code],
+                         stdout=subprocess.PIPE)
+    out = p.communicate()[0]
+    assert(p.returncode == 0)
+    return out.strip()
+
+# ======================================================================
+class TestImport(unittest.TestCase):
+    def testBudget(self):
+        best = min([ float(run_fresh("import time\n"
+                                     "t0 = time.time()\n"
+                                     "import ramu.music\n"
+                                     "import ramu.instruments.sequencer\n"
+                                     "import ramu.instruments.guitar\n"
+                                     "import ramu.osxmidi.channel\n"
+                                     "print time.time() - t0\n"))
+                     for i in range(3) ])
+        self.failUnless(best < IMPORT_BUDGET, "import took %.3fs" % best)
+
+    def testLazy(self):
+        # importing builds no Scales or Chords and loads no library
+        out = run_fresh("import ramu.instruments.sequencer\n"
+                        "from ramu.instruments import guitar\n"
+                        "from ramu.osxmidi import channel\n"
+                        "from ramu.music import Scale, Chord\n"
+                        "print len(Scale.cache), len(Chord.cache), "
+                        "guitar.chord_strings.built, channel._library\n")
+        self.assertEqual(out,"0 0 False None")
+
+    def testChordStrings(self):
+        from ramu.instruments import guitar
+        c = guitar.MkChord("C","major","5th")
+        self.assertEqual(guitar.chord_strings[c],[ -1,  3,  2,  0,  1,  0 ])
+        self.failUnless(guitar.chord_strings.built)
+        self.failUnless(c in guitar.chord_strings)
+        self.failUnless(None in guitar.chord_strings)
+        self.assertEqual(len(guitar.chord_strings),len(guitar.chord_strings.items()))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+import os
+import sys
+import unittest
+import struct
+import tempfile
+from StringIO import StringIO
+sys.path.insert(0,"..")
+from ramu.music import *
+from ramu.instruments.sequencer import Sequence, SequenceNote
+from ramu.midifile import smf
+from ramu.midifile.channel import Channel
+from ramu.midifile.reader import Reader, TempoMap, read_sequence
+
+def mk_sequence():
+    seq = Sequence(Rhythm(120))
+    seq.append(Note(Tone(60),1,1.0))
+    seq.append(Note(Tone(62),1,1.0))
+    return seq
+
+def chunks(data):
+    """split midi file data into (id, body) chunks"""
+    result = []
+    while data:
+        (cid,length) = struct.unpack('>4sL',data[:8])
+        result.append((cid,data[8:8+length]))
+        data = data[8+length:]
+    return result
+
+# ======================================================================
+class TestSmf(unittest.TestCase):
+    def testVarlen(self):
+        for (value,ref) in [(0,[0]),(0x7f,[0x7f]),(0x80,[0x81,0]),
+                            (480,[0x83,0x60]),(0x0fffffff,[0xff,0xff,0xff,0x7f])]:
+            buf = bytearray()
+            smf.write_varlen(buf,value)
+            self.assertEqual(list(buf),ref)
+
+    def testReadVarlen(self):
+        data = bytearray([0x83,0x60,0x7f,0x81,0x80,0x00])
+        self.assertEqual(smf.read_varlen(data,0),(480,2))
+        self.assertEqual(smf.read_varlen(data,2),(0x7f,3))
+        self.assertEqual(smf.read_varlen(data,3),(0x4000,6))
+
+    def testTempoMap(self):
+        m = TempoMap(100)
+        m.add(0,1000000)
+        m.add(200,500000)
+        self.assertEqual(m.to_seconds(100),1.0)
+        self.assertEqual(m.to_seconds(200),2.0)
+        self.assertEqual(m.to_seconds(400),3.0)
+
+    def testTempo(self):
+        self.assertEqual(smf.bpm_to_tempo(120),500000)
+        self.assertEqual(smf.tempo_to_bpm(500000),120.0)
+
+# ======================================================================
+class TestMidiFileChannel(unittest.TestCase):
+    def testFormat0(self):
+        f = StringIO()
+        with Channel(f) as chn:
+            # sent out of order on purpose
+            mk_sequence().play(0.0,chn)
+            self.assertEqual(chn.now,1.0)
+        data = chunks(f.getvalue())
+        self.assertEqual(data[0],('MThd',struct.pack('>HHH',0,1,480)))
+        self.assertEqual(data[1][0],'MTrk')
+        self.assertEqual(list(bytearray(data[1][1])),
+                         [0x00,0xff,0x51,0x03,0x07,0xa1,0x20,
+                          0x00,0xff,0x58,0x04,0x04,0x02,0x18,0x08,
+                          0x00,0x90,0x3c,0x7f,
+                          0x83,0x60,0x3c,0x00,
+                          0x00,0x3e,0x7f,
+                          0x83,0x60,0x3e,0x00,
+                          0x00,0xff,0x2f,0x00])
+
+    def testNoteOffs(self):
+        f = StringIO()
+        with Channel(f,zero_velocity_off=False,midi_channel_id=2) as chn:
+            chn.play_note(0.5,1.0,Tone(62),1.0)
+            chn.play_note(0.0,0.5,Tone(60),1.0)
+        track = list(bytearray(chunks(f.getvalue())[1][1]))[15:]
+        self.assertEqual(track,[0x00,0x92,0x3c,0x7f,
+                                0x83,0x60,0x82,0x3c,0x7f,
+                                0x00,0x92,0x3e,0x7f,
+                                0x83,0x60,0x82,0x3e,0x7f,
+                                0x00,0xff,0x2f,0x00])
+
+    def testFormat1(self):
+        f = StringIO()
+        chn = Channel(f,format=1,beats_per_minute=60,ticks_per_beat=96)
+        mk_sequence().play(0.0,chn.track(0))
+        mk_sequence().play(0.0,chn.track(1))
+        chn.close()
+        data = chunks(f.getvalue())
+        self.assertEqual(data[0],('MThd',struct.pack('>HHH',1,3,96)))
+        self.assertEqual(len(data),4)
+        self.assertEqual(list(bytearray(data[1][1]))[-4:],[0x00,0xff,0x2f,0x00])
+        self.assertEqual(len(data[1][1]),19)
+        self.assertEqual(data[2],data[3])
+        self.assertEqual(list(bytearray(data[2][1]))[:4],[0x00,0x90,0x3c,0x7f])
+
+# ======================================================================
+def write_temp(data):
+    f = tempfile.TemporaryFile()
+    f.write(data)
+    f.flush()
+    f.seek(0)
+    return f
+
+class TestMidiFileReader(unittest.TestCase):
+    def testRoundTrip(self):
+        seq = Sequence(Rhythm(90))
+        for g in "c4 e4 g4 c5".split():
+            seq.append(Note(Tone(g[0],int(g[1])),0.5,0.5))
+        seq.insert(SequenceNote(0.25,Note(Tone(30),2.0,1.0)))
+        out = StringIO()
+        with Channel(out,beats_per_minute=90) as chn:
+            seq.play(0.0,chn)
+        f = write_temp(out.getvalue())
+        s1 = read_sequence(f)
+        self.assertAlmostEqual(s1.rhythm.beats_per_minute,90.0,places=3)
+        self.assertEqual(len(s1.seq),5)
+        for (a,b) in zip(seq.seq,s1.seq):
+            self.assertAlmostEqual(a.beat,b.beat)
+            self.assertAlmostEqual(a.note.duration,b.note.duration)
+            self.assertEqual(a.note.tone,b.note.tone)
+            self.assertAlmostEqual(a.note.strength,b.note.strength,places=2)
+        # beats follow the rhythm asked for
+        s2 = read_sequence(f,Rhythm(180))
+        for (a,b) in zip(s1.seq,s2.seq):
+            self.assertAlmostEqual(2*a.beat,b.beat,places=5)
+        f.close()
+
+    def testShortNotes(self):
+        # a note too short for a tick ends after it starts, and a note
+        # ending where the same key starts again still retriggers
+        out = StringIO()
+        with Channel(out) as chn:
+            chn.play_note(1.0,1.0,Tone(60),1.0)
+            chn.play_note(1.0,1.0001,Tone(62),1.0)
+            chn.play_note(0.0,2.0,Tone(64),1.0)
+            chn.play_note(2.0,3.0,Tone(64),1.0)
+        f = write_temp(out.getvalue())
+        with Reader(f) as reader:
+            notes = sorted(reader.iter_note_values())
+        self.assertEqual(notes,[(0.0,4.0,64,1.0),
+                                (2.0,0.0,60,1.0),
+                                (2.0,0.0,62,1.0),
+                                (4.0,2.0,64,1.0)])
+        f.close()
+
+    def testQuietNotes(self):
+        # a quiet note is still a note on, not a note off
+        out = StringIO()
+        with Channel(out) as chn:
+            chn.play_note(0.0,1.0,Tone(60),0.004)
+            chn.play_note(1.0,2.0,Tone(62),0.0)
+        f = write_temp(out.getvalue())
+        with Reader(f) as reader:
+            notes = list(reader.iter_note_values())
+        self.assertEqual(notes,[(0.0,2.0,60,1/127.0),(2.0,2.0,62,1/127.0)])
+        f.close()
+
+    def testBadFiles(self):
+        for data in ["", "MThd", "RIFF" + "\0"*20]:
+            f = write_temp(data)
+            self.assertRaises(ValueError,Reader,f)
+            self.failIf(f.closed)
+            f.close()
+        # a file opened by name is closed when the header is bad
+        (fd,name) = tempfile.mkstemp()
+        os.write(fd,"MThd")
+        os.close(fd)
+        opened = []
+        class RecordingReader(Reader):
+            def close(self):
+                opened.append(self._file)
+                Reader.close(self)
+        try:
+            self.assertRaises(ValueError,RecordingReader,name)
+            self.assertEqual(len(opened),1)
+            self.failUnless(opened[0].closed)
+        finally:
+            os.remove(name)
+
+    def testTruncatedTracks(self):
+        track = bytearray([0x00,0x90,0x3c,0x40,
+                           0x60,0x80,0x3c,0x00,
+                           0x00,0xff,0x2f,0x00])
+        header = struct.pack('>4sLHHH','MThd',6,0,1,96)
+        def reader(track,length=None):
+            if length == None:
+                length = len(track)
+            return Reader(StringIO(header + struct.pack('>4sL','MTrk',length) + str(track)))
+        self.assertEqual(len(list(reader(track).iter_note_values())),1)
+        for cut in [1,3,5,10]:
+            r = reader(track[:-cut],len(track))
+            try:
+                list(r.iter_events(0))
+                self.fail("track cut by %d bytes was read" % cut)
+            except ValueError, e:
+                self.failUnless(str(e).startswith("track 0 is cut short at byte "))
+        # running status with no status byte before it
+        r = reader(bytearray([0x00,0x3c,0x40]))
+        self.assertRaises(ValueError,list,r.iter_note_values())
+        # a long meta event that runs off the end
+        r = reader(bytearray([0x00,0xff,0x01,0x7f,0x41]))
+        self.assertRaises(ValueError,list,r.iter_events(0))
+
+    def testFileObjects(self):
+        out = StringIO()
+        with Channel(out) as chn:
+            mk_sequence().play(0.0,chn)
+        import io
+        for f in [StringIO(out.getvalue()),io.BytesIO(out.getvalue())]:
+            seq = read_sequence(f)
+            self.assertEqual([n.note.tone for n in seq.seq],[Tone(60),Tone(62)])
+            self.failIf(f.closed)
+        self.assertRaises(ValueError,Reader,io.BytesIO("MThd"))
+
+    def testFormat1(self):
+        out = StringIO()
+        chn = Channel(out,format=1)
+        chn.track(0).play_note(0.0,1.0,Tone(60),1.0)
+        chn.track(1).play_note(0.5,1.0,Tone(64),1.0)
+        chn.close()
+        f = write_temp(out.getvalue())
+        with Reader(f) as reader:
+            self.assertEqual((reader.format,reader.num_tracks,reader.ticks_per_beat),(1,3,480))
+            notes = list(reader.iter_note_values(tracks=[2]))
+            self.assertEqual(notes,[(1.0,1.0,64,1.0)])
+            notes = list(reader.iter_notes())
+            self.assertEqual([n.note.tone for n in notes],[Tone(60),Tone(64)])
+        f.close()
+
+    def testTempoChange(self):
+        # 1 beat at 60bpm then a tempo change to 120bpm, running status
+        # and a note-off message and a note that is never stopped
+        track = bytearray([0x00,0xff,0x51,0x03,0x0f,0x42,0x40,
+                           0x00,0x90,0x3c,0x40,
+                           0x60,0xff,0x51,0x03,0x07,0xa1,0x20,
+                           0x00,0x90,0x3e,0x40,
+                           0x00,0x80,0x3c,0x00,
+                           0x60,0x3e,0x00,
+                           0x00,0x90,0x40,0x7f,
+                           0x60,0xff,0x2f,0x00])
+        data = (struct.pack('>4sLHHH','MThd',6,0,1,96) +
+                struct.pack('>4sL','MTrk',len(track)) + str(track))
+        f = write_temp(data)
+        with Reader(f) as reader:
+            self.assertEqual(reader.rhythm.beats_per_minute,60.0)
+            notes = list(reader.iter_note_values())
+            self.assertEqual(notes,[(0.0,1.0,60,0x40/127.0),
+                                    (1.0,0.5,62,0x40/127.0),
+                                    (1.5,0.5,64,1.0)])
+        f.close()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+import sys
+import unittest
+import threading
+sys.path.insert(0,"..")
+from ramu.music import *
+from ramu.channel import NullChannel
+from ramu.monitor import MonitoredChannel
+from ramu.scheduler import Scheduler
+from ramu.instruments.sequencer import Sequence, SequenceNote
+from ramu.instruments import guitar
+
+class FakeClock(object):
+    def __init__(self):
+        self.t = 0.0
+    def __call__(self):
+        return self.t
+
+class RealtimeChannel(NullChannel):
+    realtime = True
+    def __init__(self,clock):
+        NullChannel.__init__(self)
+        self.clock = clock
+    def get_now(self):
+        return self.clock()
+    now = property(get_now)
+
+# ======================================================================
+class TestMonitoredChannel(unittest.TestCase):
+    def testCounts(self):
+        wall = FakeClock()
+        chn = MonitoredChannel(NullChannel(),wall_clock=wall)
+        chn.start_note(0.0,Tone(60),1.0)
+        chn.start_note(0.0,Tone(64),1.0)
+        chn.start_note(0.5,Tone(60),1.0)
+        chn.stop_note(1.0,Tone(60),0.0)
+        chn.play_note(1.0,2.0,Tone(67),1.0)
+        chn.stop_note(1.0,Tone(72),0.0) # never started
+        wall.t = 2.0
+        snap = chn.snapshot()
+        self.assertEqual(snap['events'],7)
+        self.assertEqual(snap['events_per_second'],3.5)
+        self.assertEqual(snap['note_ons'],{60:2,64:1,67:1})
+        self.assertEqual(snap['note_offs'],{60:1,67:1,72:1})
+        # the play_note voice sounds until 2.0
+        self.assertEqual(snap['active_voices'],3)
+        self.assertEqual(snap['max_active_voices'],3)
+        chn.start_note(2.0,Tone(48),1.0)
+        self.assertEqual(chn.snapshot()['active_voices'],3)
+        self.assertEqual(snap['lateness'],None)
+        chn.all_notes_off()
+        self.assertEqual(chn.snapshot()['active_voices'],0)
+        chn.reset()
+        self.assertEqual(chn.snapshot()['events'],0)
+
+    def testLateness(self):
+        clock = FakeClock()
+        chn = MonitoredChannel(RealtimeChannel(clock),wall_clock=clock)
+        self.failUnless(chn.realtime)
+        clock.t = 1.0
+        chn.start_note(2.0,Tone(60),1.0)   # 1s early
+        chn.start_note(1.0,Tone(60),1.0)   # on time
+        chn.start_note(0.995,Tone(60),1.0) # 5ms late
+        chn.start_note(0.5,Tone(60),1.0)   # 500ms late
+        lateness = chn.snapshot()['lateness']
+        counts = dict(zip([None] + lateness['edges'],lateness['counts']))
+        self.assertEqual(counts[-1.0],1)
+        self.assertEqual(counts[0.0],1)
+        self.assertEqual(counts[0.001],1)
+        self.assertEqual(counts[0.1],1)
+        self.assertEqual(sum(lateness['counts']),4)
+        self.assertEqual(lateness['late_events'],2)
+        self.assertEqual(lateness['min'],-1.0)
+        self.assertEqual(lateness['max'],0.5)
+        self.assertAlmostEqual(lateness['mean'],(-1.0+0.005+0.5)/4)
+
+    def testPassThrough(self):
+        # a monitored channel works wherever its channel does
+        chn = MonitoredChannel(NullChannel())
+        seq = Sequence(Rhythm(120))
+        for i in range(10):
+            seq.append(Note(Tone(60+i),1))
+        seq.play_and_wait(0.0,chn)
+        g = guitar.Guitar(chn)
+        g.press_chord(0.0,guitar.MkChord("C","major","5th"))
+        g.strum(0.0,0.01)
+        del g
+        snap = chn.snapshot()
+        self.assertEqual(snap['note_ons'][61],1)
+        # with no clock, the sequence's last note has not yet stopped
+        # as far as the monitor knows
+        self.assertEqual(snap['active_voices'],1)
+        self.assertEqual(chn.now,0.0)
+
+    def testPolyphony(self):
+        # overlapping notes played through play_note count as
+        # sounding together.  10 beats per second.
+        seq = Sequence(Rhythm(600))
+        seq.insert_many([ SequenceNote(0.0,Note(Tone(60),2)),
+                          SequenceNote(0.5,Note(Tone(64),2)),
+                          SequenceNote(1.0,Note(Tone(67),2)),
+                          SequenceNote(3.0,Note(Tone(72),1)),
+                          SequenceNote(3.5,Note(Tone(76),1)) ])
+        chn = MonitoredChannel(NullChannel())
+        seq.play(0.0,chn)
+        snap = chn.snapshot()
+        self.assertEqual(snap['max_active_voices'],3)
+        self.assertEqual(snap['active_voices'],2)
+        clock = FakeClock()
+        chn = MonitoredChannel(RealtimeChannel(clock))
+        seq.play_and_wait(0.0,chn)
+        self.assertEqual(chn.snapshot()['max_active_voices'],3)
+        clock.t = 10.0
+        self.assertEqual(chn.snapshot()['active_voices'],0)
+
+    def testThreads(self):
+        chn = MonitoredChannel(NullChannel())
+        def play():
+            for i in range(1000):
+                chn.play_note(0.0,1.0,Tone(60),1.0)
+        threads = [ threading.Thread(target=play) for i in range(4) ]
+        for t in threads:
+            t.start()
+        for i in range(100):
+            chn.snapshot()
+        for t in threads:
+            t.join()
+        self.assertEqual(chn.snapshot()['note_ons'],{60:4000})
+
+if __name__ == "__main__":
+    unittest.main()
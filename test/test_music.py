@@ -1,9 +1,16 @@
 #!/usr/bin/env python
 import sys
 import unittest
+import copy
+import pickle
+import warnings
 sys.path.insert(0,"..")
+try:
+    import numpy
+except ImportError:
+    numpy = None
 from ramu.music import *
-from ramu.instruments.sequencer import SequenceNote,Sequence
+from ramu.instruments.sequencer import SequenceNote,Sequence,SequenceView,SequenceRope,concatenate
 
 # ======================================================================
 class TestChord(unittest.TestCase):
@@ -29,6 +36,17 @@ class TestChord(unittest.TestCase):
         self.failUnless(t0 != t3)
         t4 = Chord(Scale(Tone('a'),'aeolian'),'dim7th')
         self.failUnless(t0 != t4)
+
+    def testCached(self):
+        self.failUnless(Chord(Scale(Tone('c')),'7th') is Chord(Scale(Tone('c')),'7th'))
+        self.failIf(Chord(Scale(Tone('c')),'7th') is Chord(Scale(Tone('c')),'7th',2))
+        c = Chord(Scale(Tone('c')))
+        self.assertRaises(AttributeError,setattr,c,'name','7th')
+        self.assertEqual(type(c.tones),tuple)
+        self.failUnless(copy.deepcopy(c) is c)
+        self.failUnless(pickle.loads(pickle.dumps(c)) is c)
+        self.assertRaises(AssertionError,Chord,'c')
+        self.assertRaises(AssertionError,Chord,Tone('c'))
 # XXX test multiple octaves
 # XXX test assert <,<=,>,>=
 
@@ -89,6 +107,38 @@ class TestScale(unittest.TestCase):
         gold_set = set([Tone('b'),Tone('e')])
         self.assertEqual(len(t0.intersect(t1)),6)
         self.assertEqual(set(t0.intersect(t2)),gold_set)
+
+    def testCached(self):
+        self.failUnless(Scale(Tone('c'),'minor') is Scale(Tone('c'),'minor'))
+        # canonical and octave tonics give different tones
+        self.failIf(Scale(Tone('c')) is Scale(Tone('c',0)))
+        self.failIf(Scale(Tone('c',4)) is Scale(Tone('c',4),'major',2))
+        s = Scale(Tone('c',4))
+        self.assertRaises(AttributeError,setattr,s,'name','minor')
+        self.assertRaises(AttributeError,setattr,s,'color','blue')
+        self.assertEqual(type(s.tones),tuple)
+        self.failUnless(copy.copy(s) is s)
+        self.failUnless(pickle.loads(pickle.dumps(s)) is s)
+        self.assertRaises(AssertionError,Scale,'c')
+        self.assertRaises(AssertionError,Scale,60)
+
+    def testCacheStats(self):
+        cache = LRUCache(2)
+        self.assertEqual(cache.get('a'),None)
+        self.assertEqual(cache.put('a',1),1)
+        self.assertEqual(cache.put('a',2),1)
+        cache.put('b',2)
+        self.assertEqual(cache.get('a'),1)
+        cache.put('c',3) # drops b, the least recently used
+        self.assertEqual(cache.get('b'),None)
+        self.assertEqual(cache.get('c'),3)
+        self.assertEqual(cache.stats,{'hits':2,'misses':2,'size':2,'maxsize':2})
+        cache.clear()
+        self.assertEqual(cache.stats,{'hits':0,'misses':0,'size':0,'maxsize':2})
+        hits = Scale.cache.stats['hits']
+        Scale(Tone('d'),'dorian')
+        Scale(Tone('d'),'dorian')
+        self.failUnless(Scale.cache.stats['hits'] >= hits + 1)
 # XXX multiple octaves
 # XXX test assert <,<=,>,>=
 
@@ -192,6 +242,47 @@ class TestTone(unittest.TestCase):
         self.assertEqual(t1,t2)
         self.assertEqual(t1.canonical,True)
 
+    def testFlyweight(self):
+        self.failUnless(Tone(60) is Tone('c',5))
+        self.failUnless(Tone('c') is Tone(0))
+        self.failUnless(Tone('c',0) is not Tone('c'))
+        self.assertEqual(Tone('c',0).octave,0)
+        self.failUnless(Tone(200) is Tone(200))
+        self.assertEqual(Tone(200).frequency,chromatic_tone_to_frequency(200))
+
+    def testImmutable(self):
+        def tryToSet(t,name,v):
+            setattr(t,name,v)
+        t0 = Tone(60)
+        self.assertRaises(AttributeError, tryToSet, t0, 'canonical', True)
+        self.assertRaises(AttributeError, tryToSet, t0, 'frequency', 1.0)
+        self.assertRaises(AttributeError, tryToSet, t0, 'foo', 1)
+
+    def testCopy(self):
+        t0 = Tone('c',0)
+        self.failUnless(copy.deepcopy(t0) is t0)
+        self.failUnless(pickle.loads(pickle.dumps(t0)) is t0)
+        self.failUnless(pickle.loads(pickle.dumps(Tone('c'))) is Tone('c'))
+        for t in [Tone(-1),Tone(-13),Tone(11),Tone('c',-1),Tone(127)]:
+            for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+                u = pickle.loads(pickle.dumps(t,protocol))
+                self.failUnless(u is t)
+                self.assertEqual((u.index,u.canonical),(t.index,t.canonical))
+
+    def testPitchClass(self):
+        self.assertEqual(glyph_to_pitch_class('c#'),1)
+        self.assertEqual(glyph_to_pitch_class('Bb'),10)
+        self.assertEqual(glyph_to_pitch_class('D-'),1)
+        self.assertEqual(glyph_to_pitch_class('eB'),3)
+        self.assertRaises(AssertionError,glyph_to_pitch_class,'h')
+
+    def testBulkParse(self):
+        ref = [Tone('c',4).index, Tone('f#',5).index, Tone('bb',3).index]
+        self.assertEqual(list(glyphos_to_chromatic_tone_indices("c4 f#5 bb3")),ref)
+        self.assertEqual(list(glyphos_to_chromatic_tone_indices(['c4','F#5','Bb3'])),ref)
+        self.assertEqual(list(glyphos_to_chromatic_tone_indices("e- a10")),[3,129])
+        self.assertRaises(AssertionError,glyphos_to_chromatic_tone_indices,"c4 h4")
+
     def testFindScales(self):
         scale_set = set(get_scales_with_tones(
             [Tone('c'),Tone('d'),Tone('e'),Tone('b')]))
@@ -209,6 +300,157 @@ class TestTone(unittest.TestCase):
                              Scale(Tone('b-'))])
         self.assertEqual(scale_set.intersection(gold_set), gold_set)
 
+    def testFindScalesOctaves(self):
+        scales = get_scales_with_tones(
+            [Tone('c',4),Tone('e',5),Tone('g',3),Tone('b',4)],['major'])
+        self.assertEqual(scales,[Scale(Tone('c')),Scale(Tone('g'))])
+
+    def testFindScalesAll(self):
+        tones = [Tone('c'),Tone('d'),Tone('e'),Tone('f#')]
+        scales = get_scales_with_tones(tones,None)
+        self.failUnless(Scale(Tone('g')) in scales)
+        self.failUnless(Scale(Tone('c'),'lydian') in scales)
+        toneset = set(tones)
+        for s in scales:
+            self.assertEqual(toneset.intersection(set(s.tones)),toneset)
+
+    def testPitchClassMask(self):
+        self.assertEqual(pitch_class_mask([Tone('c'),Tone('e',4),Tone('c',5)]),0x11)
+        self.assertEqual(rotate_pitch_class_mask(0x801,1),0x003)
+        self.assertEqual(get_scale_pitch_class_masks('major')[0],
+                         pitch_class_mask(Scale(Tone('c')).tones))
+        self.assertEqual(get_scale_keys_with_mask(0xfff,['major','chromatic']),
+                         [(i,'chromatic') for i in range(12)])
+
+    def testScaleAliases(self):
+        aliases = get_scale_aliases('ionian')
+        self.assertEqual(aliases[0],'major')
+        self.failUnless('bilaval theta' in aliases)
+        self.failUnless('mela dhirasankarabharana' in aliases)
+        self.assertEqual(get_canonical_scale_name('mela dhirasankarabharana'),'major')
+        unique = get_unique_scale_names()
+        self.failUnless('major' in unique)
+        self.failIf('ionian' in unique)
+        self.assertEqual(len(unique),
+                         len(set([get_scale_mask(n) for n in scale_index_offsets])))
+        self.assertEqual(get_unique_scale_names(['ionian','major','dorian']),
+                         ['dorian','major'])
+
+    def testScaleModes(self):
+        self.assertEqual(get_scale_modes('major'),
+                         [(0,0,'major'),(1,2,'dorian'),(2,4,'phrygian'),
+                          (3,5,'lydian'),(4,7,'mixolydian'),(5,9,'minor'),
+                          (6,11,'locrian')])
+        mask = pitch_class_mask(Scale(Tone('d'),'dorian').tones)
+        self.failUnless((0,'major') in get_scale_keys_for_mask(mask))
+        self.failUnless((2,'dorian') in get_scale_keys_for_mask(mask))
+        self.assertEqual(get_scale_keys_for_mask(0x001),[])
+
+    def testSearchAliases(self):
+        # every alias is still found, in the order asked for
+        names = ['ionian','major','dorian','bilaval theta']
+        keys = get_scale_keys_with_mask(0xab5,names)
+        self.assertEqual(keys,[(0,'ionian'),(0,'major'),(2,'dorian'),
+                               (0,'bilaval theta')])
+
+    def testRegisterScale(self):
+        register_scale('test blues',[0,3,5,6,7,10])
+        try:
+            self.assertEqual(get_scale_aliases('test blues'),['blues','test blues'])
+            self.failUnless(Scale(Tone('a'),'test blues') in
+                            get_scales_with_tones([Tone('a'),Tone('e-')],None))
+            register_scale('test blues',[0,4,7])
+            self.assertEqual(Scale(Tone('c'),'test blues').glyphs,['c','e','g'])
+            self.assertEqual(get_scale_keys_with_mask(0x091,['test blues']),
+                             [(0,'test blues')])
+        finally:
+            unregister_scale('test blues')
+        self.failIf('test blues' in scale_index_offsets)
+        self.assertRaises(KeyError,get_scale_aliases,'test blues')
+
+# ======================================================================
+@unittest.skipIf(numpy == None, "numpy is not installed")
+class TestVectorized(unittest.TestCase):
+    def testFrequencies(self):
+        f = chromatic_tone_indices_to_frequencies([57,69,81,60])
+        self.assertEqual(list(f[:3]),[220.0,440.0,880.0])
+        self.assertAlmostEqual(f[3],Tone(60).frequency)
+
+    def testIndices(self):
+        f = [440.0, 261.6256, 450.0, 0.5*Tone(61).frequency]
+        (indices,cents) = frequencies_to_chromatic_tone_indices(f)
+        self.assertEqual(list(indices),[69,60,69,49])
+        self.assertAlmostEqual(cents[0],0.0)
+        self.assertAlmostEqual(cents[1],0.0,places=3)
+        self.assertAlmostEqual(cents[2],38.9062,places=3)
+        self.assertAlmostEqual(cents[3],0.0)
+
+    def testUnpitched(self):
+        f = numpy.array([440.0,0.0,-10.0,numpy.nan,numpy.inf,261.6256])
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            (indices,cents) = frequencies_to_chromatic_tone_indices(f)
+        self.assertEqual(list(indices),[69,-1,-1,-1,-1,60])
+        self.assertEqual(UNPITCHED_INDEX,-1)
+        self.assertEqual(list(numpy.isnan(cents)),[False,True,True,True,True,False])
+        (indices,cents) = frequencies_to_chromatic_tone_indices(0.0)
+        self.assertEqual(int(indices),-1)
+
+    def testPitchClasses(self):
+        (pcs,octaves) = chromatic_tone_indices_to_pitch_classes(numpy.arange(58,62))
+        self.assertEqual(list(pcs),[10,11,0,1])
+        self.assertEqual(list(octaves),[4,4,5,5])
+
+    def testScaleSimilarity(self):
+        names = ['major','minor','pelog']
+        keys, m = get_scale_similarity_matrix(names,jaccard=False)
+        self.assertEqual(m.shape,(36,36))
+        self.assertEqual(keys[0],(0,'major'))
+        c = keys.index((0,'major'))
+        g = keys.index((7,'major'))
+        a = keys.index((9,'minor'))
+        self.assertEqual(m[c,c],7)
+        self.assertEqual(m[c,g],len(Scale(Tone('c')).intersect(Scale(Tone('g')))))
+        self.assertEqual(m[c,a],7)
+        self.failUnless((m == m.T).all())
+        # matches Scale.intersect everywhere
+        for i in range(0,36,5):
+            for j in range(0,36,7):
+                s0 = Scale(Tone(keys[i][0]),keys[i][1])
+                s1 = Scale(Tone(keys[j][0]),keys[j][1])
+                self.assertEqual(m[i,j],len(s0.intersect(s1)))
+        keys, jac = get_scale_similarity_matrix(names)
+        self.assertAlmostEqual(jac[c,g],6/8.0)
+        self.assertAlmostEqual(jac[c,c],1.0)
+        self.assertEqual(len(get_scale_keys()),12*len(scale_index_offsets))
+
+    def testNearestScales(self):
+        # a minor has the pitch classes of c major, so it is left out
+        nearest = get_nearest_scales(Scale(Tone('c'),'major'),3,['major','minor'])
+        self.assertEqual(nearest,[(0.75,5,'major'),(0.75,7,'major'),(5.0/9,2,'major')])
+        nearest = get_nearest_scales(Scale(Tone('c'),'major'),3,['major','minor'],jaccard=False)
+        self.assertEqual(nearest,[(6,5,'major'),(6,7,'major'),(5,2,'major')])
+        nearest = get_nearest_scales(pitch_class_mask(Scale(Tone('a'),'minor').tones),1,['major','minor'])
+        self.assertEqual(nearest,[(0.75,5,'major')])
+        # no aliases, no modes of the scale, and no chromatic at the top
+        nearest = get_nearest_scales(Scale(Tone('c')),20)
+        names = [ name for (sim,tonic,name) in nearest ]
+        self.failIf('chromatic' in names)
+        self.failIf('aeolian' in names)
+        masks = [ pitch_class_mask(Scale(Tone(tonic),name).tones) for (sim,tonic,name) in nearest ]
+        self.assertEqual(len(set(masks)),20)
+        self.failIf(pitch_class_mask(Scale(Tone('c')).tones) in masks)
+        self.assertEqual(len(get_nearest_scales(Scale(Tone('d'),'dorian'),10)),10)
+        # the table of distinct masks is kept until the scales change
+        register_scale('test nearest',[0,1,2,3,4,5,6,7,8,9,10])
+        try:
+            nearest = get_nearest_scales(Scale(Tone('c'),'chromatic'),1)
+            self.assertEqual(nearest,[(11/12.0,0,'test nearest')])
+            self.failUnless(get_nearest_scales(Scale(Tone('c'),'chromatic'),1) == nearest)
+        finally:
+            unregister_scale('test nearest')
+        self.failIf(get_nearest_scales(Scale(Tone('c'),'chromatic'),1) == nearest)
+
 # ======================================================================
 class TestSequence(unittest.TestCase):
     def testAppendNote(self):
@@ -237,6 +479,26 @@ class TestSequence(unittest.TestCase):
         s.insert(SequenceNote(2., Note(Tone('c',4),1)))
         self.assertEqual(s.seq[0], SequenceNote(2., Note(Tone('c',4),1)))
         self.assertEqual(s.seq[1], SequenceNote(3., Note(Tone('c',5),1)))
+
+    def testInsertStable(self):
+        s = Sequence(Rhythm(60))
+        s.insert(SequenceNote(1., Note(Tone('c',4),1)))
+        s.insert(SequenceNote(0., Note(Tone('d',4),1)))
+        s.insert(SequenceNote(1., Note(Tone('e',4),1)))
+        s.insert(SequenceNote(1., Note(Tone('f',4),1)))
+        self.assertEqual([x.note.tone for x in s.seq],
+                         [Tone('d',4),Tone('c',4),Tone('e',4),Tone('f',4)])
+
+    def testInsertMany(self):
+        s = Sequence(Rhythm(60))
+        s.append(Note(Tone('c',4),1))
+        s.append(Note(Tone('d',4),1))
+        s.append(Note(Tone('e',4),1))
+        s.insert_many(SequenceNote(b, Note(Tone(t,5),0.5)) for (b,t) in
+                      [(2.,'a'),(0.5,'b'),(1.,'g'),(5.,'f'),(1.,'d')])
+        self.assertEqual([x.beat for x in s.seq],[0.,0.5,1.,1.,1.,2.,2.,5.])
+        self.assertEqual([str(x.note.tone) for x in s.seq],
+                         ['c4','b5','d4','g5','d5','e4','a5','f5'])
         
     def testReverse(self):
         s = Sequence(Rhythm(60))
@@ -281,5 +543,195 @@ class TestSequence(unittest.TestCase):
         self.assertEqual(s.seq[3], SequenceNote(3., Note(Tone('d',4),1)))
         self.assertEqual(s.seq[4], SequenceNote(5., Note(Tone('c',4),1)))
 
+    def testColumns(self):
+        s = Sequence(Rhythm(60))
+        s.append(Note(Tone('c',4),1,0.5))
+        s.append(Note(Tone('c'),0.5))
+        s.append(Note(Tone('c',0),2))
+        self.assertEqual(len(s.seq),3)
+        self.assertEqual(list(s.seq.beats),[0.,1.,1.5])
+        self.assertEqual(list(s.seq.indices),[48,0,0])
+        self.assertEqual(s.seq[0].note.strength,0.5)
+        self.failUnless(s.seq[1].note.tone is Tone('c'))
+        self.failUnless(s.seq[2].note.tone is Tone('c',0))
+        self.assertEqual([x.beat for x in s.seq],[0.,1.,1.5])
+        self.assertEqual(s.seq[1:],[s.seq[1],s.seq[2]])
+        s.seq[1] = SequenceNote(1.,Note(Tone('d',4),1))
+        self.assertEqual(s.seq[1], SequenceNote(1., Note(Tone('d',4),1)))
+        c = copy.deepcopy(s)
+        c.reverse()
+        self.assertEqual(s.seq[0], SequenceNote(0., Note(Tone('c',4),1,0.5)))
+
+    def makeSequence(self):
+        s = Sequence(Rhythm(60))
+        s.append(Note(Tone('c',4),1))
+        s.append(Note(Tone('d',4),1))
+        s.append(Note(Tone('e',4),1))
+        s.append(Note(Tone('f',4),1))
+        s.insert(SequenceNote(5.,Note(Tone('g',4),1)))
+        return s
+
+    def testViews(self):
+        s = self.makeSequence()
+        before = list(s.seq)
+        r = s.reversed()
+        f = s.flipped(Scale(Tone('c',4),'major'))
+        self.failUnless(isinstance(r,SequenceView))
+        # views match the in-place transforms and leave s alone
+        expected = self.makeSequence()
+        expected.reverse()
+        self.assertEqual(list(r.seq),list(expected.seq))
+        expected = self.makeSequence()
+        expected.flip(Scale(Tone('c',4),'major'))
+        self.assertEqual(list(f.seq),list(expected.seq))
+        self.assertEqual(list(s.seq),before)
+        t = s.transposed(2).transposed(-1)
+        self.assertEqual(t.transform,s.transposed(1).transform)
+        self.assertEqual(list(t.seq.indices),[i + 1 for i in s.seq.indices])
+        self.assertEqual(list(s.stretched(2.0).seq.beats),[0.,2.,4.,6.,10.])
+        self.assertEqual(list(s.stretched(2.0).seq.durations),[2.]*5)
+        self.assertEqual(len(s.sliced(1,5)),3)
+        self.assertEqual(list(s.sliced(1,5).seq.beats),[0.,1.,2.])
+        self.assertEqual(list(s.sliced(3).seq.beats),[0.,2.])
+        self.assertEqual(list(s.seq),before)
+
+    def testViewsCompose(self):
+        s = self.makeSequence()
+        v = s.reversed().transposed(12).stretched(0.5).sliced(1.0)
+        self.assertEqual(list(v.seq.beats),[0.,0.5,1.,1.5])
+        self.assertEqual(list(v.seq.indices),[65,64,62,60])
+        c = v.to_sequence()
+        self.failUnless(isinstance(c,Sequence))
+        self.failIf(c.seq is s.seq)
+        c = s.view().to_sequence()
+        c.reverse()
+        self.assertEqual(list(s.seq.beats),[0.,1.,2.,3.,5.])
+        # a view can be appended to a Sequence
+        all = Sequence(Rhythm(60))
+        all.append(s)
+        all.append(s.reversed())
+        self.assertEqual(len(all.seq),10)
+        self.assertEqual(all.seq[5].note.tone,Tone('g',4))
+        # views keep the notes they were made from
+        t = s.transposed(2)
+        s.append(Note(Tone('a',4),1))
+        s.reverse()
+        s.seq[0] = SequenceNote(0.,Note(Tone('b',4),1))
+        self.assertEqual(len(s.reversed()),6)
+        self.assertEqual(len(v),4)
+        self.assertEqual(v.seq.tone(0),Tone("f",5))
+        self.assertEqual(list(t.seq.indices),[50,52,54,55,57])
+        self.assertEqual(list(t.seq.beats),[0.,1.,2.,3.,5.])
+
+    def testViewReadOnly(self):
+        s = self.makeSequence()
+        v = s.view()
+        # the columns a view hands out are copies
+        v.seq.indices[0] = 0
+        v.seq.beats.append(9.)
+        self.assertEqual(list(s.seq.indices),[48,50,52,53,55])
+        self.assertEqual(len(v),5)
+        # and changing the sequence through Sequence.seq copies first
+        s.seq.indices[0] = 1
+        self.assertEqual(v.seq.indices[0],48)
+        self.assertEqual(s.seq.indices[0],1)
+        c = v.to_sequence()
+        c.seq.indices[1] = 2
+        self.assertEqual(v.seq.indices[1],50)
+
+    def testViewOfView(self):
+        s = self.makeSequence()
+        r = s.reversed()
+        v = SequenceView(r)
+        self.assertEqual(len(v),5)
+        self.assertEqual(list(v.seq.indices),[55,53,52,50,48])
+        self.assertEqual(list(SequenceView(v).transposed(1).seq.indices),[56,54,53,51,49])
+        s.reverse()
+        self.assertEqual(list(v.seq.indices),[55,53,52,50,48])
+        v.seq.indices[0] = 0
+        self.assertEqual(v.seq.indices[0],55)
+
+    def testScaleDegree(self):
+        s = Scale(Tone('c',4),'major',2)
+        self.assertEqual(s.degree(Tone('e',4)),2)
+        self.assertEqual(s.degree(Tone('d',5)),8)
+        self.assertEqual([s.degree(t) for t in s.tones],range(14))
+        self.assertRaises(ValueError,s.degree,Tone('c#',4))
+        self.assertRaises(ValueError,s.degree,Tone('c'))
+        # repeated pitch classes give the first, as tones.index does
+        s = Scale(Tone('c'),'major',2)
+        self.assertEqual(s.degree(Tone('d')),s.tones.index(Tone('d')))
+
+    def testDiatonicTranspose(self):
+        s = self.makeSequence()
+        major = Scale(Tone('c',4),'major')
+        t = s.diatonic_transposed(2,major).seq
+        self.assertEqual([t.tone(i) for i in range(5)],
+                         [Tone('e',4),Tone('f',4),Tone('g',4),Tone('a',4),Tone('b',4)])
+        # across octaves, and in other octaves than the scale's
+        t = s.diatonic_transposed(-8,major).seq
+        self.assertEqual([t.tone(i) for i in range(5)],
+                         [Tone('b',2),Tone('c',3),Tone('d',3),Tone('e',3),Tone('f',3)])
+        self.assertEqual(list(t.beats),list(s.seq.beats))
+        s.diatonic_transpose(7,Scale(Tone('c'),'major'))
+        self.assertEqual(s.seq.tone(0),Tone('c',5))
+        s.append(Note(Tone('c#',4),1))
+        self.assertRaises(ValueError,s.diatonic_transpose,1,major)
+
+    def testModeMap(self):
+        s = self.makeSequence()
+        m = s.mode_mapped(Scale(Tone('c',4),'major'),Scale(Tone('a',4),'minor')).seq
+        self.assertEqual([m.tone(i) for i in range(5)],
+                         [Tone('a',4),Tone('b',4),Tone('c',5),Tone('d',5),Tone('e',5)])
+        s.mode_map(Scale(Tone('c'),'major'),Scale(Tone('c'),'minor'))
+        self.assertEqual([s.seq.tone(i) for i in range(5)],
+                         [Tone('c',4),Tone('d',4),Tone('d#',4),Tone('f',4),Tone('g',4)])
+        self.assertRaises(AssertionError,s.mode_map,
+                          Scale(Tone('c'),'major'),Scale(Tone('c'),'pentatonic major'))
+
+    def testRope(self):
+        a = self.makeSequence()
+        b = Sequence(Rhythm(120))
+        b.append(Note(Tone('a',4),1,0.5))
+        b.append(Note(Tone('b'),2))
+        r = a.concatenated(b).concatenated(a)
+        self.failUnless(isinstance(r,SequenceRope))
+        self.assertEqual([len(x) for x in r.segments],[5,2,5])
+        # the same notes as appending
+        expected = a.view().to_sequence()
+        expected.append(b)
+        expected.append(a)
+        self.assertEqual(len(r),len(expected.seq))
+        self.assertEqual(list(r.seq),list(expected.seq))
+        self.assertEqual(list(r.seq.durations)[5:7],[0.5,1.0])
+        # the rope keeps the notes its parts had
+        a.append(Note(Tone('c',5),1))
+        self.assertEqual(len(r),len(expected.seq))
+        # ropes of ropes, and views of ropes
+        r2 = concatenate([b,r.transposed(1)])
+        self.assertEqual(r2.rhythm,b.rhythm)
+        self.assertEqual(r2.seq.tone(2),Tone('c#',4))
+        self.assertEqual(r2.seq.durations[2],2.0)
+        expected = b.view().to_sequence()
+        expected.append(r.transposed(1))
+        self.assertEqual(list(r2.seq),list(expected.seq))
+        s = r2.to_sequence()
+        self.failUnless(isinstance(s,Sequence))
+        self.assertEqual(len(s.seq),len(r2))
+        self.failUnless(concatenate([a]) is a)
+
+    def testRopeLong(self):
+        bar = self.makeSequence()
+        r = concatenate([bar]*5000)
+        self.assertEqual(len(r),25000)
+        cols = r.seq
+        self.assertEqual(cols.beats[-1],6.0 + 5*4999 - 1)
+
+    def testTransposeCanonical(self):
+        s = Sequence(Rhythm(60))
+        s.append(Note(Tone('b'),1))
+        t = s.transposed(2).seq
+        self.failUnless(t.tone(0) is Tone('c#'))
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+import sys
+import unittest
+sys.path.insert(0,"..")
+from ramu.music import *
+from ramu.scheduler import Scheduler, monotonic, wait_all, cancel_all
+from ramu.instruments.sequencer import Sequence
+from ramu.instruments import guitar
+
+class RecordingChannel(object):
+    """records play_note calls and when they arrived"""
+    def __init__(self,realtime):
+        self.realtime = realtime
+        self.notes = []
+        self.start = monotonic()
+    def get_now(self):
+        return monotonic() - self.start
+    now = property(get_now)
+    def play_note(self,start,stop,tone,strength):
+        self.notes.append((self.now,start,stop,tone,strength))
+    def start_note(self,time,tone,strength):
+        self.notes.append((self.now,time,None,tone,strength))
+    def stop_note(self,time,tone,strength):
+        self.notes.append((self.now,None,time,tone,strength))
+
+def mk_sequence(n,bpm):
+    seq = Sequence(Rhythm(bpm))
+    for i in range(n):
+        seq.append(Note(Tone(60+i),1))
+    return seq
+
+# ======================================================================
+class TestScheduler(unittest.TestCase):
+    def testMonotonic(self):
+        times = [ monotonic() for i in range(1000) ]
+        self.assertEqual(times,sorted(times))
+        if sys.platform.startswith('linux') or sys.platform == 'darwin':
+            import time
+            from ramu import scheduler
+            self.failIf(scheduler._monotonic is time.time)
+
+    def testNowBeforeStart(self):
+        # before start(), times come from the channel
+        chn = RecordingChannel(True)
+        chn.start -= 5.0
+        sch = Scheduler(chn)
+        self.failUnless(5.0 <= sch.now < 5.5)
+        self.failUnless(5.0 <= sch.playback().now < 5.5)
+        p = mk_sequence(1,60*50).play_async(sch.now,sch)
+        sch.start()
+        self.failUnless(p.wait(5.0))
+        sch.stop()
+        self.failUnless(abs(sch.now - chn.now) < 0.5)
+
+    def testOffline(self):
+        chn = RecordingChannel(False)
+        stats = mk_sequence(50,60).play_and_wait(0.0,chn)
+        self.assertEqual(len(chn.notes),50)
+        self.assertEqual([n[3] for n in chn.notes],[Tone(60+i) for i in range(50)])
+        self.assertEqual(stats['notes'],50)
+        self.assertEqual(stats['late_notes'],0)
+        self.assertEqual(stats['pending'],0)
+        # 50 seconds of music is not waited for
+        self.failUnless(chn.now < 5.0)
+
+    def testLookahead(self):
+        chn = RecordingChannel(True)
+        lookahead = 0.05
+        stats = mk_sequence(10,60*50).play_and_wait(chn.now,chn,lookahead)
+        self.assertEqual(stats['notes'],10)
+        self.failUnless(stats['wakeups'] > 0)
+        self.failUnless(stats['max_jitter'] >= stats['mean_jitter'] >= 0.0)
+        for (sent,start,stop,tone,strength) in chn.notes:
+            # nothing goes out much earlier than the lookahead window
+            self.failUnless(start - sent <= lookahead + 0.01)
+        # play_and_wait returns after the last note finishes
+        self.failUnless(chn.now >= chn.notes[-1][2])
+
+    def testLate(self):
+        chn = RecordingChannel(True)
+        sch = Scheduler(chn,0.0)
+        sch.play_note(-1.0,-0.5,Tone(60),0.5)
+        sch.start()
+        sch.wait()
+        sch.stop()
+        stats = sch.stats
+        self.assertEqual(stats['late_notes'],1)
+        self.failUnless(stats['max_late'] >= 1.0)
+
+    def testPlayAsync(self):
+        chn = RecordingChannel(False)
+        sch = Scheduler(chn)
+        # queue everything first; an offline channel is fed as soon
+        # as the scheduler runs
+        a = mk_sequence(5,60).play_async(0.0,sch)
+        b = mk_sequence(5,120).play_async(0.25,sch)
+        g = guitar.Guitar(sch.playback())
+        g.press_chord(0.0,guitar.MkChord("E","major","5th"))
+        g.strum(0.0,0.01)
+        g.silence(1.0)
+        sch.start()
+        self.failUnless(wait_all([a,b,g.channel],5.0))
+        sch.stop()
+        starts = [n[1] for n in chn.notes if n[1] != None]
+        self.assertEqual(starts,sorted(starts))
+        self.assertEqual(len([n for n in chn.notes if n[2] == None]),6)
+        self.assertEqual(len([n for n in chn.notes if n[1] == None]),6)
+        self.assertEqual(len(chn.notes),5+5+12)
+
+    def testCancel(self):
+        chn = RecordingChannel(True)
+        sch = Scheduler(chn,0.05)
+        t = chn.now
+        a = mk_sequence(100,60*20).play_async(t,sch)
+        b = sch.playback()
+        b.start_note(t,Tone(40),0.5)
+        b.stop_note(t+100.0,Tone(40),0.5)
+        sch.start()
+        self.failIf(a.wait(0.1))
+        self.failIf(a.done())
+        cancel_all([a,b])
+        self.failUnless(a.done() and b.done())
+        self.failUnless(wait_all([a,b]))
+        sch.wait()
+        sch.stop()
+        self.failUnless(len(chn.notes) < 100)
+        self.assertEqual(sch.stats['pending'],0)
+        # the sounding note was stopped on cancel
+        self.assertEqual(chn.notes[-1][3],Tone(40))
+        self.failUnless(chn.notes[-1][2] < t+100.0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+import sys
+import unittest
+import wave
+import time
+from StringIO import StringIO
+sys.path.insert(0,"..")
+try:
+    import numpy
+except ImportError:
+    numpy = None
+from ramu.music import *
+from ramu.instruments.sequencer import Sequence
+
+if numpy != None:
+    from ramu.synth import dsp
+    from ramu.synth.channel import Channel
+    from ramu.synth import stream
+
+# ======================================================================
+@unittest.skipIf(numpy == None, "numpy is not installed")
+class TestDsp(unittest.TestCase):
+    def testOscillator(self):
+        s = dsp.oscillator("sine",100.0,400,400)
+        self.assertAlmostEqual(s[0],0.0)
+        self.assertAlmostEqual(s[1],1.0)
+        self.assertAlmostEqual(s[3],-1.0)
+        s = dsp.oscillator("sine",100.0,2,400,1)
+        self.assertAlmostEqual(s[0],1.0)
+        self.assertEqual(list(dsp.oscillator("square",100.0,4,400)),[1.,1.,-1.,-1.])
+        self.assertEqual(list(dsp.oscillator("saw",100.0,4,400)),[-1.,-.5,0.,.5])
+        self.assertEqual(list(dsp.oscillator("triangle",100.0,4,400)),[-1.,0.,1.,0.])
+
+    def testEnvelope(self):
+        env = dsp.Envelope(0.1,0.1,0.5,0.2)
+        self.assertEqual(env.num_samples(1.0,10),12)
+        e = env.samples(1.0,10)
+        self.assertEqual(len(e),12)
+        self.assertAlmostEqual(e[0],0.0)
+        self.assertAlmostEqual(e[1],1.0)
+        self.assertAlmostEqual(e[2],0.5)
+        self.assertAlmostEqual(e[9],0.5)
+        self.assertAlmostEqual(e[10],0.5)
+        self.assertAlmostEqual(e[11],0.25)
+        # a short note releases from partway up the attack
+        e = env.samples(0.05,100)
+        self.assertAlmostEqual(e[5],0.5)
+        self.assertAlmostEqual(e[15],0.25)
+        # pieces match the whole
+        whole = dsp.render_note(440.0,0.5,1.0,1000)
+        part = dsp.render_note(440.0,0.5,1.0,1000,start=100,num_samples=50)
+        self.failUnless(numpy.allclose(whole[100:150],part))
+
+# ======================================================================
+@unittest.skipIf(numpy == None, "numpy is not installed")
+class TestSynthChannel(unittest.TestCase):
+    def testRender(self):
+        chn = Channel(sample_rate=8000)
+        chn.play_note(0.0,0.5,Tone(69),1.0)
+        chn.play_note(0.25,1.0,Tone(69),0.5)
+        chn.start_note(1.0,Tone(60),1.0)
+        self.assertEqual(len(chn.notes),2)
+        chn.close()
+        self.assertEqual(len(chn.notes),3)
+        out = chn.render()
+        self.assertEqual(len(out),int(8000*1.1))
+        self.failUnless(numpy.abs(out).max() <= 1.0)
+        ref = dsp.render_note(440.0,0.5,0.25,8000)
+        self.failUnless(numpy.allclose(out[:2000],ref[:2000]))
+
+    def testWav(self):
+        seq = Sequence(Rhythm(120))
+        for i in range(8):
+            seq.append(Note(Tone(60+i),1))
+        f = StringIO()
+        t0 = time.time()
+        with Channel(f) as chn:
+            seq.play_and_wait(0.0,chn)
+        # 4 seconds of audio takes much less than 4 seconds
+        self.failUnless(time.time() - t0 < 2.0)
+        w = wave.open(StringIO(f.getvalue()))
+        self.assertEqual((w.getnchannels(),w.getsampwidth(),w.getframerate()),(1,2,44100))
+        self.assertEqual(w.getnframes(),int(round(44100*4.1)))
+        self.assertEqual(chn.get_wav_data(),f.getvalue())
+
+# ======================================================================
+@unittest.skipIf(numpy == None, "numpy is not installed")
+class TestStream(unittest.TestCase):
+    def testBlocksMatchRender(self):
+        chn = Channel(sample_rate=8000)
+        chn.play_note(0.0,0.5,Tone(69),1.0)
+        chn.play_note(0.25,1.0,Tone(57),0.5)
+        chn.play_note(2.0,2.1,Tone(60),1.0)
+        whole = chn.render()
+        blocks = list(chn.render_blocks(1000))
+        self.failUnless(all(len(b) == 1000 for b in blocks[:-1]))
+        self.failUnless(0 < len(blocks[-1]) <= 1000)
+        self.failUnless(numpy.allclose(numpy.concatenate(blocks),whole))
+
+    def testEarlyNotes(self):
+        # notes starting before time 0 are cut the same way
+        chn = Channel(sample_rate=8000)
+        chn.play_note(-0.05,0.5,Tone(69),1.0)
+        chn.play_note(-1.0,-0.5,Tone(60),1.0)
+        chn.play_note(0.25,0.5,Tone(57),0.5)
+        whole = chn.render()
+        blocks = numpy.concatenate(list(chn.render_blocks(1000)))
+        self.assertEqual(len(whole),len(blocks))
+        self.failUnless(numpy.allclose(blocks,whole))
+
+    def testActiveNotesOnly(self):
+        # the notes are pulled in only as the render reaches them
+        pulled = []
+        def notes():
+            for i in range(100):
+                pulled.append(i)
+                yield (i*1.0, i*1.0 + 0.5, 440.0, 1.0)
+        blocks = stream.render_blocks(notes(), sample_rate=1000, block_size=500)
+        blocks.next()
+        self.assertEqual(pulled,[0,1])
+        self.assertEqual(sum(len(b) for b in blocks) + 500, 99600)
+
+    def testSequence(self):
+        seq = Sequence(Rhythm(120))
+        for i in range(8):
+            seq.append(Note(Tone(60+i),1))
+        pcm = StringIO()
+        count = stream.write_pcm(stream.render_sequence_blocks(seq,sample_rate=8000),pcm)
+        self.assertEqual(count,int(round(8000*4.1)))
+        self.assertEqual(len(pcm.getvalue()),2*count)
+        f = StringIO()
+        self.assertEqual(stream.write_wav(stream.render_sequence_blocks(seq,sample_rate=8000),
+                                          f,8000),count)
+        self.assertEqual(f.getvalue()[44:],pcm.getvalue())
+
+if __name__ == "__main__":
+    unittest.main()